@@ -0,0 +1,188 @@
+"""
+优先级通道与准入控制
+交互请求与批量任务分通道排队，队列有长度上限和排队时间SLO，超出时立即拒绝（由接口返回429 + Retry-After）
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# 服务时间EWMA平滑系数
+_EWMA_ALPHA = 0.2
+
+
+class AdmissionRejected(Exception):
+    """请求未被准入"""
+
+    def __init__(self, lane: str, reason: str, retry_after: int):
+        """
+        Args:
+            lane: 通道名
+            reason: queue_full（队列已满）/ slo（预计排队超过SLO）/ queue_timeout（排队超时）
+            retry_after: 建议的重试等待秒数
+        """
+        super().__init__(f"lane {lane} rejected: {reason}")
+        self.lane = lane
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Lane:
+    """单个通道的配置与状态"""
+
+    def __init__(self, name: str, max_active: int, max_queue: int, max_wait_ms: float):
+        self.name = name
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.max_wait = max_wait_ms / 1000
+        self.active = 0
+        self.waiters: deque = deque()
+        self.service_ms = 0.0  # 服务时间EWMA
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {"queue_full": 0, "slo": 0, "queue_timeout": 0}
+        self.total_wait_ms = 0.0
+        self.max_wait_seen_ms = 0.0
+
+
+class AdmissionController:
+    """
+    按优先级分配执行槽位的准入控制器
+
+    通道按传入顺序为优先级从高到低；有空闲槽位时先放行高优先级通道的排队请求。
+    低优先级通道的 max_active 应小于总槽位数，为高优先级请求预留余量
+    """
+
+    def __init__(self, max_concurrency: int, lanes: List[Dict[str, Any]]):
+        """
+        Args:
+            max_concurrency: 全部通道同时执行的请求数上限
+            lanes: 通道配置列表（优先级从高到低），每项包含 name/max_active/max_queue/max_wait_ms
+        """
+        self.max_concurrency = max_concurrency
+        self._lanes: Dict[str, _Lane] = {}
+        for config in lanes:
+            lane = _Lane(config["name"], min(config["max_active"], max_concurrency),
+                         config["max_queue"], config["max_wait_ms"])
+            self._lanes[lane.name] = lane
+        self._active = 0
+
+    @property
+    def lanes(self) -> List[str]:
+        return list(self._lanes)
+
+    def _can_run(self, lane: _Lane) -> bool:
+        return self._active < self.max_concurrency and lane.active < lane.max_active
+
+    def _estimate_wait(self, lane: _Lane, position: int) -> float:
+        """估算排在position位置的请求需要等待的秒数"""
+        service = lane.service_ms / 1000 if lane.service_ms else 0.0
+        return position * service / max(1, lane.max_active)
+
+    def _retry_after(self, lane: _Lane) -> int:
+        return max(1, math.ceil(self._estimate_wait(lane, len(lane.waiters) + 1)))
+
+    def _reject(self, lane: _Lane, reason: str) -> AdmissionRejected:
+        lane.rejected[reason] += 1
+        retry_after = self._retry_after(lane)
+        logger.warning(f"⛔ 通道 {lane.name} 拒绝请求: {reason}（执行中 {lane.active}，排队 {len(lane.waiters)}，"
+                       f"Retry-After {retry_after}s）")
+        return AdmissionRejected(lane.name, reason, retry_after)
+
+    async def acquire(self, lane_name: str) -> float:
+        """
+        申请执行槽位，返回排队时间（毫秒）
+
+        Raises:
+            AdmissionRejected: 队列已满、预计排队超过SLO或排队超时
+        """
+        lane = self._lanes[lane_name]
+        start = time.perf_counter()
+
+        if not lane.waiters and self._can_run(lane) and not self._higher_waiting(lane):
+            self._start(lane)
+            return 0.0
+
+        if len(lane.waiters) >= lane.max_queue:
+            raise self._reject(lane, "queue_full")
+        if self._estimate_wait(lane, len(lane.waiters) + 1) > lane.max_wait:
+            raise self._reject(lane, "slo")
+
+        future = asyncio.get_running_loop().create_future()
+        lane.waiters.append(future)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=lane.max_wait)
+        except asyncio.TimeoutError:
+            if not future.done():
+                lane.waiters.remove(future)
+                future.cancel()
+                raise self._reject(lane, "queue_timeout")
+        except asyncio.CancelledError:
+            # 调用方取消：已分到槽位则归还，否则移出队列
+            if future.done() and not future.cancelled():
+                self.release(lane_name, 0.0)
+            else:
+                lane.waiters.remove(future)
+                future.cancel()
+            raise
+
+        wait_ms = (time.perf_counter() - start) * 1000
+        lane.total_wait_ms += wait_ms
+        lane.max_wait_seen_ms = max(lane.max_wait_seen_ms, wait_ms)
+        return wait_ms
+
+    def _higher_waiting(self, lane: _Lane) -> bool:
+        """是否有更高优先级通道的请求在排队"""
+        for other in self._lanes.values():
+            if other is lane:
+                return False
+            if other.waiters:
+                return True
+        return False
+
+    def _start(self, lane: _Lane):
+        lane.active += 1
+        lane.admitted += 1
+        self._active += 1
+
+    def release(self, lane_name: str, service_ms: float):
+        """归还槽位并放行排队请求"""
+        lane = self._lanes[lane_name]
+        lane.active -= 1
+        self._active -= 1
+        if service_ms:
+            lane.service_ms = service_ms if not lane.service_ms else \
+                (1 - _EWMA_ALPHA) * lane.service_ms + _EWMA_ALPHA * service_ms
+        self._dispatch()
+
+    def _dispatch(self):
+        """按优先级把空闲槽位分给排队请求"""
+        for lane in self._lanes.values():
+            while lane.waiters and self._can_run(lane):
+                future = lane.waiters.popleft()
+                if future.done():
+                    continue
+                self._start(lane)
+                future.set_result(None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各通道排队与拒绝统计"""
+        lanes = {}
+        for lane in self._lanes.values():
+            lanes[lane.name] = {
+                "active": lane.active,
+                "queued": len(lane.waiters),
+                "max_active": lane.max_active,
+                "max_queue": lane.max_queue,
+                "max_wait_ms": lane.max_wait * 1000,
+                "admitted": lane.admitted,
+                "rejected": dict(lane.rejected),
+                "avg_service_ms": round(lane.service_ms, 1),
+                "avg_queue_ms": round(lane.total_wait_ms / lane.admitted, 1) if lane.admitted else 0.0,
+                "max_queue_ms": round(lane.max_wait_seen_ms, 1)
+            }
+        return {"max_concurrency": self.max_concurrency, "active": self._active, "lanes": lanes}
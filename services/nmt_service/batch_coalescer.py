@@ -0,0 +1,126 @@
+"""
+跨请求微批合并
+并发请求的待翻译行在一个很短的时间窗口内合并成一次引擎调用，结果再分发回各自的调用方；
+批次内的调用方全部取消时，该批次的引擎调用也随之取消
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingBatch:
+    """一个正在收集中的批次"""
+
+    def __init__(self):
+        self.requests: List[Tuple[List[str], asyncio.Future]] = []
+        self.lines = 0
+        self.timer: asyncio.TimerHandle = None
+        self.task: asyncio.Task = None
+
+
+class BatchCoalescer:
+    """按 (目标语言, 源语言) 合并并发请求的微批队列"""
+
+    def __init__(self, handler: Callable[[List[str], str, str], Awaitable[List[Any]]],
+                 window_ms: float = 10, max_lines: int = 64):
+        """
+        Args:
+            handler: 实际的批量处理函数 handler(texts, target_lang, source_lang)，返回与texts等长的结果列表
+            window_ms: 收集窗口（毫秒），从批次中第一个请求到达开始计时
+            max_lines: 批次行数达到该值时立即发出
+        """
+        self.handler = handler
+        self.window = window_ms / 1000
+        self.max_lines = max_lines
+        self._pending: Dict[Tuple[str, str], _PendingBatch] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._stats = {"requests": 0, "flushes": 0, "lines": 0, "engine_lines": 0, "cancelled": 0}
+
+    async def submit(self, texts: List[str], target_lang: str, source_lang: str) -> List[Any]:
+        """提交一组文本，等待所在批次完成后返回对应结果"""
+        if not texts:
+            return []
+
+        loop = asyncio.get_running_loop()
+        key = (target_lang, source_lang)
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = _PendingBatch()
+            batch.timer = loop.call_later(self.window, self._flush, key, batch)
+            self._pending[key] = batch
+
+        future = loop.create_future()
+        batch.requests.append((texts, future))
+        batch.lines += len(texts)
+        self._stats["requests"] += 1
+        if batch.lines >= self.max_lines:
+            self._flush(key, batch)
+
+        try:
+            return await future
+        except asyncio.CancelledError:
+            self._abandon(key, batch)
+            raise
+
+    def _abandon(self, key: Tuple[str, str], batch: _PendingBatch):
+        """调用方取消后，若批次内已没有等待结果的请求，则撤销批次或取消其引擎调用"""
+        if not all(future.done() for _, future in batch.requests):
+            return
+        if self._pending.get(key) is batch:
+            del self._pending[key]
+            batch.timer.cancel()
+            self._stats["cancelled"] += 1
+        elif batch.task and not batch.task.done():
+            batch.task.cancel()
+            self._stats["cancelled"] += 1
+
+    def _flush(self, key: Tuple[str, str], batch: _PendingBatch):
+        """发出批次（窗口到期或达到行数上限）"""
+        if self._pending.get(key) is not batch:
+            return
+        del self._pending[key]
+        batch.timer.cancel()
+        task = asyncio.get_running_loop().create_task(self._run(key, batch))
+        batch.task = task
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key: Tuple[str, str], batch: _PendingBatch):
+        """合并去重后调用handler，并把结果分发给各请求"""
+        unique: List[str] = []
+        index: Dict[str, int] = {}
+        for texts, _ in batch.requests:
+            for text in texts:
+                if text not in index:
+                    index[text] = len(unique)
+                    unique.append(text)
+
+        self._stats["flushes"] += 1
+        self._stats["lines"] += batch.lines
+        self._stats["engine_lines"] += len(unique)
+        if len(batch.requests) > 1:
+            logger.info(f"合并 {len(batch.requests)} 个请求共 {batch.lines} 行为一次引擎调用（去重后 {len(unique)} 行）")
+
+        try:
+            results = await self.handler(unique, *key)
+        except Exception as e:
+            for _, future in batch.requests:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for texts, future in batch.requests:
+            # 调用方已取消（如客户端断开）时跳过
+            if not future.done():
+                future.set_result([results[index[text]] for text in texts])
+
+    def get_stats(self) -> Dict[str, float]:
+        """合并统计"""
+        stats: Dict[str, float] = dict(self._stats)
+        stats["avg_requests_per_flush"] = round(stats["requests"] / stats["flushes"], 2) if stats["flushes"] else 0.0
+        stats["window_ms"] = self.window * 1000
+        stats["max_lines"] = self.max_lines
+        return stats
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地模拟Ollama服务（基准测试用）
+
+模拟 /api/generate 与 /api/chat，可配置延迟分布、生成速度、并行槽位数和错误注入，
+不需要真实模型即可测量翻译服务的吞吐与延迟。
+
+单独启动：
+    python fake_ollama.py --port 11500 --latency-ms 200 --token-rate 50 --capacity 4 --error-rate 0.01
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# 打包模式中的编号行："1. xxx"
+_NUMBERED_LINE_RE = re.compile(r'^\s*(\d+)\.\s*(.*)$')
+
+
+@dataclass
+class FakeOllamaConfig:
+    """模拟参数"""
+    latency_ms: float = 200.0       # 首token延迟（prompt处理）基准值
+    jitter: str = "lognormal"       # 延迟分布：fixed / uniform / lognormal
+    jitter_sigma: float = 0.3       # uniform时为±比例，lognormal时为sigma
+    token_rate: float = 50.0        # 生成速度（token/s），0为不计生成时间
+    capacity: int = 0               # 并行处理的请求数（同OLLAMA_NUM_PARALLEL），超出的排队；0为不限
+    error_rate: float = 0.0         # 返回500的概率
+    hang_rate: float = 0.0          # 长时间不响应的概率（模拟卡死）
+    hang_seconds: float = 300.0
+    stats: Dict[str, int] = field(default_factory=lambda: {"calls": 0, "errors": 0, "hangs": 0, "tokens": 0})
+
+
+def _translate(text: str) -> str:
+    """伪翻译：打包提示逐行加前缀，其余整体加前缀"""
+    lines = text.splitlines()
+    numbered = [_NUMBERED_LINE_RE.match(line) for line in lines]
+    if lines and all(numbered):
+        return "\n".join(f"{m.group(1)}. 译:{m.group(2)}" for m in numbered)
+    return f"译:{text}"
+
+
+def _source_text(prompt: str) -> str:
+    """从翻译提示中取出原文（提示与原文之间以空行分隔）"""
+    return prompt.split("\n\n", 1)[-1]
+
+
+def create_app(config: FakeOllamaConfig) -> FastAPI:
+    """创建模拟Ollama应用"""
+    app = FastAPI(title="Fake Ollama")
+    slots = asyncio.Semaphore(config.capacity) if config.capacity else None
+
+    @asynccontextmanager
+    async def slot():
+        """占用一个并行槽位（首token延迟和生成期间）"""
+        if slots is None:
+            yield
+            return
+        async with slots:
+            yield
+
+    def first_token_delay() -> float:
+        base = config.latency_ms / 1000
+        if config.jitter == "uniform":
+            return max(0.0, base * random.uniform(1 - config.jitter_sigma, 1 + config.jitter_sigma))
+        if config.jitter == "lognormal":
+            return base * random.lognormvariate(0, config.jitter_sigma)
+        return base
+
+    def tokens_of(text: str) -> int:
+        return max(1, len(text) // 4)
+
+    async def fault() -> Optional[JSONResponse]:
+        """按配置注入错误或卡死，正常时返回None"""
+        config.stats["calls"] += 1
+        if config.hang_rate and random.random() < config.hang_rate:
+            config.stats["hangs"] += 1
+            await asyncio.sleep(config.hang_seconds)
+        if config.error_rate and random.random() < config.error_rate:
+            config.stats["errors"] += 1
+            return JSONResponse({"error": "injected failure"}, status_code=500)
+        return None
+
+    async def generate(output: str, stream: bool, wrap):
+        tokens = tokens_of(output)
+        config.stats["tokens"] += tokens
+        per_token = 1 / config.token_rate if config.token_rate else 0.0
+
+        if not stream:
+            async with slot():
+                await asyncio.sleep(first_token_delay())
+                await asyncio.sleep(tokens * per_token)
+            return JSONResponse(dict(wrap(output), done=True))
+
+        pieces = [output[i:i + 4] for i in range(0, len(output), 4)]
+
+        async def chunks():
+            async with slot():
+                await asyncio.sleep(first_token_delay())
+                for piece in pieces:
+                    await asyncio.sleep(per_token)
+                    yield json.dumps(dict(wrap(piece), done=False), ensure_ascii=False) + "\n"
+            yield json.dumps(dict(wrap(""), done=True), ensure_ascii=False) + "\n"
+
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    @app.post("/api/generate")
+    async def api_generate(request: Request):
+        body = await request.json()
+        error = await fault()
+        if error:
+            return error
+        output = _translate(_source_text(body.get("prompt", "")))
+        return await generate(output, body.get("stream", True), lambda text: {"response": text})
+
+    @app.post("/api/chat")
+    async def api_chat(request: Request):
+        body = await request.json()
+        error = await fault()
+        if error:
+            return error
+        messages = body.get("messages") or [{"content": ""}]
+        output = _translate(messages[-1].get("content", ""))
+        return await generate(
+            output, body.get("stream", True),
+            lambda text: {"message": {"role": "assistant", "content": text}}
+        )
+
+    @app.get("/api/tags")
+    async def api_tags():
+        return {"models": [{"name": "fake:latest"}]}
+
+    @app.get("/stats")
+    async def stats():
+        return config.stats
+
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """模拟参数的命令行选项（基准脚本复用）"""
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="首token延迟基准值(ms)")
+    parser.add_argument("--jitter", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--jitter-sigma", type=float, default=0.3)
+    parser.add_argument("--token-rate", type=float, default=50.0, help="生成速度(token/s)")
+    parser.add_argument("--capacity", type=int, default=0, help="并行处理的请求数，超出的排队（0为不限）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回500的概率")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="卡死不响应的概率")
+
+
+def config_from_args(args: argparse.Namespace) -> FakeOllamaConfig:
+    return FakeOllamaConfig(
+        latency_ms=args.latency_ms,
+        jitter=args.jitter,
+        jitter_sigma=args.jitter_sigma,
+        token_rate=args.token_rate,
+        capacity=args.capacity,
+        error_rate=args.error_rate,
+        hang_rate=args.hang_rate
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="模拟Ollama服务")
+    parser.add_argument("--port", type=int, default=11500)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(config_from_args(args)), host="127.0.0.1", port=args.port)
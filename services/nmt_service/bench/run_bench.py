@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NMT翻译服务基准测试
+
+在本地启动模拟Ollama（fake_ollama.py），在不同批大小与并发度下压测
+MultiTranslator.translate_batch（--target translator）或 /translate 接口（--target http，进程内ASGI调用），
+输出 行/秒、请求延迟 p50/p95/p99 以及模拟Ollama收到的调用次数。
+
+示例：
+    python run_bench.py --batch-sizes 1,10,40 --concurrency 1,4,16 --requests 32
+    python run_bench.py --target http --latency-ms 500 --error-rate 0.05
+    OLLAMA_PACK_MODE=true python run_bench.py --batch-sizes 40
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import List
+
+import uvicorn
+
+from fake_ollama import add_arguments, config_from_args, create_app
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+
+# 模拟OCR行：短UI文案为主，夹杂少量长句
+_WORDS = ["Settings", "Cancel", "Submit", "Total", "Account", "Profile", "Search", "Help",
+          "Open file", "Save changes", "Delete item", "Sign in", "Log out", "Next page"]
+_SENTENCES = ["Please check your network connection and try again.",
+              "The document you requested could not be found on this server.",
+              "Your changes have been saved successfully."]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_fake_ollama(args) -> tuple:
+    """在后台线程中启动 args.hosts 个模拟Ollama（共享同一配置与统计），返回(地址列表, 配置)"""
+    config = config_from_args(args)
+    app = create_app(config)
+    hosts = []
+    for _ in range(args.hosts):
+        port = _free_port()
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        threading.Thread(target=server.run, daemon=True).start()
+        while not server.started:
+            time.sleep(0.05)
+        hosts.append(f"http://127.0.0.1:{port}")
+    return hosts, config
+
+
+def _make_lines(batch_size: int, unique_ratio: float, rng: random.Random) -> List[str]:
+    """生成一批测试行，unique_ratio控制行之间的重复程度"""
+    pool_size = max(1, int(batch_size * unique_ratio))
+    pool = []
+    for i in range(pool_size):
+        if rng.random() < 0.1:
+            pool.append(f"{rng.choice(_SENTENCES)} #{rng.randint(0, 10 ** 6)}")
+        else:
+            pool.append(f"{rng.choice(_WORDS)} {rng.randint(0, 10 ** 6)}x")
+    return [rng.choice(pool) for _ in range(batch_size)]
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+async def _run_case(call, batch_size: int, concurrency: int, requests: int,
+                    unique_ratio: float, seed: int, fake_config) -> dict:
+    """以固定并发度发送requests个请求"""
+    rng = random.Random(seed)
+    batches = [_make_lines(batch_size, unique_ratio, rng) for _ in range(requests)]
+    latencies: List[float] = []
+    errors = 0
+    calls_before = fake_config.stats["calls"]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(lines: List[str]):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            translations = await call(lines)
+            latencies.append((time.perf_counter() - start) * 1000)
+            errors += sum(1 for t in translations if t.startswith("[ERR]"))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(lines) for lines in batches))
+    elapsed = time.perf_counter() - start
+    total_lines = batch_size * requests
+
+    return {
+        "batch": batch_size,
+        "conc": concurrency,
+        "lines/s": total_lines / elapsed,
+        "p50_ms": _percentile(latencies, 0.5),
+        "p95_ms": _percentile(latencies, 0.95),
+        "p99_ms": _percentile(latencies, 0.99),
+        "engine_calls": fake_config.stats["calls"] - calls_before,
+        "err_lines": errors
+    }
+
+
+async def main(args):
+    hosts, fake_config = _start_fake_ollama(args)
+
+    # 环境变量需在导入翻译模块之前设置；翻译记忆默认放在临时目录，避免命中上次运行的结果
+    os.environ["USE_OLLAMA"] = "true"
+    os.environ["OLLAMA_HOST"] = ",".join(hosts)
+    os.environ.setdefault("TM_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="nmt-bench-"), "tm.db"))
+    if not args.with_memory:
+        os.environ["TM_ENABLED"] = "false"
+        os.environ["FUZZY_TM_ENABLED"] = "false"
+    sys.path.insert(0, str(SERVICE_DIR))
+
+    if args.target == "translator":
+        from translator import MultiTranslator
+        translator = MultiTranslator()
+
+        async def call(lines: List[str]) -> List[str]:
+            return await translator.translate_batch(lines, args.target_lang)
+    else:
+        import httpx
+        import server
+
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://nmt", timeout=None)
+
+        async def call(lines: List[str]) -> List[str]:
+            response = await client.post("/translate", json={"lines": lines, "target_lang": args.target_lang})
+            response.raise_for_status()
+            return response.json()["translations"]
+
+    print(f"🔧 模拟Ollama: {', '.join(hosts)} (延迟 {args.latency_ms}ms/{args.jitter}, {args.token_rate} token/s, "
+          f"错误率 {args.error_rate}), 目标: {args.target}")
+    header = f"{'batch':>6} {'conc':>5} {'lines/s':>9} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9} {'calls':>7} {'err':>5}"
+    print(header)
+    print("-" * len(header))
+
+    seed = 0
+    for batch_size in [int(x) for x in args.batch_sizes.split(",")]:
+        for concurrency in [int(x) for x in args.concurrency.split(",")]:
+            seed += 1
+            row = await _run_case(call, batch_size, concurrency, args.requests,
+                                  args.unique_ratio, seed, fake_config)
+            print(f"{row['batch']:>6} {row['conc']:>5} {row['lines/s']:>9.1f} {row['p50_ms']:>9.0f} "
+                  f"{row['p95_ms']:>9.0f} {row['p99_ms']:>9.0f} {row['engine_calls']:>7} {row['err_lines']:>5}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NMT翻译服务基准测试")
+    parser.add_argument("--target", choices=["translator", "http"], default="translator",
+                        help="translator: 直接调用MultiTranslator；http: 进程内调用/translate")
+    parser.add_argument("--batch-sizes", default="1,10,40", help="每个请求的行数，逗号分隔")
+    parser.add_argument("--concurrency", default="1,4,16", help="并发请求数，逗号分隔")
+    parser.add_argument("--requests", type=int, default=32, help="每组参数发送的请求数")
+    parser.add_argument("--unique-ratio", type=float, default=1.0, help="请求内不同行的比例（<1时有重复行）")
+    parser.add_argument("--target-lang", default="zh")
+    parser.add_argument("--hosts", type=int, default=1, help="启动的模拟Ollama数量，测试多主机池")
+    parser.add_argument("--with-memory", action="store_true", help="启用翻译记忆（默认关闭以测量引擎路径）")
+    add_arguments(parser)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+词典编译工具（离线运行）
+
+从CSV或TMX编译某个语言对的词典文件，输出 {输出目录}/{源语言}-{目标语言}.lex，
+翻译服务启动时从 LEXICON_DIR 加载。
+
+CSV：表头包含源语言和目标语言代码两列（如 en,zh），或 source,target 两列
+TMX：取每个翻译单元中对应语言的 <seg>
+
+示例：
+    python build_lexicon.py ui_strings.csv --source en --target zh --output ../../data/nmt/lexicon
+    python build_lexicon.py memory.tmx --source en --target ja --output ../../data/nmt/lexicon --max-words 3
+"""
+
+import argparse
+import csv
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+from typing import Iterator, Tuple
+
+from lexicon import write_lexicon
+
+_XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+
+
+def _lang_matches(value: str, lang: str) -> bool:
+    """TMX语言标签按主语言匹配：zh-CN、zh_Hans 都算 zh"""
+    return value.replace("_", "-").split("-")[0].lower() == lang.lower()
+
+
+def read_csv(path: str, source_lang: str, target_lang: str) -> Iterator[Tuple[str, str]]:
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        fields = reader.fieldnames or []
+        if source_lang in fields and target_lang in fields:
+            source_col, target_col = source_lang, target_lang
+        elif "source" in fields and "target" in fields:
+            source_col, target_col = "source", "target"
+        else:
+            raise ValueError(f"CSV表头需包含 {source_lang},{target_lang} 或 source,target 列: {fields}")
+        for row in reader:
+            yield row.get(source_col) or "", row.get(target_col) or ""
+
+
+def read_tmx(path: str, source_lang: str, target_lang: str) -> Iterator[Tuple[str, str]]:
+    for _, element in ET.iterparse(path, events=("end",)):
+        if element.tag != "tu":
+            continue
+        segments = {}
+        for tuv in element.iter("tuv"):
+            lang = tuv.get(_XML_LANG) or tuv.get("lang") or ""
+            seg = tuv.find("seg")
+            if seg is not None:
+                segments[lang] = "".join(seg.itertext())
+        source = next((text for lang, text in segments.items() if _lang_matches(lang, source_lang)), None)
+        target = next((text for lang, text in segments.items() if _lang_matches(lang, target_lang)), None)
+        if source and target:
+            yield source, target
+        element.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="从CSV/TMX编译内存映射词典")
+    parser.add_argument("input", help="CSV或TMX文件")
+    parser.add_argument("--source", required=True, help="源语言代码，如 en")
+    parser.add_argument("--target", required=True, help="目标语言代码，如 zh")
+    parser.add_argument("--output", default=".", help="输出目录")
+    parser.add_argument("--max-words", type=int, default=0, help="只收录不超过该词数的原文，0为不限制")
+    args = parser.parse_args()
+
+    reader = read_tmx if args.input.lower().endswith(".tmx") else read_csv
+    entries = reader(args.input, args.source, args.target)
+    if args.max_words:
+        entries = ((s, t) for s, t in entries if len(s.split()) <= args.max_words)
+
+    os.makedirs(args.output, exist_ok=True)
+    output = os.path.join(args.output, f"{args.source}-{args.target}.lex")
+    start = time.perf_counter()
+    try:
+        count = write_lexicon(entries, output)
+    except (ValueError, ET.ParseError) as e:
+        print(f"❌ 编译失败: {e}")
+        sys.exit(1)
+    print(f"✅ 已写入 {output}: {count} 条，耗时 {(time.perf_counter() - start) * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
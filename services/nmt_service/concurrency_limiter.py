@@ -0,0 +1,147 @@
+"""
+自适应并发限制（AIMD）
+根据观测到的延迟和错误自动调整同时在途的引擎请求数：
+延迟接近基线且限额被用满时加性增加，出错、超时或延迟明显高于基线（开始排队）时乘性减少
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveLimiter:
+    """AIMD并发限制器"""
+
+    def __init__(self, initial: int, min_limit: int = 1, max_limit: int = 64,
+                 latency_tolerance: float = 2.0, backoff: float = 0.7,
+                 baseline_window: int = 200, history_size: int = 120):
+        """
+        Args:
+            initial: 初始限额
+            min_limit: 限额下限
+            max_limit: 限额上限（等于下限时为固定限额）
+            latency_tolerance: 单位延迟超过基线的该倍数时视为排队，减少限额
+            backoff: 乘性减少系数
+            baseline_window: 基线取最近该数量样本单位延迟的10分位数
+            history_size: 保留的限额变化记录条数
+        """
+        self.min_limit = min_limit
+        self.max_limit = max(min_limit, max_limit)
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self._limit = float(min(self.max_limit, max(min_limit, initial)))
+        self._in_flight = 0
+        self._waiters: deque = deque()
+        self._samples: deque = deque(maxlen=baseline_window)  # 单位延迟(ms/工作量)
+        self._latency_ms = 0.0  # 整体延迟EWMA，作为两次减少之间的最小间隔
+        self._last_decrease = 0.0
+        self._history: deque = deque(maxlen=history_size)
+        self._stats = {"increases": 0, "decreases": 0, "errors": 0, "slow": 0, "completed": 0}
+        self._record_history("init")
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    async def acquire(self):
+        """等待空闲名额"""
+        if self._in_flight < self.limit and not self._waiters:
+            self._in_flight += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            # 已分到名额后才被取消时归还名额
+            if future.done() and not future.cancelled():
+                self._in_flight -= 1
+                self._wake()
+            else:
+                self._waiters.remove(future)
+            raise
+
+    def release(self, latency_ms: float, ok: Optional[bool], work: float = 1.0):
+        """
+        归还名额并按本次结果调整限额
+
+        Args:
+            latency_ms: 从拿到名额到完成的耗时
+            ok: 是否成功；None表示被取消（只在耗时已明显超出基线时作为排队信号）
+            work: 本次请求的工作量（如估算token数），延迟按单位工作量比较
+        """
+        saturated = self._in_flight >= self.limit
+        self._in_flight -= 1
+        per_unit = latency_ms / max(work, 1.0)
+        baseline = self._baseline()
+
+        if ok is False:
+            self._stats["errors"] += 1
+            self._decrease("error")
+        elif baseline is not None and per_unit > baseline * self.latency_tolerance:
+            self._stats["slow"] += 1
+            self._decrease("latency")
+        elif ok:
+            if saturated and self._limit < self.max_limit:
+                # 每完成limit个请求约增加1
+                before = self.limit
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+                if self.limit != before:
+                    self._stats["increases"] += 1
+                    self._record_history("increase")
+
+        if ok:
+            self._stats["completed"] += 1
+            self._samples.append(per_unit)
+            self._latency_ms = latency_ms if not self._latency_ms else 0.8 * self._latency_ms + 0.2 * latency_ms
+        self._wake()
+
+    def _baseline(self) -> Optional[float]:
+        """无排队时的单位延迟估计（近期样本的10分位数）"""
+        if len(self._samples) < 10:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[len(ordered) // 10]
+
+    def _decrease(self, reason: str):
+        """乘性减少；一个平均延迟周期内只减一次，避免同一波超时把限额连续压到底"""
+        now = time.monotonic()
+        interval = self._latency_ms / 1000 if self._latency_ms else 1.0
+        if now - self._last_decrease < interval:
+            return
+        self._last_decrease = now
+        before = self.limit
+        self._limit = max(float(self.min_limit), self._limit * self.backoff)
+        if self.limit != before:
+            self._stats["decreases"] += 1
+            self._record_history(reason)
+            logger.info(f"并发限额下调 {before} → {self.limit}（{reason}）")
+
+    def _wake(self):
+        while self._waiters and self._in_flight < self.limit:
+            future = self._waiters.popleft()
+            if future.done():
+                continue
+            self._in_flight += 1
+            future.set_result(None)
+
+    def _record_history(self, reason: str):
+        self._history.append({"time": round(time.time(), 3), "limit": self.limit, "reason": reason})
+
+    def get_state(self) -> Dict[str, Any]:
+        """当前限额、在途数与限额变化历史"""
+        return {
+            "limit": self.limit,
+            "in_flight": self._in_flight,
+            "waiting": len(self._waiters),
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "baseline_ms_per_unit": round(self._baseline(), 3) if self._baseline() else None,
+            "avg_latency_ms": round(self._latency_ms, 1),
+            **self._stats,
+            "history": list(self._history)
+        }
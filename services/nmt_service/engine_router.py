@@ -0,0 +1,168 @@
+"""
+翻译引擎路由
+按各引擎滚动的延迟与错误率选择引擎，失败过多时熔断并切换到下一个引擎
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# 熔断器状态
+CLOSED = "closed"        # 正常
+OPEN = "open"            # 熔断中，不接收请求
+HALF_OPEN = "half_open"  # 冷却结束，放行一次探测请求
+
+
+def _percentile(values: List[float], q: float) -> float:
+    """简单分位数（最近秩法）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class _EngineHealth:
+    """单个引擎的滚动统计与熔断状态"""
+
+    def __init__(self, window: int):
+        self.samples: deque = deque(maxlen=window)  # (每行耗时ms, 是否成功)
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.probe_started = 0.0
+        self.calls = 0
+        self.failures = 0
+
+
+class EngineRouter:
+    """基于延迟和错误率的引擎路由器（含熔断）"""
+
+    def __init__(self, engines: List[str], window: int = 100, min_samples: int = 5,
+                 error_rate_threshold: float = 0.5, consecutive_failures: int = 3,
+                 cooldown: float = 30.0):
+        """
+        Args:
+            engines: 参与路由的引擎，按优先级排列（延迟相近时优先靠前的）
+            window: 滚动窗口大小（调用次数）
+            min_samples: 按错误率熔断所需的最少样本数
+            error_rate_threshold: 窗口内错误率达到该值时熔断
+            consecutive_failures: 连续失败达到该次数时熔断
+            cooldown: 熔断后多少秒进入半开状态
+        """
+        self.engines = list(engines)
+        self.min_samples = min_samples
+        self.error_rate_threshold = error_rate_threshold
+        self.consecutive_failures = consecutive_failures
+        self.cooldown = cooldown
+        self._health = {engine: _EngineHealth(window) for engine in self.engines}
+        self._lock = threading.Lock()
+
+    def candidates(self) -> List[str]:
+        """
+        当前可用的引擎，按优先顺序排列
+
+        半开状态的引擎只放行一次探测；全部熔断时返回空列表
+        """
+        now = time.monotonic()
+        ranked = []
+        with self._lock:
+            for priority, engine in enumerate(self.engines):
+                health = self._health[engine]
+                if health.state == OPEN and now - health.opened_at >= self.cooldown:
+                    health.state = HALF_OPEN
+                    health.probing = False
+                    logger.info(f"🔄 引擎 {engine} 熔断冷却结束，进入半开状态")
+                if health.state == OPEN:
+                    continue
+                if health.state == HALF_OPEN:
+                    # 半开引擎优先放行一次探测，以便及时恢复；探测被取消而未回报时，冷却后可再次探测
+                    if not health.probing or now - health.probe_started >= self.cooldown:
+                        ranked.append((0.0, priority, engine))
+                    continue
+                # 样本不足的引擎视为延迟0，优先试探
+                latencies = [ms for ms, _ in health.samples]
+                p50 = _percentile(latencies, 0.5) if len(latencies) >= self.min_samples else 0.0
+                ranked.append((p50, priority, engine))
+        ranked.sort()
+        return [engine for *_, engine in ranked]
+
+    def begin(self, engine: str):
+        """开始一次调用（半开状态下标记探测进行中）"""
+        with self._lock:
+            health = self._health[engine]
+            if health.state == HALF_OPEN:
+                health.probing = True
+                health.probe_started = time.monotonic()
+
+    def best(self) -> str:
+        """当前首选引擎（全部熔断时返回优先级最高的引擎）"""
+        candidates = self.candidates()
+        return candidates[0] if candidates else self.engines[0]
+
+    def record(self, engine: str, latency_ms: float, lines: int, errors: int):
+        """
+        记录一次调用结果
+
+        Args:
+            engine: 引擎名
+            latency_ms: 本次调用总耗时
+            lines: 本次调用的行数
+            errors: 失败的行数（超过一半视为本次调用失败）
+        """
+        ok = errors * 2 < max(lines, 1)
+        with self._lock:
+            health = self._health[engine]
+            health.samples.append((latency_ms / max(lines, 1), ok))
+            health.calls += 1
+
+            if ok:
+                health.consecutive_failures = 0
+                if health.state == HALF_OPEN:
+                    health.state = CLOSED
+                    health.probing = False
+                    logger.info(f"✅ 引擎 {engine} 探测成功，熔断关闭")
+                return
+
+            health.failures += 1
+            health.consecutive_failures += 1
+            window_errors = sum(1 for _, sample_ok in health.samples if not sample_ok)
+            error_rate = window_errors / len(health.samples)
+            should_open = (
+                health.state == HALF_OPEN
+                or health.consecutive_failures >= self.consecutive_failures
+                or (len(health.samples) >= self.min_samples and error_rate >= self.error_rate_threshold)
+            )
+            if should_open and health.state != OPEN:
+                health.state = OPEN
+                health.opened_at = time.monotonic()
+                health.probing = False
+                logger.warning(f"⛔ 引擎 {engine} 熔断：连续失败 {health.consecutive_failures} 次，"
+                               f"窗口错误率 {error_rate:.0%}")
+
+    def get_state(self) -> Dict[str, Any]:
+        """各引擎的路由状态"""
+        now = time.monotonic()
+        state = {}
+        with self._lock:
+            for engine in self.engines:
+                health = self._health[engine]
+                latencies = [ms for ms, _ in health.samples]
+                errors = sum(1 for _, ok in health.samples if not ok)
+                state[engine] = {
+                    "state": health.state,
+                    "p50_ms_per_line": round(_percentile(latencies, 0.5), 1),
+                    "p95_ms_per_line": round(_percentile(latencies, 0.95), 1),
+                    "error_rate": round(errors / len(health.samples), 3) if health.samples else 0.0,
+                    "samples": len(health.samples),
+                    "calls": health.calls,
+                    "failures": health.failures,
+                    "consecutive_failures": health.consecutive_failures,
+                    "open_for_s": round(now - health.opened_at, 1) if health.state == OPEN else 0.0
+                }
+        return state
@@ -0,0 +1,177 @@
+"""
+模糊翻译记忆
+只对OCR噪声造成的近似重复行复用已有译文：空白差异、独立数字不同（译文中的数字随之替换）、
+以及少量形近字符误认（如 Sett1ngs / Settings、0K / OK）。
+字母之间的差异（Lock/Unlock、mail/mall）会改变含义，一律不算命中
+"""
+
+import logging
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 独立的数字（不含嵌在单词里的，如 "Sett1ngs"）
+_NUMBER_RE = re.compile(r'(?<![A-Za-z])\d+(?:[.,:]\d+)*(?![A-Za-z])')
+# 模板中数字的占位符
+_NUMBER_MARK = "#"
+# 译文模板中第i个数字的占位符
+_SLOT = "\x00{}\x00"
+_SLOT_RE = re.compile(r'\x00(\d+)\x00')
+# 标点前、左括号后的空白（OCR常多识别出一个空格）
+_PUNCT_SPACE_RE = re.compile(r'\s+(?=[,.:;!?)\]}，。：；！？）])|(?<=[(\[{（])\s+')
+
+# OCR形近字符组，同组字符映射到同一代表字符
+_CONFUSABLE_GROUPS = ["lI1|!i", "oO0", "sS5$", "zZ2", "B8", "g9", "\"“”″", "'‘’`´", "-–—‐"]
+_CANONICAL = {char: group[0] for group in _CONFUSABLE_GROUPS for char in group}
+
+
+def _normalize(text: str) -> str:
+    """合并连续空白，去掉标点前多余的空格"""
+    return _PUNCT_SPACE_RE.sub("", " ".join(text.split()))
+
+
+def _mask_numbers(text: str) -> Tuple[str, List[str]]:
+    """把数字替换为占位符，返回(模板, 数字列表)"""
+    numbers = _NUMBER_RE.findall(text)
+    return _NUMBER_RE.sub(_NUMBER_MARK, text), numbers
+
+
+def _canonical(template: str) -> str:
+    """形近字符归一后的形式，作为近似匹配的索引键"""
+    return "".join(_CANONICAL.get(char, char) for char in template)
+
+
+def _noise_edits(query: str, candidate: str) -> Optional[int]:
+    """
+    两个归一形式相同的模板之间的替换数
+
+    每处差异都必须有一方不是字母（数字、符号被误认为字母或相反）；两边都是字母时返回None
+    """
+    edits = 0
+    for a, b in zip(query, candidate):
+        if a == b:
+            continue
+        if a.isalpha() and b.isalpha():
+            return None
+        edits += 1
+    return edits
+
+
+class _Entry:
+    """索引条目"""
+    __slots__ = ("template", "numbers", "translation", "complete")
+
+    def __init__(self, template: str, numbers: List[str], translation: str, complete: bool):
+        self.template = template
+        self.numbers = numbers
+        self.translation = translation  # 数字已替换为槽位的译文模板
+        self.complete = complete        # 原文中的数字是否都能在译文中找到
+
+
+class _Partition:
+    """同一语言对/引擎/模型下的索引"""
+
+    def __init__(self):
+        self.entries: List[_Entry] = []
+        self.by_template: Dict[str, int] = {}
+        self.by_canonical: Dict[str, List[int]] = {}
+
+
+class FuzzyMemory:
+    """容忍OCR噪声的近似匹配翻译记忆（按形近字符归一后的模板索引）"""
+
+    def __init__(self, max_edits: int = 2, max_entries: int = 100000):
+        """
+        Args:
+            max_edits: 最多允许的形近字符替换数（另外不超过模板长度的1/4，至少1处）
+            max_entries: 每个分区最多收录的条目数
+        """
+        self.max_edits = max_edits
+        self.max_entries = max_entries
+        self._partitions: Dict[Tuple[str, str, str, str], _Partition] = {}
+        self._lock = threading.Lock()
+        # number_hits: 仅空白/数字不同；noise_hits: 含形近字符替换
+        self._stats = {"number_hits": 0, "noise_hits": 0, "misses": 0, "entries": 0}
+
+    def add(self, text: str, translation: str, source_lang: str, target_lang: str, engine: str, model: str):
+        """加入一条已确认的翻译"""
+        template, numbers = _mask_numbers(_normalize(text))
+        if not template.strip():
+            return
+
+        # 译文里与原文相同的数字替换为槽位，便于套用新的数字
+        unused = list(enumerate(numbers))
+        mapped = 0
+
+        def to_slot(match):
+            nonlocal mapped
+            for k, (i, number) in enumerate(unused):
+                if number == match.group(0):
+                    del unused[k]
+                    mapped += 1
+                    return _SLOT.format(i)
+            return match.group(0)
+
+        translation_template = _NUMBER_RE.sub(to_slot, translation)
+        entry = _Entry(template, numbers, translation_template, mapped == len(numbers))
+
+        key = (source_lang, target_lang, engine, model)
+        with self._lock:
+            partition = self._partitions.setdefault(key, _Partition())
+            existing = partition.by_template.get(template)
+            if existing is not None:
+                partition.entries[existing] = entry
+                return
+            if len(partition.entries) >= self.max_entries:
+                return
+            entry_id = len(partition.entries)
+            partition.entries.append(entry)
+            partition.by_template[template] = entry_id
+            partition.by_canonical.setdefault(_canonical(template), []).append(entry_id)
+            self._stats["entries"] += 1
+
+    def lookup(self, text: str, source_lang: str, target_lang: str, engine: str, model: str) -> Optional[str]:
+        """查找只差OCR噪声的已有翻译，未命中返回None"""
+        template, numbers = _mask_numbers(_normalize(text))
+        key = (source_lang, target_lang, engine, model)
+
+        with self._lock:
+            partition = self._partitions.get(key)
+            result, kind = self._lookup(partition, template, numbers) if partition else (None, "misses")
+            self._stats[kind] += 1
+        return result
+
+    def _lookup(self, partition: _Partition, template: str,
+                numbers: List[str]) -> Tuple[Optional[str], str]:
+        """在分区内查找，返回(译文, 统计项)（调用方持有锁）"""
+        exact = partition.by_template.get(template)
+        if exact is not None:
+            candidates = [(0, exact)]
+        else:
+            limit = min(self.max_edits, max(1, len(template) // 4))
+            candidates = []
+            for entry_id in partition.by_canonical.get(_canonical(template), []):
+                edits = _noise_edits(template, partition.entries[entry_id].template)
+                if edits is not None and edits <= limit:
+                    candidates.append((edits, entry_id))
+            candidates.sort()
+
+        for edits, entry_id in candidates:
+            entry = partition.entries[entry_id]
+            if len(entry.numbers) != len(numbers):
+                continue
+            if not entry.complete and entry.numbers != numbers:
+                continue
+            translation = _SLOT_RE.sub(lambda m: numbers[int(m.group(1))], entry.translation)
+            return translation, "noise_hits" if edits else "number_hits"
+        return None, "misses"
+
+    def get_stats(self) -> Dict[str, int]:
+        """命中统计"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["hits"] = stats["number_hits"] + stats["noise_hits"]
+        stats["max_edits"] = self.max_edits
+        return stats
@@ -0,0 +1,220 @@
+"""
+术语表保护
+用Aho-Corasick自动机一次扫描找出行内全部术语，翻译前替换为占位符，翻译后还原为术语的固定译法（或原文）；
+引擎丢失占位符时由调用方改用不做术语保护的译文，术语不会从译文中消失；
+匹配耗时只与文本长度和命中数有关，与术语表大小无关
+"""
+
+import csv
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 占位符：⟦1⟧、⟦2⟧…，还原时容忍模型在编号两侧加空格
+PLACEHOLDER = "⟦{}⟧"
+_PLACEHOLDER_RE = re.compile(r'⟦\s*(\d+)\s*⟧')
+# 去掉占位符后没有任何字母，说明整行都是术语
+_LETTER_RE = re.compile(r'[^\W\d_]')
+
+
+def _is_word_char(char: str) -> bool:
+    """需要做词边界判断的字符（字母数字，不含中日韩文字）"""
+    return char.isalnum() and ord(char) < 0x2E80
+
+
+class _Automaton:
+    """Aho-Corasick自动机（构建后只读，可被多个协程同时使用）"""
+
+    def __init__(self, terms: List[str]):
+        self.terms = terms
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._term: List[int] = [-1]      # 以该节点结尾的术语下标
+        self._dict_link: List[int] = [0]  # 沿失败链最近的术语节点
+        for index, term in enumerate(terms):
+            self._insert(term, index)
+        self._build_links()
+
+    def _insert(self, term: str, index: int):
+        node = 0
+        for char in term:
+            child = self._goto[node].get(char)
+            if child is None:
+                child = len(self._goto)
+                self._goto[node][char] = child
+                self._goto.append({})
+                self._fail.append(0)
+                self._term.append(-1)
+                self._dict_link.append(0)
+            node = child
+        self._term[node] = index
+
+    def _build_links(self):
+        """按BFS顺序计算失败链接和输出链接"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                target = self._fail[child]
+                self._dict_link[child] = target if self._term[target] >= 0 else self._dict_link[target]
+
+    @property
+    def size(self) -> int:
+        return len(self._goto)
+
+    def find_all(self, text: str) -> List[Tuple[int, int, int]]:
+        """返回全部命中 (起点, 终点, 术语下标)"""
+        matches = []
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            hit = node if self._term[node] >= 0 else self._dict_link[node]
+            while hit:
+                index = self._term[hit]
+                matches.append((position + 1 - len(self.terms[index]), position + 1, index))
+                hit = self._dict_link[hit]
+        return matches
+
+
+class Glossary:
+    """
+    术语表
+
+    文件为CSV，表头第一列为 source，其余列为目标语言代码（zh、ja…）：
+        source,zh,ja
+        PhotoPal,,             （译文为空：各语言都保持原文）
+        Smart Crop,智能裁剪,スマートクロップ
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # (自动机, 各术语的译法)，作为一个整体替换，读取时无需加锁
+        self._table: Tuple[Optional[_Automaton], List[Dict[str, str]]] = (None, [])
+        self._lock = threading.Lock()
+        self._stats = {"entries": 0, "nodes": 0, "loaded_at": None, "load_ms": 0.0,
+                       "lines_protected": 0, "terms_protected": 0, "unrestored": 0}
+
+    def load(self) -> int:
+        """
+        读取术语表并构建自动机，构建完成后整体替换旧自动机（重载期间的请求继续使用旧表）
+
+        Returns:
+            术语条数
+        """
+        start = time.perf_counter()
+        targets: Dict[str, Dict[str, str]] = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8-sig", newline="") as f:
+                for row in csv.DictReader(f):
+                    source = (row.pop("source", None) or "").strip()
+                    if source:
+                        targets[source] = {lang: value.strip() for lang, value in row.items()
+                                           if lang and value and value.strip()}
+        else:
+            logger.warning(f"⚠️ 术语表文件不存在: {self.path}")
+
+        terms = list(targets)
+        automaton = _Automaton(terms) if terms else None
+        with self._lock:
+            self._table = (automaton, [targets[term] for term in terms])
+            self._stats["entries"] = len(terms)
+            self._stats["nodes"] = automaton.size if automaton else 0
+            self._stats["loaded_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+            self._stats["load_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        logger.info(f"✅ 术语表加载完成: {len(terms)} 条，耗时 {self._stats['load_ms']}ms")
+        return len(terms)
+
+    @property
+    def entries(self) -> int:
+        return self._stats["entries"]
+
+    def protect(self, text: str, target_lang: str) -> Tuple[str, List[str]]:
+        """
+        把行内术语替换为占位符（重叠时取最左最长的术语，拉丁字母术语要求词边界）
+
+        Returns:
+            (替换后的文本, 各占位符对应的还原文本；编号从1开始)
+        """
+        automaton, targets = self._table
+        if automaton is None:
+            return text, []
+
+        matches = automaton.find_all(text)
+        if not matches:
+            return text, []
+        matches.sort(key=lambda m: (m[0], -m[1]))
+
+        parts: List[str] = []
+        replacements: List[str] = []
+        cursor = 0
+        for start, end, index in matches:
+            if start < cursor:
+                continue
+            if _is_word_char(text[start]) and start > 0 and _is_word_char(text[start - 1]):
+                continue
+            if _is_word_char(text[end - 1]) and end < len(text) and _is_word_char(text[end]):
+                continue
+            parts.append(text[cursor:start])
+            replacements.append(targets[index].get(target_lang, text[start:end]))
+            parts.append(PLACEHOLDER.format(len(replacements)))
+            cursor = end
+        if not replacements:
+            return text, []
+        parts.append(text[cursor:])
+
+        self._stats["lines_protected"] += 1
+        self._stats["terms_protected"] += len(replacements)
+        return "".join(parts), replacements
+
+    def restore(self, translation: str, replacements: List[str], partial: bool = False) -> Optional[str]:
+        """
+        把译文中的占位符还原为术语译法
+
+        Args:
+            translation: 含占位符的译文
+            replacements: protect返回的还原文本
+            partial: 是否为生成中的部分译文（后面的占位符可能还没生成，只还原已出现的）
+
+        Returns:
+            还原后的译文；有占位符丢失或被改写时返回None（调用方应改用不做术语保护的译文）
+        """
+        if not replacements:
+            return translation
+        restored = set()
+
+        def substitute(match: re.Match) -> str:
+            number = int(match.group(1))
+            if 1 <= number <= len(replacements):
+                restored.add(number)
+                return replacements[number - 1]
+            return match.group(0)
+
+        translation = _PLACEHOLDER_RE.sub(substitute, translation)
+        if len(restored) < len(replacements) and not partial:
+            self._stats["unrestored"] += len(replacements) - len(restored)
+            logger.warning(f"⚠️ 译文丢失 {len(replacements) - len(restored)} 个术语占位符: {translation[:50]}")
+            return None
+        return translation
+
+    @staticmethod
+    def only_terms(text: str) -> bool:
+        """替换后的文本是否只剩占位符和标点（整行都是术语，无需翻译）"""
+        return bool(_PLACEHOLDER_RE.search(text)) and not _LETTER_RE.search(_PLACEHOLDER_RE.sub("", text))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """术语表统计"""
+        return dict(self._stats, path=self.path)
@@ -0,0 +1,108 @@
+"""
+Ollama多主机池
+按最少在途请求数分配主机，根据请求结果被动地摘除和恢复主机，并统计各主机吞吐
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 吞吐统计窗口（秒）
+_THROUGHPUT_WINDOW = 60.0
+
+
+class _HostState:
+    """单个主机的状态"""
+
+    def __init__(self):
+        self.outstanding = 0
+        self.completed = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.total_latency_ms = 0.0
+        self.recent: deque = deque()  # 最近完成请求的时间戳
+
+
+class HostPool:
+    """最少在途请求负载均衡 + 被动健康检查"""
+
+    def __init__(self, hosts: List[str], max_failures: int = 3, eject_seconds: float = 30.0):
+        """
+        Args:
+            hosts: 主机地址列表
+            max_failures: 连续失败达到该次数时摘除主机
+            eject_seconds: 摘除时长，到期后重新接纳（再次失败会立即再摘除）
+        """
+        self.hosts = list(hosts)
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self._state = {host: _HostState() for host in self.hosts}
+        self._lock = threading.Lock()
+
+    def acquire(self, exclude: Optional[List[str]] = None) -> str:
+        """
+        选择在途请求最少的可用主机并计入在途数
+
+        所有主机都被摘除时，选择最早到期的那台，避免请求完全无处可发
+        """
+        now = time.monotonic()
+        with self._lock:
+            candidates = [host for host in self.hosts if not exclude or host not in exclude] or self.hosts
+            admitted = [host for host in candidates if self._state[host].ejected_until <= now]
+            if admitted:
+                host = min(admitted, key=lambda h: (self._state[h].outstanding, self.hosts.index(h)))
+            else:
+                host = min(candidates, key=lambda h: self._state[h].ejected_until)
+            self._state[host].outstanding += 1
+            return host
+
+    def release(self, host: str, ok: Optional[bool], latency_ms: float = 0.0):
+        """归还主机并记录本次请求结果（ok为None表示请求被取消，不计入健康统计）"""
+        now = time.monotonic()
+        with self._lock:
+            state = self._state[host]
+            state.outstanding -= 1
+            if ok is None:
+                return
+            if ok:
+                if state.ejected_until:
+                    logger.info(f"✅ Ollama主机 {host} 恢复")
+                state.consecutive_failures = 0
+                state.ejected_until = 0.0
+                state.completed += 1
+                state.total_latency_ms += latency_ms
+                state.recent.append(now)
+                while state.recent and now - state.recent[0] > _THROUGHPUT_WINDOW:
+                    state.recent.popleft()
+                return
+
+            state.failures += 1
+            state.consecutive_failures += 1
+            if state.consecutive_failures >= self.max_failures:
+                state.ejected_until = now + self.eject_seconds
+                logger.warning(f"⛔ Ollama主机 {host} 连续失败 {state.consecutive_failures} 次，"
+                               f"摘除 {self.eject_seconds:.0f}s")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各主机状态与吞吐"""
+        now = time.monotonic()
+        stats = {}
+        with self._lock:
+            for host in self.hosts:
+                state = self._state[host]
+                recent = sum(1 for t in state.recent if now - t <= _THROUGHPUT_WINDOW)
+                stats[host] = {
+                    "healthy": state.ejected_until <= now,
+                    "outstanding": state.outstanding,
+                    "completed": state.completed,
+                    "failures": state.failures,
+                    "consecutive_failures": state.consecutive_failures,
+                    "requests_per_s": round(recent / _THROUGHPUT_WINDOW, 3),
+                    "avg_latency_ms": round(state.total_latency_ms / state.completed, 1) if state.completed else 0.0
+                }
+        return stats
@@ -0,0 +1,161 @@
+"""
+内存映射词典（短UI文案快速通道）
+每个语言对一个只读的有序字符串表文件（{源语言}-{目标语言}.lex），以mmap打开，
+多个uvicorn worker经由页缓存共享同一份数据；精确命中通过二分查找在微秒级返回
+
+文件格式（小端）：
+    头部    8字节魔数 NMTLEX1\\n，u32 条目数，u32 保留
+    索引    每条 u32 键偏移、u32 键长度、u32 值偏移、u32 值长度（偏移相对数据区起点），按键的UTF-8字节序排列
+    数据区  键和值的UTF-8字节
+"""
+
+import glob
+import logging
+import mmap
+import os
+import struct
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from translation_memory import normalize_text
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"NMTLEX1\n"
+_HEADER = struct.Struct("<8sII")
+_ENTRY = struct.Struct("<IIII")
+
+
+def write_lexicon(entries: Iterable[Tuple[str, str]], path: str) -> int:
+    """
+    把 (原文, 译文) 编译为词典文件（原文经normalize_text归一化，重复的原文保留最后一条）
+
+    Returns:
+        写入的条目数
+    """
+    table: Dict[bytes, bytes] = {}
+    for source, target in entries:
+        key = normalize_text(source)
+        value = target.strip()
+        if key and value:
+            table[key.encode("utf-8")] = value.encode("utf-8")
+
+    index = bytearray()
+    blob = bytearray()
+    for key in sorted(table):
+        value = table[key]
+        index += _ENTRY.pack(len(blob), len(key), len(blob) + len(key), len(value))
+        blob += key
+        blob += value
+
+    # 先写临时文件再原子替换，正在使用旧文件的进程不受影响
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(table), 0))
+        f.write(index)
+        f.write(blob)
+    os.replace(tmp_path, path)
+    return len(table)
+
+
+class Lexicon:
+    """单个语言对的只读词典"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, _ = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError(f"不是词典文件: {path}")
+        self._data_start = _HEADER.size + self.count * _ENTRY.size
+
+    def _entry(self, i: int) -> Tuple[int, int, int, int]:
+        return _ENTRY.unpack_from(self._mm, _HEADER.size + i * _ENTRY.size)
+
+    def get(self, text: str) -> Optional[str]:
+        """精确查找（text需已归一化）"""
+        key = text.encode("utf-8")
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            key_offset, key_length, value_offset, value_length = self._entry(mid)
+            start = self._data_start + key_offset
+            candidate = self._mm[start:start + key_length]
+            if candidate < key:
+                low = mid + 1
+            elif candidate > key:
+                high = mid
+            else:
+                start = self._data_start + value_offset
+                return self._mm[start:start + value_length].decode("utf-8")
+        return None
+
+    def close(self):
+        self._mm.close()
+
+
+class LexiconStore:
+    """按语言对组织的词典集合"""
+
+    def __init__(self, directory: str, max_words: int = 3):
+        """
+        Args:
+            directory: 词典文件目录
+            max_words: 只对不超过该词数的行查词典
+        """
+        self.directory = directory
+        self.max_words = max_words
+        self._lexicons: Dict[Tuple[str, str], Lexicon] = {}
+        self._stats = {"hits": 0, "misses": 0}
+
+        for path in sorted(glob.glob(os.path.join(directory, "*.lex"))):
+            name = os.path.splitext(os.path.basename(path))[0]
+            source_lang, _, target_lang = name.partition("-")
+            if not target_lang:
+                logger.warning(f"⚠️ 词典文件名应为 源语言-目标语言.lex: {path}")
+                continue
+            try:
+                self._lexicons[(source_lang, target_lang)] = Lexicon(path)
+            except Exception as e:
+                logger.warning(f"⚠️ 词典加载失败 {path}: {e}")
+
+    @property
+    def pairs(self) -> List[str]:
+        return [f"{source}-{target}" for source, target in self._lexicons]
+
+    def lookup(self, text: str, source_lang: str, target_lang: str) -> Optional[str]:
+        """
+        查找短文本的译文，未命中返回None
+
+        源语言为auto时依次查所有目标语言相同的词典
+        """
+        text = normalize_text(text)
+        if len(text.split()) > self.max_words:
+            return None
+
+        if source_lang == "auto":
+            lexicons = [lexicon for (_, target), lexicon in self._lexicons.items() if target == target_lang]
+        else:
+            lexicon = self._lexicons.get((source_lang, target_lang))
+            lexicons = [lexicon] if lexicon else []
+
+        for lexicon in lexicons:
+            translation = lexicon.get(text)
+            if translation is not None:
+                self._stats["hits"] += 1
+                return translation
+        self._stats["misses"] += 1
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """词典统计"""
+        stats: Dict[str, Any] = dict(self._stats)
+        stats["entries"] = {f"{source}-{target}": lexicon.count
+                            for (source, target), lexicon in self._lexicons.items()}
+        stats["max_words"] = self.max_words
+        return stats
+
+    def close(self):
+        for lexicon in self._lexicons.values():
+            lexicon.close()
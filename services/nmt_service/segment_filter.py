@@ -0,0 +1,92 @@
+"""
+不需要翻译的片段识别
+纯数字/价格、日期时间、URL、邮箱、纯标点、代码标识符，以及已经是目标语言文字的行直接原样返回
+"""
+
+import re
+from typing import Optional
+
+# 数字、价格、百分比、带单位的数量："12", "-3.5", "$1,299.00", "¥88", "45%", "12.5 kg"
+_NUMBER_RE = re.compile(
+    r'^[+\-±]?[$€£¥￥₩]?\s?\d[\d,\s]*(?:[.]\d+)?\s?'
+    r'(?:%|‰|[$€£¥￥₩]|USD|EUR|RMB|CNY|JPY|kg|g|mg|km|m|cm|mm|ml|L|GB|MB|KB|TB|px|pt|ms|s|h|k|K|M|x)?$'
+)
+# 日期/时间："2024-01-31", "31/01/2024", "12:30", "12:30:45", "2024年1月31日"
+_DATE_TIME_RE = re.compile(
+    r'^(?:\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}'
+    r'|\d{4}年\d{1,2}月(?:\d{1,2}日)?'
+    r'|\d{1,2}月\d{1,2}日)?'
+    r'(?:\s*T?\s*\d{1,2}:\d{2}(?::\d{2})?(?:\s?[AaPp][Mm])?)?$'
+)
+_URL_RE = re.compile(r'^(?:(?:https?|ftp)://|www\.)\S+$', re.IGNORECASE)
+_DOMAIN_RE = re.compile(r'^[\w-]+(?:\.[\w-]+)*\.(?:com|net|org|io|cn|jp|kr|de|fr|es|dev|app|co)(?:/\S*)?$', re.IGNORECASE)
+_EMAIL_RE = re.compile(r'^[\w.+-]+@[\w-]+(?:\.[\w-]+)+$')
+# 代码标识符：snake_case、CONSTANT_CASE、camelCase、a.b.c、func()
+_IDENTIFIER_RE = re.compile(
+    r'^(?:[a-z0-9]+(?:_[a-z0-9]+)+'
+    r'|[A-Z0-9]+(?:_[A-Z0-9]+)+'
+    r'|[a-z]+(?:[A-Z][a-z0-9]*)+'
+    r'|[A-Za-z_]\w+(?:\.[A-Za-z_]\w+)+)'
+    r'(?:\(\))?$'
+)
+_FUNCTION_CALL_RE = re.compile(r'^[A-Za-z_]\w*\(\)$')
+# 没有任何字母或表意文字（纯标点、符号、数字混合）
+_LETTER_RE = re.compile(r'[^\W\d_]')
+
+_HAN_RE = re.compile(r'[㐀-䶿一-鿿豈-﫿]')
+_KANA_RE = re.compile(r'[぀-ヿㇰ-ㇿ]')
+_HANGUL_RE = re.compile(r'[ᄀ-ᇿ㄰-㆏가-힯]')
+_LATIN_RE = re.compile(r'[A-Za-zÀ-ɏ]')
+
+# 目标语言文字占比达到该值即视为已是目标语言
+_SCRIPT_RATIO = 0.9
+
+
+def _in_target_script(text: str, target_lang: str) -> bool:
+    """文本是否已经是目标语言的文字（仅对中日韩判断，拉丁语系之间无法仅凭文字区分）"""
+    han = len(_HAN_RE.findall(text))
+    kana = len(_KANA_RE.findall(text))
+    hangul = len(_HANGUL_RE.findall(text))
+    latin = len(_LATIN_RE.findall(text))
+    total = han + kana + hangul + latin
+    if not total:
+        return False
+
+    if target_lang == 'zh':
+        return kana == 0 and han / total >= _SCRIPT_RATIO
+    if target_lang == 'ja':
+        return kana > 0 and (han + kana) / total >= _SCRIPT_RATIO
+    if target_lang == 'ko':
+        return hangul / total >= _SCRIPT_RATIO
+    return False
+
+
+def classify_untranslatable(text: str, target_lang: str) -> Optional[str]:
+    """
+    判断文本是否无需翻译
+
+    Returns:
+        无需翻译的原因（number/datetime/url/email/punctuation/identifier/target_script），需要翻译时返回None
+    """
+    stripped = text.strip()
+    if not stripped:
+        return "punctuation"
+    if not _LETTER_RE.search(stripped):
+        if _DATE_TIME_RE.match(stripped) and any(c.isdigit() for c in stripped):
+            return "datetime"
+        if any(c.isdigit() for c in stripped):
+            return "number"
+        return "punctuation"
+    if _NUMBER_RE.match(stripped):
+        return "number"
+    if _DATE_TIME_RE.match(stripped) and any(c.isdigit() for c in stripped):
+        return "datetime"
+    if _EMAIL_RE.match(stripped):
+        return "email"
+    if _URL_RE.match(stripped) or _DOMAIN_RE.match(stripped):
+        return "url"
+    if _IDENTIFIER_RE.match(stripped) or _FUNCTION_CALL_RE.match(stripped):
+        return "identifier"
+    if _in_target_script(stripped, target_lang):
+        return "target_script"
+    return None
@@ -0,0 +1,121 @@
+"""
+长文本分块
+按句子边界（含中日文标点）把超长输入切成不超过token预算的块，各块并行翻译后按顺序拼回；
+块之间原有的换行（分段）在拼接时保留
+"""
+
+import re
+from typing import Callable, List, Optional, Tuple
+
+# 句末标点及其后的右引号/右括号；拉丁标点后须有空白（避免切开 3.5、e.g.x 之类），中日文标点不要求
+_SENTENCE_END_RE = re.compile(
+    r'([.!?;]+["\'”’)\]]*\s+|[。！？；…]+["\'”’」』）)\]]*\s*)'
+)
+# 以这些缩写或姓名首字母结尾的句点不是句末（多合并一句只是少切一刀，不影响正确性）
+_ABBREVIATION_RE = re.compile(
+    r'(?:^|[\s(\[])(?:(?i:mr|mrs|ms|dr|prof|st|vs|cf|al|fig|approx|inc|ltd|jr|sr|e\.g|i\.e|a\.m|p\.m)|No|[A-Z])\.\s*$'
+)
+# 句子仍超出预算时退而按分句标点切
+_CLAUSE_END_RE = re.compile(r'([,，、:：]\s*)')
+
+# 译文块之间不加空格的目标语言
+_NO_SPACE_LANGS = {'zh', 'ja'}
+
+
+def _split_keep(pattern: re.Pattern, text: str) -> List[str]:
+    """按分隔符切分，分隔符留在前一段末尾"""
+    parts = pattern.split(text)
+    pieces = ["".join(parts[i:i + 2]) for i in range(0, len(parts), 2)]
+    return [piece for piece in pieces if piece]
+
+
+def split_sentences(text: str) -> List[str]:
+    """切分为句子（拼接后等于原文；常见缩写和姓名首字母后的句点不切）"""
+    sentences: List[str] = []
+    for piece in _split_keep(_SENTENCE_END_RE, text):
+        if sentences and _ABBREVIATION_RE.search(sentences[-1]):
+            sentences[-1] += piece
+        else:
+            sentences.append(piece)
+    return sentences
+
+
+def _split_oversized(sentence: str, budget: int, estimate: Callable[[str], int]) -> List[str]:
+    """超出预算的单句：依次按分句标点、空白切分，仍过长（如无标点的中文）则按字符硬切"""
+    pieces: List[str] = []
+    for clause in _split_keep(_CLAUSE_END_RE, sentence):
+        if estimate(clause) <= budget:
+            pieces.append(clause)
+            continue
+        for word in re.split(r'(?<=\s)', clause):
+            if estimate(word) <= budget:
+                pieces.append(word)
+                continue
+            step = max(1, len(word) * budget // max(1, estimate(word)))
+            pieces.extend(word[i:i + step] for i in range(0, len(word), step))
+    return pieces
+
+
+def chunk_text(text: str, budget: int, estimate: Callable[[str], int]) -> Tuple[List[str], List[str]]:
+    """
+    把文本切成不超过budget个token的块（尽量在句子边界处切，相邻句子合并到预算为止）
+
+    Args:
+        text: 原文
+        budget: 每块的token预算
+        estimate: token数估算函数
+
+    Returns:
+        (去除首尾空白后的块列表, 相邻两块之间原文中的空白)；未超预算的文本原样作为一块返回
+    """
+    if estimate(text) <= budget:
+        return [text], []
+
+    pieces: List[str] = []
+    for sentence in split_sentences(text):
+        if estimate(sentence) > budget:
+            pieces.extend(_split_oversized(sentence, budget, estimate))
+        else:
+            pieces.append(sentence)
+
+    chunks: List[str] = []
+    current = ""
+    for piece in pieces:
+        if current and estimate(current + piece) > budget:
+            chunks.append(current)
+            current = ""
+        current += piece
+    if current:
+        chunks.append(current)
+
+    # 块的首尾空白归入相邻块之间的分隔（只有空白的块也并入分隔）
+    stripped: List[str] = []
+    separators: List[str] = []
+    gap = ""
+    for chunk in chunks:
+        body = chunk.strip()
+        if not body:
+            gap += chunk
+            continue
+        if stripped:
+            separators.append(gap + chunk[:len(chunk) - len(chunk.lstrip())])
+        stripped.append(body)
+        gap = chunk[len(chunk.rstrip()):]
+    return stripped, separators
+
+
+def join_chunks(translations: List[str], target_lang: str, separators: Optional[List[str]] = None) -> str:
+    """
+    按目标语言的书写习惯拼接各块译文
+
+    separators为chunk_text返回的块间空白：含换行（分段、换行）的按原样保留，
+    其余按目标语言用空格或不加分隔
+    """
+    default = "" if target_lang in _NO_SPACE_LANGS else " "
+    parts: List[str] = []
+    for i, translation in enumerate(translations):
+        if i:
+            separator = separators[i - 1] if separators and i - 1 < len(separators) else ""
+            parts.append(separator if "\n" in separator else default)
+        parts.append(translation.strip())
+    return "".join(parts)
@@ -1,12 +1,16 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+import asyncio
+import json
 import logging
 import os
 
 # 导入翻译器
 from translator import MultiTranslator
+from admission import AdmissionController, AdmissionRejected
+from deadline import ClientDisconnected, DeadlineExceeded, parse_deadline, run_until_disconnect
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -20,33 +24,138 @@ app = FastAPI(
 
 # 初始化翻译器
 translator = MultiTranslator()
+_warmup_task = None
+
+# 优先级通道：interactive（单张图片的交互请求）优先于 bulk（批量文档任务）
+admission_enabled = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+admission_max_concurrency = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "8"))
+admission = AdmissionController(admission_max_concurrency, [
+    {
+        "name": "interactive",
+        "max_active": admission_max_concurrency,
+        "max_queue": int(os.getenv("ADMISSION_INTERACTIVE_QUEUE", "32")),
+        "max_wait_ms": float(os.getenv("ADMISSION_INTERACTIVE_MAX_WAIT_MS", "2000"))
+    },
+    {
+        # 批量通道最多占用一半槽位，给交互请求留出余量
+        "name": "bulk",
+        "max_active": int(os.getenv("ADMISSION_BULK_MAX_ACTIVE", str(max(1, admission_max_concurrency // 2)))),
+        "max_queue": int(os.getenv("ADMISSION_BULK_QUEUE", "64")),
+        "max_wait_ms": float(os.getenv("ADMISSION_BULK_MAX_WAIT_MS", "30000"))
+    }
+])
+default_lane = os.getenv("ADMISSION_DEFAULT_LANE", "interactive")
+
+# 请求未携带 X-Deadline-Ms 时的默认处理时限（秒），0为不限
+default_deadline = float(os.getenv("REQUEST_DEADLINE_SECONDS", "0"))
+
+@app.on_event("startup")
+async def warm_up():
+    """后台预热模型，/health在预热完成前返回503"""
+    global _warmup_task
+    _warmup_task = asyncio.create_task(translator.warm_up())
 
 class TranslateRequest(BaseModel):
     """翻译请求"""
     lines: List[str]
     target_lang: str = "zh"
     source_lang: str = "auto"  # 自动检测
+    priority: Optional[str] = None  # 优先级通道 interactive/bulk，也可用 X-Priority 请求头指定
+
+class TranslateStreamRequest(TranslateRequest):
+    """流式翻译请求"""
+    partial: bool = False  # 是否推送生成中的部分译文
 
 class TranslateResponse(BaseModel):
     """翻译响应"""
     translations: List[str]
     engine: str
     processing_time_ms: int
+    stats: Optional[Dict[str, Any]] = None  # 去重等统计信息
 
 @app.get("/health")
 async def health():
-    """健康检查"""
+    """健康检查（模型预热完成前返回503）"""
     available_engines = translator.get_available_engines()
-    return {
-        "status": "ok", 
+    body = {
+        "status": "ok" if translator.ready else "warming_up",
         "service": "translation",
         "version": "1.0.0",
         "available_engines": available_engines,
-        "current_engine": translator.get_current_engine()
+        "current_engine": translator.get_current_engine(),
+        "translation_memory": translator.get_memory_stats(),
+        "fuzzy_memory": translator.get_fuzzy_memory_stats(),
+        "coalescer": translator.get_coalescer_stats(),
+        "warmup": translator.warmup_state,
+        "glossary": translator.get_glossary_stats(),
+        "lexicon": translator.get_lexicon_stats(),
+        "admission": admission.get_stats() if admission_enabled else None
     }
+    if not translator.ready:
+        return JSONResponse(status_code=503, content=body)
+    return body
+
+def _resolve_lane(request: TranslateRequest, x_priority: Optional[str]) -> str:
+    """请求字段优先于请求头，都未指定时使用默认通道"""
+    lane = (request.priority or x_priority or default_lane).lower()
+    if lane not in admission.lanes:
+        raise HTTPException(400, f"Unknown priority: {lane}, expected one of {admission.lanes}")
+    return lane
+
+async def _admit(lane: str) -> float:
+    """申请执行槽位，未准入时返回429 + Retry-After"""
+    if not admission_enabled:
+        return 0.0
+    try:
+        return await admission.acquire(lane)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            429,
+            f"Translation service busy ({e.lane}: {e.reason})",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+def _release(lane: str, service_ms: float):
+    if admission_enabled:
+        admission.release(lane, service_ms)
+
+class _SlotStreamingResponse(StreamingResponse):
+    """
+    持有执行槽位的流式响应
+    
+    槽位在响应开始前申请（以便返回429），若客户端在生成器开始执行前断开，生成器的finally不会运行，
+    因此在响应发送结束（无论正常、出错还是被取消）时再释放一次；release需可重复调用
+    """
+    
+    def __init__(self, content, release, **kwargs):
+        super().__init__(content, **kwargs)
+        self._release_slot = release
+    
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._release_slot()
+
+async def _guarded(http_request: Request, work, deadline: Optional[float], on_discard=None):
+    """
+    截止时间到达返回504，客户端断开返回499，两种情况都会取消正在进行的翻译
+    
+    on_discard: work已完成但结果被丢弃时的回调（见run_until_disconnect）
+    """
+    try:
+        return await run_until_disconnect(http_request, work, deadline, on_discard=on_discard)
+    except DeadlineExceeded:
+        logger.warning("⚠️ 请求超过截止时间，已取消翻译")
+        raise HTTPException(504, "Deadline exceeded")
+    except ClientDisconnected:
+        logger.info("客户端已断开，已取消翻译")
+        raise HTTPException(499, "Client disconnected")
 
 @app.post("/translate", response_model=TranslateResponse)
-async def translate(request: TranslateRequest):
+async def translate(request: TranslateRequest, http_request: Request,
+                    x_priority: Optional[str] = Header(None),
+                    x_deadline_ms: Optional[str] = Header(None)):
     """
     批量翻译文本
     
@@ -54,36 +163,125 @@ async def translate(request: TranslateRequest):
         request: 翻译请求，包含文本列表和目标语言
         
     Returns:
-        翻译结果列表
+        翻译结果列表（队列已满或排队超时返回429，超过 X-Deadline-Ms 截止时间返回504）
     """
+    deadline = parse_deadline(x_deadline_ms, default_deadline)
+    lane = _resolve_lane(request, x_priority)
+    return await _guarded(http_request, _translate(request, lane), deadline)
+
+async def _translate(request: TranslateRequest, lane: str) -> TranslateResponse:
+    """排队获取执行槽位后翻译"""
     import time
+    queue_ms = await _admit(lane)
     start_time = time.time()
     
     try:
         logger.info(f"开始翻译 {len(request.lines)} 行文本，目标语言: {request.target_lang}")
         
         # 执行翻译
+        stats: Dict[str, Any] = {}
         translations = await translator.translate_batch(
             texts=request.lines,
             target_lang=request.target_lang,
-            source_lang=request.source_lang
+            source_lang=request.source_lang,
+            stats=stats
         )
         
         processing_time = int((time.time() - start_time) * 1000)
+        stats["lane"] = lane
+        stats["queue_ms"] = round(queue_ms, 1)
         
         response = TranslateResponse(
             translations=translations,
             engine=translator.get_current_engine(),
-            processing_time_ms=processing_time
+            processing_time_ms=processing_time,
+            stats=stats
         )
         
-        logger.info(f"翻译完成，耗时: {processing_time}ms")
+        logger.info(f"翻译完成，耗时: {processing_time}ms, 去重率: {stats.get('dedup_ratio', 0)}")
         
         return response
         
     except Exception as e:
         logger.error(f"翻译错误: {e}")
         raise HTTPException(500, f"Translation error: {e}")
+    finally:
+        _release(lane, (time.time() - start_time) * 1000)
+
+@app.post("/translate/stream")
+async def translate_stream(request: TranslateStreamRequest, http_request: Request,
+                           x_priority: Optional[str] = Header(None),
+                           x_deadline_ms: Optional[str] = Header(None)):
+    """
+    流式批量翻译（NDJSON）
+    
+    每行翻译完成即推送一条记录：
+        {"index": 行号, "translation": 译文, "latency_ms": 耗时, "final": true}
+    partial=true 时还会推送 final=false 的部分译文；
+    最后一条为 {"done": true, "engine": 引擎, "processing_time_ms": 总耗时, "stats": 统计}
+    未准入时在响应开始前返回429；响应开始后超过截止时间则推送 {"error": ...} 并结束
+    """
+    import time
+    deadline = parse_deadline(x_deadline_ms, default_deadline)
+    lane = _resolve_lane(request, x_priority)
+    # 申请到的槽位若因超时/断开没能交到这里，由on_discard立即归还
+    queue_ms = await _guarded(http_request, _admit(lane), deadline, on_discard=lambda _: _release(lane, 0))
+    start_time = time.time()
+    released = False
+    
+    def release_slot():
+        nonlocal released
+        if not released:
+            released = True
+            _release(lane, (time.time() - start_time) * 1000)
+    
+    logger.info(f"开始流式翻译 {len(request.lines)} 行文本，目标语言: {request.target_lang}")
+    
+    async def generate():
+        stats: Dict[str, Any] = {"lane": lane, "queue_ms": round(queue_ms, 1)}
+        records = translator.translate_stream(
+            texts=request.lines,
+            target_lang=request.target_lang,
+            source_lang=request.source_lang,
+            partial=request.partial,
+            stats=stats
+        )
+        try:
+            while True:
+                # 客户端断开时Starlette会取消本生成器；截止时间由这里的等待超时保证
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    record = await asyncio.wait_for(records.__anext__(), timeout=timeout)
+                except StopAsyncIteration:
+                    break
+                yield json.dumps(record, ensure_ascii=False) + "\n"
+        except asyncio.TimeoutError:
+            logger.warning("⚠️ 流式翻译超过截止时间，已取消")
+            yield json.dumps({"error": "Deadline exceeded"}, ensure_ascii=False) + "\n"
+            return
+        except Exception as e:
+            # 响应头已发出，错误以记录形式返回
+            logger.error(f"流式翻译错误: {e}")
+            yield json.dumps({"error": f"Translation error: {e}"}, ensure_ascii=False) + "\n"
+            return
+        finally:
+            await records.aclose()
+            release_slot()
+        
+        processing_time = int((time.time() - start_time) * 1000)
+        logger.info(f"流式翻译完成，耗时: {processing_time}ms")
+        yield json.dumps({
+            "done": True,
+            "engine": translator.get_current_engine(),
+            "processing_time_ms": processing_time,
+            "stats": stats
+        }, ensure_ascii=False) + "\n"
+    
+    try:
+        return _SlotStreamingResponse(generate(), release_slot, media_type="application/x-ndjson")
+    except BaseException:
+        release_slot()
+        raise
 
 @app.get("/engines")
 async def list_engines():
@@ -91,9 +289,20 @@ async def list_engines():
     return {
         "available": translator.get_available_engines(),
         "current": translator.get_current_engine(),
-        "default": translator.get_default_engine()
+        "default": translator.get_default_engine(),
+        "router": translator.get_router_state(),
+        "ollama_hosts": translator.get_ollama_host_stats(),
+        "concurrency": translator.get_concurrency_state()
     }
 
+@app.post("/glossary/reload")
+async def reload_glossary():
+    """重新加载术语表文件（无需重启服务）"""
+    stats = await asyncio.to_thread(translator.reload_glossary)
+    if stats is None:
+        raise HTTPException(404, "Glossary is disabled")
+    return stats
+
 @app.get("/languages")
 async def supported_languages():
     """获取支持的语言列表"""
@@ -0,0 +1,6 @@
+"""测试直接从服务目录导入模块（与服务运行时的导入方式一致）"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,94 @@
+"""截止时间与客户端断开：已完成的work结果不能被丢掉（如申请到的执行槽位）"""
+
+import asyncio
+import time
+
+import pytest
+
+from deadline import ClientDisconnected, DeadlineExceeded, run_until_disconnect
+
+
+class FakeRequest:
+    def __init__(self, on_check=None, disconnected=True):
+        self.on_check = on_check
+        self.disconnected = disconnected
+
+    async def is_disconnected(self):
+        if self.on_check:
+            await self.on_check()
+        return self.disconnected
+
+
+def test_returns_result():
+    async def run():
+        return await run_until_disconnect(FakeRequest(disconnected=False), asyncio.sleep(0.01, "slot"), None,
+                                          poll_interval=0.005)
+    assert asyncio.run(run()) == "slot"
+
+
+def test_work_finishing_during_disconnect_check_is_returned():
+    async def run():
+        gate = asyncio.get_running_loop().create_future()
+
+        async def work():
+            return await gate
+
+        async def finish_work():
+            gate.set_result("slot")
+            await asyncio.sleep(0.01)
+
+        discarded = []
+        result = await run_until_disconnect(FakeRequest(finish_work), work(), None, poll_interval=0.001,
+                                            on_discard=discarded.append)
+        return result, discarded
+
+    assert asyncio.run(run()) == ("slot", [])
+
+
+def test_disconnect_cancels_unfinished_work():
+    async def run():
+        cancelled = []
+
+        async def work():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        with pytest.raises(ClientDisconnected):
+            await run_until_disconnect(FakeRequest(), work(), None, poll_interval=0.001)
+        return cancelled
+
+    assert asyncio.run(run()) == [True]
+
+
+def test_deadline_exceeded_discards_nothing():
+    async def run():
+        discarded = []
+        with pytest.raises(DeadlineExceeded):
+            await run_until_disconnect(FakeRequest(disconnected=False), asyncio.sleep(10), time.monotonic() + 0.01,
+                                       poll_interval=0.005, on_discard=discarded.append)
+        return discarded
+
+    assert asyncio.run(run()) == []
+
+
+def test_result_of_finished_work_goes_to_on_discard_when_caller_is_cancelled():
+    async def run():
+        discarded = []
+        outer = None
+
+        async def work():
+            await asyncio.sleep(0)
+            # 结果产生的同时调用方被取消（如请求处理协程被框架取消）
+            outer.cancel()
+            return "slot"
+
+        outer = asyncio.ensure_future(run_until_disconnect(FakeRequest(disconnected=False), work(), None,
+                                                           on_discard=discarded.append))
+        with pytest.raises(asyncio.CancelledError):
+            await outer
+        return discarded
+
+    assert asyncio.run(run()) == ["slot"]
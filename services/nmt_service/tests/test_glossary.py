@@ -0,0 +1,96 @@
+"""术语表：Aho-Corasick自动机与占位符替换/还原"""
+
+import random
+
+import pytest
+
+from glossary import Glossary, _Automaton
+
+
+def naive_find_all(terms, text):
+    return sorted(
+        (start, start + len(term), index)
+        for index, term in enumerate(terms)
+        for start in range(len(text) - len(term) + 1)
+        if text.startswith(term, start)
+    )
+
+
+def test_automaton_finds_overlapping_and_nested_terms():
+    terms = ["he", "she", "his", "hers"]
+    matches = sorted(_Automaton(terms).find_all("ushers"))
+    assert matches == [(1, 4, 1), (2, 4, 0), (2, 6, 3)]
+
+
+def test_automaton_matches_naive_search():
+    rng = random.Random(7)
+    terms = sorted({"".join(rng.choice("abc") for _ in range(rng.randint(1, 4))) for _ in range(30)})
+    automaton = _Automaton(terms)
+    for _ in range(200):
+        text = "".join(rng.choice("abcd") for _ in range(rng.randint(0, 30)))
+        assert sorted(automaton.find_all(text)) == naive_find_all(terms, text)
+
+
+def test_automaton_cjk_terms():
+    terms = ["智能裁剪", "裁剪"]
+    assert sorted(_Automaton(terms).find_all("使用智能裁剪功能")) == [(2, 6, 0), (4, 6, 1)]
+
+
+@pytest.fixture
+def glossary(tmp_path):
+    path = tmp_path / "glossary.csv"
+    path.write_text(
+        "source,zh,ja,en\n"
+        "PhotoPal,,,\n"
+        "Smart Crop,智能裁剪,スマートクロップ,\n"
+        "Crop,裁剪,,\n"
+        "智能裁剪,,,Smart Crop\n",
+        encoding="utf-8"
+    )
+    glossary = Glossary(str(path))
+    assert glossary.load() == 4
+    return glossary
+
+
+def test_protect_prefers_leftmost_longest(glossary):
+    masked, replacements = glossary.protect("Open Smart Crop in PhotoPal", "zh")
+    assert masked == "Open ⟦1⟧ in ⟦2⟧"
+    assert replacements == ["智能裁剪", "PhotoPal"]
+
+
+def test_protect_requires_word_boundaries_for_latin_terms(glossary):
+    assert glossary.protect("Cropping and PhotoPals", "zh") == ("Cropping and PhotoPals", [])
+
+
+def test_protect_cjk_terms_without_boundaries(glossary):
+    masked, replacements = glossary.protect("使用智能裁剪功能", "en")
+    assert masked == "使用⟦1⟧功能"
+    assert replacements == ["Smart Crop"]
+
+
+def test_protect_keeps_source_when_no_target(glossary):
+    assert glossary.protect("Crop", "ja") == ("⟦1⟧", ["Crop"])
+
+
+def test_restore_tolerates_spaces_inside_placeholder(glossary):
+    masked, replacements = glossary.protect("Open Smart Crop in PhotoPal", "zh")
+    assert glossary.restore("在 ⟦ 2 ⟧ 中打开⟦1⟧", replacements) == "在 PhotoPal 中打开智能裁剪"
+
+
+def test_restore_reports_lost_placeholder(glossary):
+    _, replacements = glossary.protect("Open Smart Crop in PhotoPal", "zh")
+    assert glossary.restore("在应用中打开⟦1⟧", replacements) is None
+    assert glossary.restore("在 ⟦3⟧ 中打开⟦1⟧", replacements) is None
+    assert glossary.get_stats()["unrestored"] == 2
+
+
+def test_restore_partial_keeps_placeholders_seen_so_far(glossary):
+    _, replacements = glossary.protect("Open Smart Crop in PhotoPal", "zh")
+    assert glossary.restore("打开⟦1⟧", replacements, partial=True) == "打开智能裁剪"
+    assert glossary.get_stats()["unrestored"] == 0
+
+
+def test_only_terms():
+    assert Glossary.only_terms("⟦1⟧ - ⟦2⟧")
+    assert not Glossary.only_terms("Open ⟦1⟧")
+    assert not Glossary.only_terms("...")
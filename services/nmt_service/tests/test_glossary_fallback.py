@@ -0,0 +1,49 @@
+"""引擎丢失术语占位符时改为不做术语保护重新翻译，术语不会从译文中消失"""
+
+import asyncio
+import re
+
+import pytest
+
+from translator import MultiTranslator
+
+_PLACEHOLDER_RE = re.compile(r'⟦\s*\d+\s*⟧')
+
+
+@pytest.fixture
+def translator(monkeypatch, tmp_path):
+    glossary = tmp_path / "glossary.csv"
+    glossary.write_text("source,zh\nSmart Crop,智能裁剪\n", encoding="utf-8")
+    for name, value in {
+        "USE_OLLAMA": "false", "TM_ENABLED": "false", "FUZZY_TM_ENABLED": "false", "LEXICON_ENABLED": "false",
+        "COALESCE_ENABLED": "false", "GLOSSARY_ENABLED": "true", "GLOSSARY_PATH": str(glossary),
+    }.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.delenv("CT2_MODEL_PATH", raising=False)
+    translator = MultiTranslator()
+    sent = []
+
+    async def engine(texts, target_lang, source_lang):
+        """模拟会吞掉占位符的引擎：含占位符的行把占位符删掉"""
+        sent.extend(texts)
+        return [f"译:{_PLACEHOLDER_RE.sub('', text)}" for text in texts], ["placeholder"] * len(texts)
+
+    monkeypatch.setattr(translator, "_dispatch_engine_batch", engine)
+    translator.sent = sent
+    return translator
+
+
+def test_batch_falls_back_to_unprotected_translation(translator):
+    stats = {}
+    result = asyncio.run(translator.translate_batch(["Open Smart Crop now", "Close"], "zh", "en", stats))
+    assert result == ["译:Open Smart Crop now", "译:Close"]
+    assert translator.sent == ["Open ⟦1⟧ now", "Close", "Open Smart Crop now"]
+    assert stats["glossary_fallbacks"] == 1
+
+
+def test_stream_falls_back_to_unprotected_translation(translator):
+    async def run():
+        return [record async for record in translator.translate_stream(["Open Smart Crop now"], "zh", "en")]
+
+    records = asyncio.run(run())
+    assert [r["translation"] for r in records if r["final"]] == ["译:Open Smart Crop now"]
@@ -0,0 +1,128 @@
+"""内存映射词典：文件格式与build_lexicon编译"""
+
+import struct
+import sys
+
+import pytest
+
+import build_lexicon
+from lexicon import MAGIC, Lexicon, LexiconStore, write_lexicon
+
+
+def test_file_format(tmp_path):
+    path = tmp_path / "en-zh.lex"
+    assert write_lexicon([("Save", "保存"), ("Cancel", "取消")], str(path)) == 2
+
+    data = path.read_bytes()
+    magic, count, reserved = struct.unpack_from("<8sII", data, 0)
+    assert (magic, count, reserved) == (MAGIC, 2, 0)
+
+    # 索引按键的UTF-8字节序排列，偏移相对数据区起点
+    data_start = 16 + count * 16
+    entries = [struct.unpack_from("<IIII", data, 16 + i * 16) for i in range(count)]
+    pairs = [
+        (data[data_start + ko:data_start + ko + kl].decode(), data[data_start + vo:data_start + vo + vl].decode())
+        for ko, kl, vo, vl in entries
+    ]
+    assert pairs == [("Cancel", "取消"), ("Save", "保存")]
+    assert len(data) == data_start + sum(kl + vl for _, kl, _, vl in entries)
+
+
+def test_write_normalizes_keys_and_keeps_last_duplicate(tmp_path):
+    path = tmp_path / "en-zh.lex"
+    count = write_lexicon([("  Ｓａｖｅ   file ", "保存文件"), ("Save file", "存储文件"), ("", "空"), ("Empty", " ")], str(path))
+    assert count == 1
+    lexicon = Lexicon(str(path))
+    try:
+        assert lexicon.get("Save file") == "存储文件"
+    finally:
+        lexicon.close()
+
+
+def test_lookup_binary_search(tmp_path):
+    path = tmp_path / "en-zh.lex"
+    entries = [(f"item {i:04d}", f"条目{i}") for i in range(1000)]
+    write_lexicon(entries, str(path))
+    lexicon = Lexicon(str(path))
+    try:
+        for source, target in entries[::37]:
+            assert lexicon.get(source) == target
+        assert lexicon.get("item 1000") is None
+        assert lexicon.get("") is None
+    finally:
+        lexicon.close()
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "en-zh.lex"
+    path.write_bytes(b"NOTALEX!" + bytes(8))
+    with pytest.raises(ValueError):
+        Lexicon(str(path))
+
+
+def test_store_lookup(tmp_path):
+    write_lexicon([("Settings", "设置")], str(tmp_path / "en-zh.lex"))
+    write_lexicon([("Paramètres", "设置")], str(tmp_path / "fr-zh.lex"))
+    store = LexiconStore(str(tmp_path), max_words=2)
+    try:
+        assert sorted(store.pairs) == ["en-zh", "fr-zh"]
+        assert store.lookup("Settings", "en", "zh") == "设置"
+        assert store.lookup("Ｓｅｔｔｉｎｇｓ", "en", "zh") == "设置"
+        assert store.lookup("Paramètres", "auto", "zh") == "设置"
+        assert store.lookup("Settings", "en", "ja") is None
+        assert store.lookup("Settings and more", "en", "zh") is None
+    finally:
+        store.close()
+
+
+def build(monkeypatch, tmp_path, *args):
+    output = tmp_path / "out"
+    monkeypatch.setattr(sys, "argv", ["build_lexicon.py", *map(str, args), "--output", str(output)])
+    build_lexicon.main()
+    return output
+
+
+def test_build_from_csv_round_trip(monkeypatch, tmp_path):
+    source = tmp_path / "ui.csv"
+    source.write_text("id,en,zh\n1,Open,打开\n2,Close window,关闭窗口\n3,Save all open files,保存所有打开的文件\n",
+                      encoding="utf-8")
+    output = build(monkeypatch, tmp_path, source, "--source", "en", "--target", "zh", "--max-words", 3)
+    lexicon = Lexicon(str(output / "en-zh.lex"))
+    try:
+        assert lexicon.count == 2
+        assert lexicon.get("Open") == "打开"
+        assert lexicon.get("Close window") == "关闭窗口"
+        assert lexicon.get("Save all open files") is None
+    finally:
+        lexicon.close()
+
+
+def test_build_from_tmx_round_trip(monkeypatch, tmp_path):
+    source = tmp_path / "memory.tmx"
+    source.write_text(
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<tmx version="1.4"><header srclang="en-US"/><body>\n'
+        '<tu><tuv xml:lang="en-US"><seg>Print</seg></tuv><tuv xml:lang="ja-JP"><seg>印刷</seg></tuv></tu>\n'
+        '<tu><tuv xml:lang="en"><seg>Zoom <bpt i="1">&lt;b&gt;</bpt>in<ept i="1">&lt;/b&gt;</ept></seg></tuv>'
+        '<tuv xml:lang="ja"><seg>拡大</seg></tuv></tu>\n'
+        '<tu><tuv xml:lang="en"><seg>Orphan</seg></tuv></tu>\n'
+        '</body></tmx>\n',
+        encoding="utf-8"
+    )
+    output = build(monkeypatch, tmp_path, source, "--source", "en", "--target", "ja")
+    lexicon = Lexicon(str(output / "en-ja.lex"))
+    try:
+        assert lexicon.count == 2
+        assert lexicon.get("Print") == "印刷"
+        assert lexicon.get("Zoom <b>in</b>") == "拡大"
+        assert lexicon.get("Orphan") is None
+    finally:
+        lexicon.close()
+
+
+def test_build_rejects_csv_without_language_columns(monkeypatch, tmp_path, capsys):
+    source = tmp_path / "bad.csv"
+    source.write_text("a,b\nx,y\n", encoding="utf-8")
+    with pytest.raises(SystemExit):
+        build(monkeypatch, tmp_path, source, "--source", "en", "--target", "zh")
+    assert "❌" in capsys.readouterr().out
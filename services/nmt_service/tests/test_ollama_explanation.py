@@ -0,0 +1,64 @@
+"""Ollama译文后处理：模型的解释文字要截掉，原文自带的"Note:"等行不能截"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from translator import MultiTranslator
+
+SOURCE = "Step 1: back up your data\nNote: this cannot be undone"
+
+
+@pytest.fixture
+def translator(monkeypatch):
+    for name, value in {
+        "USE_OLLAMA": "true", "OLLAMA_HOST": "http://ollama.test", "OLLAMA_EARLY_STOP": "true",
+        "TM_ENABLED": "false", "FUZZY_TM_ENABLED": "false", "GLOSSARY_ENABLED": "false",
+        "LEXICON_ENABLED": "false", "COALESCE_ENABLED": "false",
+    }.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.delenv("CT2_MODEL_PATH", raising=False)
+    return MultiTranslator()
+
+
+def translate(translator, text, reply):
+    """用模拟的Ollama流式回复翻译一行，返回 (译文, 请求体)"""
+    requests = []
+
+    def handler(request):
+        requests.append(json.loads(request.content))
+        lines = [json.dumps({"message": {"content": token}, "done": False}) for token in reply]
+        lines.append(json.dumps({"message": {"content": ""}, "done": True}))
+        return httpx.Response(200, text="\n".join(lines))
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await translator._ollama_translate_one(client, text, "zh", "en")
+
+    return asyncio.run(run()), requests[0]
+
+
+def test_source_note_line_is_kept(translator):
+    translation, payload = translate(translator, SOURCE, ["步骤1：备份数据", "\n注：", "此操作无法撤销"])
+    assert translation == "步骤1：备份数据\n注：此操作无法撤销"
+    assert not any("Note" in stop or "注" in stop for stop in payload["options"]["stop"])
+
+
+def test_model_explanation_is_cut(translator):
+    translation, payload = translate(translator, "Back up your data", ["备份数据", "\nNote: ", "I translated..."])
+    assert translation == "备份数据"
+    assert "\nNote:" in payload["options"]["stop"]
+
+
+def test_stop_sequences_follow_source_markers(translator):
+    _, stop = translator._generation_limits(["注：仅限管理员"], "en", packed=False)
+    assert "\nNote:" not in stop and "\n注：" not in stop
+    _, stop = translator._generation_limits(["Only for admins"], "zh", packed=False)
+    assert "\n注：" in stop
+
+
+def test_clean_translation_keeps_multiline_source(translator):
+    assert translator._clean_translation("步骤1\n说明：见下文", "Step 1\nDetails below") == "步骤1\n说明：见下文"
+    assert translator._clean_translation("步骤1\n说明：这是直译", "Step 1") == "步骤1"
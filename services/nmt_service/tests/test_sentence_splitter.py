@@ -0,0 +1,95 @@
+"""长文本分块：句子切分、按预算分块与译文拼接"""
+
+import pytest
+
+from sentence_splitter import chunk_text, join_chunks, split_sentences
+
+
+def words(text):
+    """按词估算token数（测试用）"""
+    return len(text.split())
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("One. Two! Three? Four", ["One. ", "Two! ", "Three? ", "Four"]),
+    ('He said "stop." Then left.', ['He said "stop." ', "Then left."]),
+    ("你好。世界！真的吗？", ["你好。", "世界！", "真的吗？"]),
+    ("「はい。」いいえ。", ["「はい。」", "いいえ。"]),
+])
+def test_splits_at_sentence_ends(text, expected):
+    assert split_sentences(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "Dr. Smith arrived at 5 p.m. on Monday.",
+    "Use a shorter name, e.g. the initials.",
+    "Mrs. Jones vs. Mr. Brown.",
+    "J. K. Rowling wrote it.",
+    "See No. 5 and Fig. 2 for details.",
+    "Version 3.5 is out.",
+])
+def test_does_not_split_at_abbreviations(text):
+    assert split_sentences(text) == [text]
+
+
+def test_splits_after_lowercase_no():
+    assert split_sentences("I said no. Then it was over.") == ["I said no. ", "Then it was over."]
+
+
+def test_split_is_lossless():
+    text = "Dr. Who?  Yes.\nNext line! 中文句子。 English again... Done"
+    assert "".join(split_sentences(text)) == text
+
+
+def test_short_text_is_single_chunk():
+    text = "Short text. Two sentences."
+    assert chunk_text(text, 10, words) == ([text], [])
+
+
+def test_chunks_respect_budget_and_keep_sentences_whole():
+    sentences = [f"Sentence number {i} has six words." for i in range(10)]
+    chunks, separators = chunk_text(" ".join(sentences), 13, words)
+    assert all(words(chunk) <= 13 for chunk in chunks)
+    assert chunks == [f"{a} {b}" for a, b in zip(sentences[::2], sentences[1::2])]
+    assert separators == [" "] * 4
+
+
+def test_chunks_keep_abbreviations_with_their_sentence():
+    text = "Dr. Smith met Prof. Jones today. They talked for hours about e.g. grammar."
+    chunks, _ = chunk_text(text, 8, words)
+    assert chunks == ["Dr. Smith met Prof. Jones today.", "They talked for hours about e.g. grammar."]
+
+
+def test_oversized_sentence_falls_back_to_clauses_and_characters():
+    text = "第一部分很长很长，第二部分也很长很长" * 3
+    chunks, separators = chunk_text(text, 12, len)
+    assert all(len(chunk) <= 12 for chunk in chunks)
+    assert "".join(chunks) == text
+    assert separators == [""] * (len(chunks) - 1)
+
+
+def test_paragraph_break_on_chunk_boundary_is_kept():
+    first = " ".join(["alpha"] * 119) + " end."
+    second = "Second paragraph " + " ".join(["beta"] * 118) + "."
+    chunks, separators = chunk_text(f"{first}\n\n{second}", 200, words)
+    assert chunks == [first, second]
+    assert separators == ["\n\n"]
+    assert join_chunks(chunks, "en", separators) == f"{first}\n\n{second}"
+    assert join_chunks(["第一段。", "第二段。"], "zh", separators) == "第一段。\n\n第二段。"
+
+
+def test_chunks_rejoin_to_original_whitespace():
+    text = "One two three.\nFour five six. Seven eight nine.\n\n  Ten eleven twelve."
+    chunks, separators = chunk_text(text, 3, words)
+    assert chunks == ["One two three.", "Four five six.", "Seven eight nine.", "Ten eleven twelve."]
+    assert separators == ["\n", " ", "\n\n  "]
+    assert join_chunks(chunks, "en", separators) == text
+
+
+@pytest.mark.parametrize("lang, expected", [
+    ("zh", "第一句。第二句。"),
+    ("ja", "第一句。第二句。"),
+    ("en", "第一句。 第二句。"),
+])
+def test_join_chunks(lang, expected):
+    assert join_chunks([" 第一句。", "第二句。 "], lang) == expected
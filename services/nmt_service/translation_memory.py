@@ -0,0 +1,149 @@
+"""
+翻译记忆（精确匹配缓存）
+进程内LRU + SQLite(WAL)持久化，多个uvicorn worker可共享同一数据库文件
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# SQLite单条语句参数个数上限较低，IN查询分批进行
+_SQL_CHUNK = 500
+
+
+def normalize_text(text: str) -> str:
+    """归一化原文：Unicode NFKC（全角转半角等），去首尾空白并合并连续空白"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class TranslationMemory:
+    """精确匹配翻译记忆"""
+
+    def __init__(self, db_path: str, lru_size: int = 10000):
+        self.db_path = db_path
+        self.lru_size = lru_size
+        self._lru: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"lru_hits": 0, "db_hits": 0, "misses": 0, "writes": 0}
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS translations (
+                key TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                translation TEXT NOT NULL,
+                source_lang TEXT NOT NULL,
+                target_lang TEXT NOT NULL,
+                engine TEXT NOT NULL,
+                model TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+
+    @staticmethod
+    def make_key(text: str, source_lang: str, target_lang: str, engine: str, model: str) -> str:
+        """缓存键：归一化原文 + 语言对 + 引擎 + 模型"""
+        raw = "\x1f".join([normalize_text(text), source_lang, target_lang, engine, model])
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: List[str], source_lang: str, target_lang: str,
+                 engine: str, model: str) -> List[Optional[str]]:
+        """批量查询，未命中的位置返回None"""
+        keys = [self.make_key(text, source_lang, target_lang, engine, model) for text in texts]
+        results: List[Optional[str]] = [None] * len(texts)
+        pending: Dict[str, List[int]] = {}
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._lru:
+                    self._lru.move_to_end(key)
+                    results[i] = self._lru[key]
+                    self._stats["lru_hits"] += 1
+                else:
+                    pending.setdefault(key, []).append(i)
+
+            pending_keys = list(pending)
+            for start in range(0, len(pending_keys), _SQL_CHUNK):
+                chunk = pending_keys[start:start + _SQL_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, translation FROM translations WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, translation in rows:
+                    for i in pending.pop(key):
+                        results[i] = translation
+                        self._stats["db_hits"] += 1
+                    self._remember(key, translation)
+
+            self._stats["misses"] += sum(len(indices) for indices in pending.values())
+
+        return results
+
+    def put_many(self, texts: List[str], translations: List[str], source_lang: str,
+                 target_lang: str, engine: str, model: str):
+        """批量写入"""
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, translation in zip(texts, translations):
+                key = self.make_key(text, source_lang, target_lang, engine, model)
+                self._remember(key, translation)
+                rows.append((key, normalize_text(text), translation, source_lang, target_lang, engine, model, now))
+            if not rows:
+                return
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO translations "
+                    "(key, source, translation, source_lang, target_lang, engine, model, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._stats["writes"] += len(rows)
+            except sqlite3.Error as e:
+                # 写失败（如数据库被其他worker长时间锁定）不影响翻译结果
+                logger.warning(f"⚠️ 翻译记忆写入失败: {e}")
+
+    def recent_entries(self, limit: int) -> List[tuple]:
+        """最近写入的条目 (source, translation, source_lang, target_lang, engine, model)"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT source, translation, source_lang, target_lang, engine, model "
+                "FROM translations ORDER BY created_at DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+
+    def _remember(self, key: str, translation: str):
+        """写入LRU（调用方持有锁）"""
+        self._lru[key] = translation
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, int]:
+        """命中统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["lru_size"] = len(self._lru)
+        return stats
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
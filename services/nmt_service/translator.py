@@ -5,40 +5,289 @@
 
 import httpx
 import asyncio
+import json
 import os
+import re
+import threading
+import time
 import logging
-from typing import List, Dict, Any, Optional
+from collections import Counter
+from typing import List, Dict, Any, AsyncIterator, Awaitable, Callable, Optional, Tuple
+
+from batch_coalescer import BatchCoalescer
+from concurrency_limiter import AdaptiveLimiter
+from engine_router import EngineRouter
+from fuzzy_memory import FuzzyMemory
+from glossary import PLACEHOLDER, Glossary
+from host_pool import HostPool
+from lexicon import LexiconStore
+from segment_filter import classify_untranslatable
+from sentence_splitter import chunk_text, join_chunks
+from translation_memory import TranslationMemory, normalize_text
 
 logger = logging.getLogger(__name__)
 
+# 语言映射
+LANG_NAMES = {
+    'zh': '中文',
+    'en': 'English',
+    'ja': '日本語',
+    'ko': '한국어',
+    'fr': 'Français',
+    'de': 'Deutsch',
+    'es': 'Español'
+}
+
+# NLLB语言代码
+NLLB_LANG_CODES = {
+    'zh': 'zho_Hans',
+    'en': 'eng_Latn',
+    'ja': 'jpn_Jpan',
+    'ko': 'kor_Hang',
+    'fr': 'fra_Latn',
+    'de': 'deu_Latn',
+    'es': 'spa_Latn'
+}
+
+# 源语言为auto时先按文字脚本判断，拉丁字母等再用语言识别（NLLB需要明确的源语言）
+_KANA_RE = re.compile(r'[\u3040-\u30ff]')
+_HANGUL_RE = re.compile(r'[\uac00-\ud7af]')
+_HAN_RE = re.compile(r'[\u4e00-\u9fff]')
+# 语言识别的概率低于该值时视为无法判断（短文本常见）
+_LANG_ID_MIN_PROB = 0.8
+
+# 打包模式回复解析："1. xxx" / "1) xxx" / "[1] xxx" / "1: xxx"
+_NUMBERED_LINE_RE = re.compile(r'^\s*\[?(\d+)\s*[\].:)、．]\s*(.*)$')
+# 模型开始解释的标志（出现在行首）
+_EXPLANATION_RE = re.compile(
+    r'(?:^|\n)[ \t]*[(（]?[ \t]*(?:Note|Notes|Explanation|Translation notes?|注意|注|解释|说明|备注)[ \t]*[:：)）]',
+    re.IGNORECASE
+)
+# 停止序列：模型一旦开始写注释/解释就停止生成
+_STOP_SEQUENCES = ["\nNote:", "\nExplanation:", "\n(Note", "\n注：", "\n解释：", "\n说明："]
+# 译文token数相对原文的放大系数（按目标语言）
+_OUTPUT_FACTOR = {'zh': 2.0, 'ja': 2.5, 'ko': 2.5}
+_DEFAULT_OUTPUT_FACTOR = 2.0
+# CJK字符（粗略按1字符≈1 token估算）
+_CJK_RE = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]')
+
+
+def _estimate_tokens(text: str) -> int:
+    """粗略估算文本token数：CJK字符按1个，其余按4字符1个"""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _find_explanation(text: str, cut_paragraph: bool, cut_marker: bool = True) -> Optional[int]:
+    """
+    查找模型开始解释的位置（之前须已有译文内容）
+
+    cut_paragraph 为True时（单行原文），译文后出现的空行也视为解释开始；
+    cut_marker 为False时（原文本身有注释标记或为多行），不按"Note:"等标记截断
+    """
+    positions = []
+    match = _EXPLANATION_RE.search(text) if cut_marker else None
+    if match:
+        positions.append(match.start())
+    if cut_paragraph:
+        paragraph = text.find("\n\n", len(text) - len(text.lstrip()))
+        if paragraph >= 0:
+            positions.append(paragraph)
+    positions = [p for p in positions if text[:p].strip()]
+    return min(positions) if positions else None
+
+
+def _has_note_marker(text: str) -> bool:
+    """原文本身含有注释/说明标记（此时译文中出现这类标记是正文内容，不是模型的解释）"""
+    lowered = text.lower()
+    return bool(_EXPLANATION_RE.search(text)) or any(stop[1:].lower() in lowered for stop in _STOP_SEQUENCES)
+
+
+def _may_cut_explanation(text: str) -> bool:
+    """单行且不含注释标记的原文，译文中的"Note:"等标记才视为模型开始解释"""
+    return "\n" not in text.strip() and not _has_note_marker(text)
+
+
+def _guess_lang(text: str, identify: Optional[Callable[[str], Tuple[str, float]]] = None) -> Optional[str]:
+    """
+    判断文本语言（用于auto源语言）
+
+    中日韩按文字脚本判断；其余交给identify（返回 (语言, 概率)），无法可靠判断时返回None
+    """
+    if _KANA_RE.search(text):
+        return 'ja'
+    if _HANGUL_RE.search(text):
+        return 'ko'
+    if _HAN_RE.search(text):
+        return 'zh'
+    if identify:
+        lang, prob = identify(text)
+        if prob >= _LANG_ID_MIN_PROB and lang in NLLB_LANG_CODES:
+            return lang
+    return None
+
+
+def _load_language_identifier() -> Optional[Callable[[str], Tuple[str, float]]]:
+    """加载可选的语言识别模型（langid.py），候选语言限定为NLLB_LANG_CODES中的语言；未安装时返回None"""
+    try:
+        from langid.langid import LanguageIdentifier, model
+    except ImportError:
+        logger.warning("⚠️ 未安装langid，auto源语言的拉丁字母文本按批内主要语言或默认源语言处理")
+        return None
+    identifier = LanguageIdentifier.from_modelstring(model, norm_probs=True)
+    identifier.set_languages(list(NLLB_LANG_CODES))
+    return identifier.classify
+
+
+def _parse_numbered_reply(reply: str, count: int) -> Dict[int, str]:
+    """
+    解析打包翻译的回复
+
+    Returns:
+        {行号(1起): 译文}，重复或越界的行号视为对齐失败而丢弃
+    """
+    parsed: Dict[int, str] = {}
+    duplicated = set()
+    for line in reply.splitlines():
+        match = _NUMBERED_LINE_RE.match(line)
+        if not match:
+            continue
+        number, translation = int(match.group(1)), match.group(2).strip()
+        if not 1 <= number <= count:
+            continue
+        if number in parsed:
+            duplicated.add(number)
+        parsed[number] = translation
+    for number in duplicated:
+        parsed.pop(number, None)
+    return {n: t for n, t in parsed.items() if t}
+
 class MultiTranslator:
     """多引擎翻译器"""
     
     def __init__(self):
         self.engines = {}
         self.current_engine = None
+        self.memory: Optional[TranslationMemory] = None
+        self.fuzzy_memory: Optional[FuzzyMemory] = None
+        self.router: Optional[EngineRouter] = None
+        self.coalescer: Optional[BatchCoalescer] = None
+        self.glossary: Optional[Glossary] = None
+        self.lexicon: Optional[LexiconStore] = None
+        self.bypass_enabled = os.getenv("BYPASS_ENABLED", "true").lower() == "true"
+        # 超过该token数的输入按句子切块并行翻译，0为不切块
+        self.chunk_token_budget = int(os.getenv("CHUNK_TOKEN_BUDGET", "200"))
+        self.ready = False  # 预热完成前/health不报告就绪
+        self.warmup_state: Dict[str, Any] = {}
         self._initialize_engines()
+        self._initialize_router()
+        self._initialize_coalescer()
+        self._initialize_memory()
+        self._initialize_glossary()
+        self._initialize_lexicon()
     
     def _initialize_engines(self):
         """初始化可用的翻译引擎"""
         
         # Ollama翻译引擎
         use_ollama = os.getenv("USE_OLLAMA", "true").lower() == "true"
-        ollama_host = os.getenv("OLLAMA_HOST", "http://host.docker.internal:11434")
+        # 多台Ollama主机用逗号分隔
+        ollama_hosts = [
+            host.strip().rstrip("/")
+            for host in os.getenv("OLLAMA_HOST", "http://host.docker.internal:11434").split(",")
+            if host.strip()
+        ]
         ollama_model = os.getenv("OLLAMA_MODEL", "llama3.2:latest")
+        ollama_concurrency = max(1, int(os.getenv("OLLAMA_CONCURRENCY", "4")))  # 每台主机同时在途的请求数（初始值）
+        ollama_adaptive = os.getenv("OLLAMA_ADAPTIVE_CONCURRENCY", "true").lower() == "true"  # 按延迟和错误自动调整
+        ollama_timeout = float(os.getenv("OLLAMA_TIMEOUT", "120"))  # 单行超时（秒）
+        ollama_pack_mode = os.getenv("OLLAMA_PACK_MODE", "false").lower() == "true"  # 多行打包成一个提示
+        ollama_pack_token_budget = int(os.getenv("OLLAMA_PACK_TOKEN_BUDGET", "1024"))  # 每次调用的token预算
+        ollama_pack_max_lines = max(1, int(os.getenv("OLLAMA_PACK_MAX_LINES", "40")))  # 每次调用最多行数
+        ollama_max_predict = int(os.getenv("OLLAMA_MAX_PREDICT", "512"))  # num_predict上限
+        ollama_predict_slack = int(os.getenv("OLLAMA_PREDICT_SLACK", "16"))  # num_predict在估算值之外的余量
+        ollama_early_stop = os.getenv("OLLAMA_EARLY_STOP", "true").lower() == "true"  # 流式读取，发现解释文字即中止
+        ollama_api = os.getenv("OLLAMA_API", "chat").lower()  # chat: 固定系统提示复用前缀缓存；generate: 单段提示
+        ollama_keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # 模型在Ollama中保持加载的时长，-1为常驻
         
         if use_ollama:
             try:
                 self.engines['ollama'] = {
-                    'host': ollama_host,
+                    'hosts': ollama_hosts,
+                    'pool': HostPool(
+                        ollama_hosts,
+                        max_failures=int(os.getenv("OLLAMA_HOST_MAX_FAILURES", "3")),
+                        eject_seconds=float(os.getenv("OLLAMA_HOST_EJECT_SECONDS", "30"))
+                    ),
                     'model': ollama_model,
+                    'concurrency': ollama_concurrency * len(ollama_hosts),
+                    # 所有请求共享的在途限额；关闭自适应时上下限都固定为初始值
+                    'limiter': AdaptiveLimiter(
+                        initial=ollama_concurrency * len(ollama_hosts),
+                        min_limit=int(os.getenv("OLLAMA_MIN_CONCURRENCY", "1")) if ollama_adaptive
+                        else ollama_concurrency * len(ollama_hosts),
+                        max_limit=int(os.getenv("OLLAMA_MAX_CONCURRENCY", str(ollama_concurrency * len(ollama_hosts) * 4)))
+                        if ollama_adaptive else ollama_concurrency * len(ollama_hosts),
+                        latency_tolerance=float(os.getenv("OLLAMA_LATENCY_TOLERANCE", "2.0"))
+                    ),
+                    'timeout': ollama_timeout,
+                    'pack_mode': ollama_pack_mode,
+                    'pack_token_budget': ollama_pack_token_budget,
+                    'pack_max_lines': ollama_pack_max_lines,
+                    'max_predict': ollama_max_predict,
+                    'predict_slack': ollama_predict_slack,
+                    'early_stop': ollama_early_stop,
+                    'api': ollama_api if ollama_api in ("chat", "generate") else "chat",
+                    'keep_alive': ollama_keep_alive,
                     'type': 'ollama'
                 }
                 self.current_engine = 'ollama'
-                logger.info(f"✅ Ollama翻译引擎初始化成功: {ollama_host}, 模型: {ollama_model}")
+                logger.info(f"✅ Ollama翻译引擎初始化成功: {', '.join(ollama_hosts)}, 模型: {ollama_model}, "
+                            f"每主机并发: {ollama_concurrency}, 接口: /api/{self.engines['ollama']['api']}")
             except Exception as e:
                 logger.warning(f"⚠️ Ollama翻译引擎初始化失败: {e}")
         
+        # CTranslate2 NLLB翻译引擎（CPU int8），配置了模型路径时作为首选引擎
+        ct2_model_path = os.getenv("CT2_MODEL_PATH")
+        if ct2_model_path:
+            try:
+                import ctranslate2
+                import transformers
+                
+                ct2_inter_threads = int(os.getenv("CT2_INTER_THREADS", "1"))  # 可并行执行的批次数
+                ct2_intra_threads = int(os.getenv("CT2_INTRA_THREADS", "0"))  # 每个批次的计算线程数，0为自动
+                ct2_translator = ctranslate2.Translator(
+                    ct2_model_path,
+                    device="cpu",
+                    compute_type=os.getenv("CT2_COMPUTE_TYPE", "int8"),
+                    inter_threads=ct2_inter_threads,
+                    intra_threads=ct2_intra_threads
+                )
+                ct2_tokenizer = transformers.AutoTokenizer.from_pretrained(
+                    os.getenv("CT2_TOKENIZER", ct2_model_path)
+                )
+                self.engines['nllb-ct2'] = {
+                    'translator': ct2_translator,
+                    'tokenizer': ct2_tokenizer,
+                    'model': os.getenv("CT2_MODEL_NAME", os.path.basename(ct2_model_path.rstrip("/"))),
+                    'batch_size': int(os.getenv("CT2_BATCH_SIZE", "32")),
+                    'beam_size': int(os.getenv("CT2_BEAM_SIZE", "1")),
+                    'max_decoding_length': int(os.getenv("CT2_MAX_DECODING_LENGTH", "256")),
+                    'inter_threads': ct2_inter_threads,
+                    # auto源语言的语言识别；无法判断的行按批内主要语言，再不行用默认源语言
+                    'identify': _load_language_identifier()
+                    if os.getenv("CT2_LANG_ID", "true").lower() == "true" else None,
+                    'default_source_lang': os.getenv("CT2_DEFAULT_SOURCE_LANG", "en"),
+                    # 分词器的src_lang是共享状态，分词在线程中执行时需要加锁
+                    'tokenizer_lock': threading.Lock(),
+                    'type': 'ctranslate2'
+                }
+                self.current_engine = 'nllb-ct2'
+                logger.info(f"✅ CTranslate2翻译引擎初始化成功: {ct2_model_path}, "
+                            f"线程: inter={ct2_inter_threads}, intra={ct2_intra_threads}")
+            except Exception as e:
+                logger.warning(f"⚠️ CTranslate2翻译引擎初始化失败: {e}")
+        
         # 占位翻译引擎（测试用）
         self.engines['placeholder'] = {
             'type': 'placeholder'
@@ -49,17 +298,129 @@ class MultiTranslator:
             self.current_engine = 'placeholder'
             logger.warning("⚠️ 使用占位翻译引擎")
     
+    def _initialize_router(self):
+        """初始化引擎路由（占位引擎只在没有真实引擎时参与）"""
+        
+        routed = [name for name in ('nllb-ct2', 'ollama') if name in self.engines] or ['placeholder']
+        self.router = EngineRouter(
+            routed,
+            window=int(os.getenv("ROUTER_WINDOW", "100")),
+            min_samples=int(os.getenv("ROUTER_MIN_SAMPLES", "5")),
+            error_rate_threshold=float(os.getenv("ROUTER_ERROR_RATE", "0.5")),
+            consecutive_failures=int(os.getenv("ROUTER_CONSECUTIVE_FAILURES", "3")),
+            cooldown=float(os.getenv("ROUTER_COOLDOWN", "30"))
+        )
+        logger.info(f"✅ 引擎路由初始化成功: {routed}")
+    
+    def _initialize_coalescer(self):
+        """初始化跨请求微批合并"""
+        
+        if os.getenv("COALESCE_ENABLED", "true").lower() != "true":
+            return
+        
+        window_ms = float(os.getenv("COALESCE_WINDOW_MS", "10"))
+        max_lines = int(os.getenv("COALESCE_MAX_LINES", "64"))
+        self.coalescer = BatchCoalescer(self._coalesced_engine_batch, window_ms=window_ms, max_lines=max_lines)
+        logger.info(f"✅ 微批合并已启用: 窗口 {window_ms}ms, 上限 {max_lines} 行")
+    
+    def get_coalescer_stats(self) -> Optional[Dict[str, float]]:
+        """获取微批合并统计"""
+        return self.coalescer.get_stats() if self.coalescer else None
+    
+    def get_router_state(self) -> Dict[str, Any]:
+        """获取各引擎的路由/熔断状态"""
+        return self.router.get_state() if self.router else {}
+    
+    def _initialize_memory(self):
+        """初始化翻译记忆（精确匹配缓存）"""
+        
+        if os.getenv("TM_ENABLED", "true").lower() != "true":
+            return
+        
+        db_path = os.getenv("TM_DB_PATH", "data/translation_memory.db")
+        lru_size = int(os.getenv("TM_LRU_SIZE", "10000"))
+        try:
+            self.memory = TranslationMemory(db_path, lru_size=lru_size)
+            logger.info(f"✅ 翻译记忆初始化成功: {db_path}, LRU容量: {lru_size}")
+        except Exception as e:
+            logger.warning(f"⚠️ 翻译记忆初始化失败，不使用缓存: {e}")
+        
+        # 模糊匹配只容忍OCR噪声，但仍可能复用另一原文的译文，默认关闭
+        if os.getenv("FUZZY_TM_ENABLED", "false").lower() == "true":
+            max_edits = int(os.getenv("FUZZY_TM_MAX_EDITS", "2"))
+            max_entries = int(os.getenv("FUZZY_TM_MAX_ENTRIES", "100000"))
+            self.fuzzy_memory = FuzzyMemory(max_edits=max_edits, max_entries=max_entries)
+            # 从持久化的翻译记忆预热模糊索引
+            if self.memory:
+                try:
+                    for source, translation, src_lang, tgt_lang, engine, model in self.memory.recent_entries(max_entries):
+                        self.fuzzy_memory.add(source, translation, src_lang, tgt_lang, engine, model)
+                except Exception as e:
+                    logger.warning(f"⚠️ 模糊翻译记忆预热失败: {e}")
+            logger.info(f"✅ 模糊翻译记忆初始化成功: 最多 {max_edits} 处形近字符替换, 已载入 {self.fuzzy_memory.get_stats()['entries']} 条")
+    
+    def _initialize_glossary(self):
+        """加载术语表（术语替换为占位符，翻译后还原为固定译法）"""
+        
+        if os.getenv("GLOSSARY_ENABLED", "true").lower() != "true":
+            return
+        try:
+            self.glossary = Glossary(os.getenv("GLOSSARY_PATH", "data/glossary.csv"))
+            self.glossary.load()
+        except Exception as e:
+            self.glossary = None
+            logger.warning(f"⚠️ 术语表初始化失败: {e}")
+    
+    def _initialize_lexicon(self):
+        """加载各语言对的内存映射词典（短UI文案直接查表）"""
+        
+        lexicon_dir = os.getenv("LEXICON_DIR", "data/lexicon")
+        if os.getenv("LEXICON_ENABLED", "true").lower() != "true" or not os.path.isdir(lexicon_dir):
+            return
+        try:
+            self.lexicon = LexiconStore(lexicon_dir, max_words=int(os.getenv("LEXICON_MAX_WORDS", "3")))
+            logger.info(f"✅ 词典加载成功: {', '.join(self.lexicon.pairs) or '无'}")
+        except Exception as e:
+            logger.warning(f"⚠️ 词典初始化失败: {e}")
+    
+    def get_lexicon_stats(self) -> Optional[Dict[str, Any]]:
+        """获取词典统计"""
+        return self.lexicon.get_stats() if self.lexicon else None
+    
+    def reload_glossary(self) -> Optional[Dict[str, Any]]:
+        """重新加载术语表文件，返回加载后的统计"""
+        if not self.glossary:
+            return None
+        self.glossary.load()
+        return self.glossary.get_stats()
+    
+    def get_glossary_stats(self) -> Optional[Dict[str, Any]]:
+        """获取术语表统计"""
+        return self.glossary.get_stats() if self.glossary else None
+    
+    def get_memory_stats(self) -> Optional[Dict[str, int]]:
+        """获取翻译记忆命中统计"""
+        return self.memory.get_stats() if self.memory else None
+    
+    def get_fuzzy_memory_stats(self) -> Optional[Dict[str, int]]:
+        """获取模糊翻译记忆命中统计"""
+        return self.fuzzy_memory.get_stats() if self.fuzzy_memory else None
+    
     def get_available_engines(self) -> List[str]:
         """获取可用的翻译引擎列表"""
         return list(self.engines.keys())
     
     def get_current_engine(self) -> str:
-        """获取当前使用的翻译引擎"""
+        """获取当前使用的翻译引擎（路由器的首选引擎）"""
+        if self.router:
+            return self.router.best()
         return self.current_engine or 'placeholder'
     
     def get_default_engine(self) -> str:
         """获取默认翻译引擎"""
-        if 'ollama' in self.engines:
+        if 'nllb-ct2' in self.engines:
+            return 'nllb-ct2'
+        elif 'ollama' in self.engines:
             return 'ollama'
         else:
             return 'placeholder'
@@ -77,7 +438,8 @@ class MultiTranslator:
             "auto": "自动检测"
         }
     
-    async def translate_batch(self, texts: List[str], target_lang: str, source_lang: str = "auto") -> List[str]:
+    async def translate_batch(self, texts: List[str], target_lang: str, source_lang: str = "auto",
+                              stats: Optional[Dict[str, Any]] = None) -> List[str]:
         """
         批量翻译文本
         
@@ -85,6 +447,7 @@ class MultiTranslator:
             texts: 要翻译的文本列表
             target_lang: 目标语言
             source_lang: 源语言（auto为自动检测）
+            stats: 可选，传入字典时写入本次翻译的统计信息
             
         Returns:
             翻译结果列表
@@ -93,81 +456,944 @@ class MultiTranslator:
         if not texts:
             return []
         
-        if self.current_engine == 'ollama':
+        unique, positions = self._prepare(texts, target_lang, stats)
+        masked, replacements = self._protect_terms(unique, target_lang, stats)
+        pending = [i for i, text in enumerate(masked) if not Glossary.only_terms(text)]
+        results = await self._translate_segmented([masked[i] for i in pending], target_lang, source_lang, stats)
+        unique_translations = list(masked)
+        for i, translation in zip(pending, results):
+            unique_translations[i] = translation
+        restored = self._restore_terms(unique_translations, replacements)
+        
+        # 引擎丢失了术语占位符的行改为不做术语保护重新翻译，避免术语从译文中消失
+        lost = [i for i, translation in enumerate(restored) if translation is None]
+        if lost:
+            retried = await self._translate_segmented([unique[i] for i in lost], target_lang, source_lang)
+            for i, translation in zip(lost, retried):
+                restored[i] = translation
+            if stats is not None:
+                stats["glossary_fallbacks"] = len(lost)
+        return [texts[i] if p < 0 else restored[p] for i, p in enumerate(positions)]
+    
+    async def _translate_segmented(self, texts: List[str], target_lang: str, source_lang: str,
+                                   stats: Optional[Dict[str, Any]] = None) -> List[str]:
+        """翻译已去重的文本：超长的切块翻译后按原有分隔拼回"""
+        segments, layout, separators = self._split_long(texts, stats)
+        results = await self._translate_unique(segments, target_lang, source_lang)
+        return [
+            self._join_segments(text, [results[s] for s in segment_ids], target_lang, gaps)
+            for text, segment_ids, gaps in zip(texts, layout, separators)
+        ]
+    
+    def _split_long(self, texts: List[str],
+                    stats: Optional[Dict[str, Any]] = None) -> Tuple[List[str], List[List[int]], List[List[str]]]:
+        """
+        超长文本按句子边界切块（块之间也去重），各块作为独立的行交给后续翻译，从而并行执行
+        
+        Returns:
+            (块列表, 每个输入由哪些块按顺序组成, 每个输入相邻块之间原文中的空白)
+        """
+        
+        segments: List[str] = []
+        seen: Dict[str, int] = {}
+        layout: List[List[int]] = []
+        separators: List[List[str]] = []
+        chunked = 0
+        for text in texts:
+            if self.chunk_token_budget:
+                chunks, gaps = chunk_text(text, self.chunk_token_budget, _estimate_tokens)
+            else:
+                chunks, gaps = [text], []
+            separators.append(gaps)
+            if len(chunks) > 1:
+                chunked += 1
+            segment_ids = []
+            for chunk in chunks:
+                if chunk not in seen:
+                    seen[chunk] = len(segments)
+                    segments.append(chunk)
+                segment_ids.append(seen[chunk])
+            layout.append(segment_ids)
+        
+        if stats is not None and chunked:
+            stats["chunked_lines"] = chunked
+            stats["chunks"] = sum(len(ids) for ids in layout if len(ids) > 1)
+        return segments, layout, separators
+    
+    @staticmethod
+    def _join_segments(text: str, translations: List[str], target_lang: str, separators: List[str]) -> str:
+        """按顺序拼接各块译文（保留块之间原有的换行）；任一块失败时整行按失败处理"""
+        if len(translations) == 1:
+            return translations[0]
+        if any(translation.startswith("[ERR]") for translation in translations):
+            return f"[ERR] {text}"
+        return join_chunks(translations, target_lang, separators)
+    
+    def _protect_terms(self, texts: List[str], target_lang: str,
+                       stats: Optional[Dict[str, Any]] = None) -> Tuple[List[str], List[List[str]]]:
+        """
+        术语替换为占位符
+        
+        Returns:
+            (替换后的文本列表, 每行的占位符还原文本)
+        """
+        
+        if not self.glossary or not self.glossary.entries:
+            return texts, [[] for _ in texts]
+        
+        masked: List[str] = []
+        replacements: List[List[str]] = []
+        for text in texts:
+            protected, terms = self.glossary.protect(text, target_lang)
+            masked.append(protected)
+            replacements.append(terms)
+        
+        if stats is not None:
+            stats["glossary_terms"] = sum(len(terms) for terms in replacements)
+        return masked, replacements
+    
+    def _restore_terms(self, translations: List[str], replacements: List[List[str]],
+                       partial: bool = False) -> List[Optional[str]]:
+        """译文中的占位符还原为术语译法；丢失占位符的行为None（partial为True时只还原已出现的占位符）"""
+        if not self.glossary:
+            return list(translations)
+        return [self.glossary.restore(translation, terms, partial)
+                for translation, terms in zip(translations, replacements)]
+    
+    def _prepare(self, texts: List[str], target_lang: str,
+                 stats: Optional[Dict[str, Any]] = None) -> Tuple[List[str], List[int]]:
+        """
+        跳过无需翻译的行并去重
+        
+        归一化形式（NFKC + 空白合并）只用于判断和去重，交给引擎的是原文（取同一归一化形式的第一次出现），
+        以免全角标点、兼容字符等被改写后出现在译文中；翻译记忆和词典查询时各自归一化键
+        
+        Returns:
+            (去重后的原文列表, 每个输入对应的去重后下标；空行和无需翻译的行为-1，原样返回)
+        """
+        
+        unique: List[str] = []
+        seen: Dict[str, int] = {}
+        positions: List[int] = []
+        bypass_reasons: Dict[str, int] = {}
+        for text in texts:
+            normalized = normalize_text(text)
+            if not normalized:
+                positions.append(-1)
+                continue
+            reason = classify_untranslatable(normalized, target_lang) if self.bypass_enabled else None
+            if reason:
+                bypass_reasons[reason] = bypass_reasons.get(reason, 0) + 1
+                positions.append(-1)
+                continue
+            if normalized not in seen:
+                seen[normalized] = len(unique)
+                unique.append(text)
+            positions.append(seen[normalized])
+        
+        if stats is not None:
+            stats["total_lines"] = len(texts)
+            stats["unique_lines"] = len(unique)
+            # 去重率只统计需要翻译的行
+            translatable = sum(1 for p in positions if p >= 0)
+            stats["dedup_ratio"] = round(1 - len(unique) / translatable, 4) if translatable else 0.0
+            stats["bypassed_lines"] = sum(bypass_reasons.values())
+            stats["bypass_reasons"] = bypass_reasons
+        return unique, positions
+    
+    async def _translate_unique(self, texts: List[str], target_lang: str, source_lang: str) -> List[str]:
+        """翻译已去重的文本：先查翻译记忆，未命中的交给引擎"""
+        
+        if not texts:
+            return []
+        
+        translations = await self._lookup_memory(texts, target_lang, source_lang)
+        missing = [i for i, translation in enumerate(translations) if translation is None]
+        if not missing:
+            return translations
+        
+        missing_texts = [texts[i] for i in missing]
+        engine_results, engines_used = await self._dispatch_engine_batch(missing_texts, target_lang, source_lang)
+        for i, translation in zip(missing, engine_results):
+            translations[i] = translation
+        
+        await self._learn(missing_texts, engine_results, engines_used, target_lang, source_lang)
+        return translations
+    
+    async def translate_stream(self, texts: List[str], target_lang: str, source_lang: str = "auto",
+                               partial: bool = False,
+                               stats: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        流式翻译：每行完成即产出一条记录
+        
+        Args:
+            texts: 要翻译的文本列表
+            target_lang: 目标语言
+            source_lang: 源语言（auto为自动检测）
+            partial: 是否产出生成过程中的部分译文（仅Ollama引擎）
+            stats: 可选，传入字典时写入本次翻译的统计信息
+            
+        Yields:
+            {"index", "translation", "latency_ms", "final"}，顺序为完成顺序；
+            重复行的记录会同时推送到它们各自的位置
+        """
+        
+        if not texts:
+            return
+        
+        unique, positions = self._prepare(texts, target_lang, stats)
+        masked, replacements = self._protect_terms(unique, target_lang, stats)
+        fan_out: Dict[int, List[int]] = {}
+        for i, p in enumerate(positions):
+            if p < 0:
+                yield {"index": i, "translation": texts[i], "latency_ms": 0, "final": True}
+            else:
+                fan_out.setdefault(p, []).append(i)
+        
+        # 整行都是术语的直接还原
+        pending: List[int] = []
+        for p, text in enumerate(masked):
+            if Glossary.only_terms(text):
+                for i in fan_out[p]:
+                    yield {"index": i, "translation": self._restore_terms([text], [replacements[p]])[0],
+                           "latency_ms": 0, "final": True}
+            else:
+                pending.append(p)
+        
+        # 切块的行在所有块完成后拼接推送，不推送部分译文
+        segments, layout, separators = self._split_long([masked[p] for p in pending], stats)
+        owners: Dict[int, List[int]] = {}
+        for n, segment_ids in enumerate(layout):
+            for s in segment_ids:
+                if n not in owners.setdefault(s, []):
+                    owners[s].append(n)
+        finished: Dict[int, str] = {}
+        
+        async for record in self._translate_stream_unique(segments, target_lang, source_lang, partial):
+            s = record["index"]
+            if record["final"]:
+                finished[s] = record["translation"]
+            for n in owners[s]:
+                segment_ids = layout[n]
+                if not record["final"]:
+                    if len(segment_ids) > 1:
+                        continue
+                    translation = record["translation"]
+                elif all(segment in finished for segment in segment_ids):
+                    p = pending[n]
+                    translation = self._join_segments(
+                        masked[p], [finished[segment] for segment in segment_ids], target_lang, separators[n]
+                    )
+                else:
+                    continue
+                p = pending[n]
+                restored = self._restore_terms([translation], [replacements[p]], partial=not record["final"])[0]
+                if restored is None:
+                    # 丢失术语占位符：不做术语保护重新翻译这一行
+                    restored = (await self._translate_segmented([unique[p]], target_lang, source_lang))[0]
+                    if stats is not None:
+                        stats["glossary_fallbacks"] = stats.get("glossary_fallbacks", 0) + 1
+                translation = restored
+                for i in fan_out[p]:
+                    yield dict(record, index=i, translation=translation)
+    
+    async def _translate_stream_unique(self, texts: List[str], target_lang: str, source_lang: str,
+                                       partial: bool) -> AsyncIterator[Dict[str, Any]]:
+        """流式翻译已去重的文本，记录中的index为去重后的下标"""
+        
+        start_time = time.perf_counter()
+        
+        def record(index: int, translation: str, final: bool = True) -> Dict[str, Any]:
+            return {
+                "index": index,
+                "translation": translation,
+                "latency_ms": int((time.perf_counter() - start_time) * 1000),
+                "final": final
+            }
+        
+        if not texts:
+            return
+        
+        translations = await self._lookup_memory(texts, target_lang, source_lang)
+        missing = []
+        for i, translation in enumerate(translations):
+            if translation is None:
+                missing.append(i)
+            else:
+                yield record(i, translation)
+        if not missing:
+            return
+        
+        missing_texts = [texts[i] for i in missing]
+        candidates = self.router.candidates()
+        if not candidates or candidates[0] != 'ollama':
+            engine_results, engines_used = await self._dispatch_engine_batch(missing_texts, target_lang, source_lang)
+            for i, translation in zip(missing, engine_results):
+                yield record(i, translation)
+            await self._learn(missing_texts, engine_results, engines_used, target_lang, source_lang)
+            return
+        
+        # Ollama：逐行流式生成，完成一行推送一行（整批结果计入路由统计，不做逐行切换）
+        engine_config = self.engines['ollama']
+        self.router.begin('ollama')
+        engine_start = time.perf_counter()
+        queue: asyncio.Queue = asyncio.Queue()
+        results: Dict[int, str] = {}
+        os.environ['NO_PROXY'] = 'localhost,127.0.0.1'
+        
+        async with httpx.AsyncClient(timeout=engine_config['timeout']) as client:
+            
+            async def translate_line(i: int):
+                text = texts[i]
+                on_partial = (lambda so_far: queue.put_nowait(record(i, so_far, final=False))) if partial else None
+                try:
+                    translation = await self._ollama_translate_one(
+                        client, text, target_lang, source_lang, on_partial=on_partial
+                    )
+                except asyncio.TimeoutError:
+                    logger.error(f"翻译单条文本超时({engine_config['timeout']}s): {text[:50]}")
+                    translation = f"[ERR] {text}"
+                except Exception as e:
+                    logger.error(f"翻译单条文本时出错: {e}")
+                    translation = f"[ERR] {text}"
+                results[i] = translation
+                queue.put_nowait(record(i, translation))
+            
+            tasks = [asyncio.create_task(translate_line(i)) for i in missing]
+            try:
+                finished = 0
+                while finished < len(tasks):
+                    item = await queue.get()
+                    if item["final"]:
+                        finished += 1
+                    yield item
+            finally:
+                # 客户端断开时取消尚未完成的行
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+        
+        engine_results = [results[i] for i in missing]
+        self.router.record(
+            'ollama', (time.perf_counter() - engine_start) * 1000, len(engine_results),
+            sum(1 for translation in engine_results if translation.startswith("[ERR]"))
+        )
+        await self._learn(missing_texts, engine_results, ['ollama'] * len(missing_texts), target_lang, source_lang)
+    
+    async def _lookup_memory(self, texts: List[str], target_lang: str, source_lang: str) -> List[Optional[str]]:
+        """查询词典和翻译记忆（精确+模糊），未命中的位置为None"""
+        
+        if self.lexicon:
+            translations = [self.lexicon.lookup(text, source_lang, target_lang) for text in texts]
+        else:
+            translations = [None] * len(texts)
+        
+        engine = self.get_current_engine()
+        # 占位引擎的输出不写入翻译记忆
+        if engine == 'placeholder' or not (self.memory or self.fuzzy_memory):
+            return translations
+        
+        model = self.engines[engine].get('model', '')
+        pending = [i for i, translation in enumerate(translations) if translation is None]
+        if self.memory and pending:
+            found = await asyncio.to_thread(
+                self.memory.get_many, [texts[i] for i in pending], source_lang, target_lang, engine, model
+            )
+            for i, translation in zip(pending, found):
+                translations[i] = translation
+        
+        # 精确未命中的行查模糊索引
+        if self.fuzzy_memory:
+            for i, translation in enumerate(translations):
+                if translation is None:
+                    translations[i] = self.fuzzy_memory.lookup(texts[i], source_lang, target_lang, engine, model)
+        
+        return translations
+    
+    async def _learn(self, texts: List[str], translations: List[str], engines_used: List[str],
+                     target_lang: str, source_lang: str):
+        """把引擎翻译结果按产出引擎写入翻译记忆（失败的结果不缓存）"""
+        
+        by_engine: Dict[str, List[Tuple[str, str]]] = {}
+        for text, translation, engine in zip(texts, translations, engines_used):
+            if engine != 'placeholder' and not translation.startswith("[ERR]"):
+                by_engine.setdefault(engine, []).append((text, translation))
+        
+        for engine, learned in by_engine.items():
+            model = self.engines[engine].get('model', '')
+            if self.memory:
+                await asyncio.to_thread(
+                    self.memory.put_many,
+                    [text for text, _ in learned], [t for _, t in learned],
+                    source_lang, target_lang, engine, model
+                )
+            if self.fuzzy_memory:
+                for text, translation in learned:
+                    self.fuzzy_memory.add(text, translation, source_lang, target_lang, engine, model)
+    
+    async def _dispatch_engine_batch(self, texts: List[str], target_lang: str,
+                                     source_lang: str) -> Tuple[List[str], List[str]]:
+        """把需要引擎翻译的行交给微批合并队列（未启用时直接调用引擎）"""
+        
+        if not self.coalescer:
+            return await self._engine_translate_batch(texts, target_lang, source_lang)
+        
+        pairs = await self.coalescer.submit(texts, target_lang, source_lang)
+        return [translation for translation, _ in pairs], [engine for _, engine in pairs]
+    
+    async def _coalesced_engine_batch(self, texts: List[str], target_lang: str, source_lang: str) -> List[Tuple[str, str]]:
+        """微批合并队列的处理函数，返回每行的 (译文, 引擎)"""
+        translations, engines_used = await self._engine_translate_batch(texts, target_lang, source_lang)
+        return list(zip(translations, engines_used))
+    
+    async def _engine_translate_batch(self, texts: List[str], target_lang: str,
+                                      source_lang: str) -> Tuple[List[str], List[str]]:
+        """
+        经路由器调用翻译引擎
+        
+        按路由顺序尝试引擎，失败（"[ERR]"）的行交给下一个可用引擎重试；
+        所有引擎都熔断时直接返回 "[ERR] 原文"，不再等待超时
+        
+        Returns:
+            (翻译结果列表, 每行实际使用的引擎)
+        """
+        
+        translations = [f"[ERR] {text}" for text in texts]
+        engines_used = [''] * len(texts)
+        pending = list(range(len(texts)))
+        
+        candidates = self.router.candidates()
+        if not candidates:
+            logger.error(f"所有翻译引擎均已熔断，{len(texts)} 行直接返回失败")
+        
+        for engine in candidates:
+            batch = [texts[i] for i in pending]
+            self.router.begin(engine)
+            start = time.perf_counter()
+            try:
+                results = await self._call_engine(engine, batch, target_lang, source_lang)
+            except Exception as e:
+                logger.error(f"翻译引擎 {engine} 出错: {e}")
+                results = [f"[ERR] {text}" for text in batch]
+            errors = sum(1 for translation in results if translation.startswith("[ERR]"))
+            self.router.record(engine, (time.perf_counter() - start) * 1000, len(batch), errors)
+            
+            for i, translation in zip(pending, results):
+                translations[i] = translation
+                engines_used[i] = engine
+            pending = [i for i in pending if translations[i].startswith("[ERR]")]
+            if not pending:
+                break
+            logger.warning(f"引擎 {engine} 有 {len(pending)} 行失败，尝试下一个引擎")
+        
+        return translations, engines_used
+    
+    async def _call_engine(self, engine: str, texts: List[str], target_lang: str, source_lang: str) -> List[str]:
+        """调用指定翻译引擎"""
+        
+        if engine == 'ollama':
             return await self._ollama_translate_batch(texts, target_lang, source_lang)
-        elif self.current_engine == 'placeholder':
+        elif engine == 'nllb-ct2':
+            return await self._ct2_translate_batch(texts, target_lang, source_lang)
+        elif engine == 'placeholder':
             return self._placeholder_translate_batch(texts, target_lang, source_lang)
         else:
-            raise ValueError(f"Unknown engine: {self.current_engine}")
+            raise ValueError(f"Unknown engine: {engine}")
     
     async def _ollama_translate_batch(self, texts: List[str], target_lang: str, source_lang: str) -> List[str]:
-        """使用Ollama进行批量翻译"""
+        """
+        使用Ollama进行批量翻译
+
+        各行并发请求，同时在途的请求数由全局自适应限额控制，
+        每行有独立超时；结果按输入顺序返回，单行失败返回 "[ERR] 原文"
+        """
         
         engine_config = self.engines['ollama']
-        host = engine_config['host']
-        model = engine_config['model']
-        
-        # 语言映射
-        lang_map = {
-            'zh': '中文',
-            'en': 'English',
-            'ja': '日本語', 
-            'ko': '한국어',
-            'fr': 'Français',
-            'de': 'Deutsch',
-            'es': 'Español'
-        }
         
-        target_lang_name = lang_map.get(target_lang, target_lang)
+        # 设置环境变量来绕过代理（需在创建client之前）
+        os.environ['NO_PROXY'] = 'localhost,127.0.0.1'
         
-        translations = []
-        
-        async with httpx.AsyncClient(timeout=120) as client:
-            # 设置环境变量来绕过代理
-            import os
-            os.environ['NO_PROXY'] = 'localhost,127.0.0.1'
+        async with httpx.AsyncClient(timeout=engine_config['timeout']) as client:
             
-            for text in texts:
+            async def translate_line(text: str) -> str:
                 try:
-                    # 构建翻译提示
-                    if source_lang == "auto":
-                        prompt = f"Please translate the following text into {target_lang_name}. Only return the translation result, no explanation:\n\n{text}"
-                    else:
-                        source_lang_name = lang_map.get(source_lang, source_lang)
-                        prompt = f"Please translate the following {source_lang_name} text into {target_lang_name}. Only return the translation result, no explanation:\n\n{text}"
-                    
-                    # 调用Ollama API
-                    response = await client.post(
-                        f"{host}/api/generate",
-                        json={
-                            "model": model,
-                            "prompt": prompt,
-                            "stream": False,
-                            "options": {
-                                "temperature": 0.3,
-                                "top_p": 0.9,
-                                "max_tokens": 1000
-                            }
-                        }
-                    )
-                    
-                    if response.status_code == 200:
-                        result = response.json()
-                        translation = result.get("response", "").strip()
-                        
-                        # 简单的后处理，移除可能的解释文本
-                        if translation.startswith("Translation:") or translation.startswith("翻译:"):
-                            translation = translation.split(":", 1)[-1].strip()
-                        
-                        translations.append(translation if translation else text)
-                    else:
-                        logger.warning(f"Ollama翻译失败: {response.status_code} - {response.text}")
-                        translations.append(f"[ERR] {text}")
-                        
+                    return await self._ollama_translate_one(client, text, target_lang, source_lang)
+                except asyncio.TimeoutError:
+                    logger.error(f"翻译单条文本超时({engine_config['timeout']}s): {text[:50]}")
+                    return f"[ERR] {text}"
                 except Exception as e:
                     logger.error(f"翻译单条文本时出错: {e}")
-                    translations.append(f"[ERR] {text}")
+                    return f"[ERR] {text}"
+            
+            if engine_config['pack_mode'] and len(texts) > 1:
+                return await self._ollama_translate_packed(client, texts, target_lang, source_lang, translate_line)
+            
+            # gather 保证结果顺序与输入一致
+            translations = await asyncio.gather(*(translate_line(text) for text in texts))
+        
+        return list(translations)
+    
+    def _pack_lines(self, texts: List[str], target_lang: str) -> List[List[int]]:
+        """
+        按token预算把行分组（返回每组的下标列表）
+
+        预算同时计入原文和预计的等长译文；每组按_generation_limits估算的生成长度也不超过max_predict，
+        避免整组译文被num_predict截断；含换行的文本单独成组
+        """
+        engine_config = self.engines['ollama']
+        budget = engine_config['pack_token_budget']
+        max_lines = engine_config['pack_max_lines']
+        factor = _OUTPUT_FACTOR.get(target_lang, _DEFAULT_OUTPUT_FACTOR)
+        output_budget = engine_config['max_predict'] - engine_config['predict_slack']
+        
+        groups: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = 0
+        current_source = 0
+        for i, text in enumerate(texts):
+            # 行号等格式开销按4个token计，译文按与原文等长估算
+            source = _estimate_tokens(text) + 4
+            cost = source * 2
+            if '\n' in text:
+                groups.append([i])
+                continue
+            if current and (current_tokens + cost > budget or len(current) >= max_lines
+                            or (current_source + source) * factor > output_budget):
+                groups.append(current)
+                current, current_tokens, current_source = [], 0, 0
+            current.append(i)
+            current_tokens += cost
+            current_source += source
+        if current:
+            groups.append(current)
+        return groups
+    
+    async def _ollama_translate_packed(self, client: httpx.AsyncClient, texts: List[str], target_lang: str,
+                                       source_lang: str, translate_line) -> List[str]:
+        """
+        打包模式：多行合并为一个编号提示翻译，回复按行号拆回
+
+        对齐失败（缺行、重复行号、整组出错）的行再逐行重新翻译
+        """
+        
+        translations: List[Optional[str]] = [None] * len(texts)
+        groups = self._pack_lines(texts, target_lang)
+        
+        async def translate_group(indices: List[int]):
+            if len(indices) == 1:
+                return
+            lines = [texts[i] for i in indices]
+            system = self._system_prompt(target_lang, source_lang, packed=True)
+            numbered = "\n".join(f"{n}. {line}" for n, line in enumerate(lines, 1))
+            num_predict, stop = self._generation_limits(lines, target_lang, packed=True)
+            try:
+                reply = await self._ollama_generate(
+                    client, system, numbered, num_predict, stop, cut_paragraph=False,
+                    cut_marker=not any(_has_note_marker(line) for line in lines)
+                )
+            except Exception as e:
+                logger.warning(f"打包翻译失败({len(indices)}行): {e!r}")
+                return
+            if reply is None:
+                return
+            parsed = _parse_numbered_reply(reply, len(indices))
+            for number, i in enumerate(indices, 1):
+                if number in parsed:
+                    translations[i] = self._clean_translation(parsed[number], texts[i])
+        
+        await asyncio.gather(*(translate_group(indices) for indices in groups))
+        
+        # 对齐失败的行逐行重译
+        failed = [i for i, translation in enumerate(translations) if translation is None]
+        if failed:
+            logger.info(f"打包翻译: {len(groups)} 次调用, {len(failed)}/{len(texts)} 行需逐行重译")
+            retried = await asyncio.gather(*(translate_line(texts[i]) for i in failed))
+            for i, translation in zip(failed, retried):
+                translations[i] = translation
+        
+        return translations
+    
+    def _system_prompt(self, target_lang: str, source_lang: str, packed: bool) -> str:
+        """
+        构建翻译指令
+        
+        同一语言对的指令逐字节固定，原文放在其后（chat模式为单独的user消息），
+        Ollama可复用该前缀的KV缓存
+        """
+        target_lang_name = LANG_NAMES.get(target_lang, target_lang)
+        source = "" if source_lang == "auto" else f"{LANG_NAMES.get(source_lang, source_lang)} "
+        if packed:
+            return (
+                f"Please translate each numbered {source}line into {target_lang_name}. "
+                f"Return one line per input line in the form \"<number>. <translation>\", in the same order. "
+                f"Only return the translations, no explanation."
+            ) + self._placeholder_hint()
+        instruction = f"Please translate the following {source}text into {target_lang_name}. Only return the translation result, no explanation."
+        return instruction + self._placeholder_hint()
+    
+    def _placeholder_hint(self) -> str:
+        """启用术语表时提示模型保留占位符"""
+        if self.glossary and self.glossary.entries:
+            return f" Keep placeholders such as {PLACEHOLDER.format(1)} unchanged."
+        return ""
+    
+    async def _ollama_translate_one(self, client: httpx.AsyncClient, text: str, target_lang: str, source_lang: str,
+                                    on_partial: Optional[Callable[[str], None]] = None) -> str:
+        """
+        调用Ollama翻译单条文本
+
+        提供 on_partial 时使用流式生成，每收到新token回调一次当前累积译文
+        """
+        
+        system = self._system_prompt(target_lang, source_lang, packed=False)
+        num_predict, stop = self._generation_limits([text], target_lang, packed=False)
+        translation = await self._ollama_generate(
+            client, system, text, num_predict, stop, cut_paragraph="\n\n" not in text,
+            on_partial=on_partial, cut_marker=_may_cut_explanation(text)
+        )
+        if translation is None:
+            return f"[ERR] {text}"
+        
+        translation = self._clean_translation(translation, text)
+        return translation if translation else text
+    
+    def _clean_translation(self, translation: str, source: str) -> str:
+        """简单的后处理，移除可能的解释文本（原文本身有注释标记或为多行时不截断）"""
+        cut = _find_explanation(translation, cut_paragraph=False) if _may_cut_explanation(source) else None
+        if cut is not None:
+            translation = translation[:cut]
+        translation = translation.strip()
+        if translation.startswith("Translation:") or translation.startswith("翻译:"):
+            translation = translation.split(":", 1)[-1].strip()
+        return translation
+    
+    def _generation_limits(self, texts: List[str], target_lang: str, packed: bool) -> Tuple[int, List[str]]:
+        """
+        按原文长度和目标语言确定生成上限和停止序列
+        
+        Returns:
+            (num_predict, stop)
+        """
+        
+        engine_config = self.engines['ollama']
+        factor = _OUTPUT_FACTOR.get(target_lang, _DEFAULT_OUTPUT_FACTOR)
+        # 打包模式每行还要输出行号
+        source_tokens = sum(_estimate_tokens(text) + (4 if packed else 0) for text in texts)
+        num_predict = min(engine_config['max_predict'], int(source_tokens * factor) + engine_config['predict_slack'])
+        
+        # 原文本身带"Note:"/"注："等标记时，译文里出现同类标记是正文，不能作为停止序列
+        # （也包括跨语言的情况，如原文"注："译成"Note:"）
+        stop = [] if any(_has_note_marker(text) for text in texts) else list(_STOP_SEQUENCES)
+        # 单行原文的译文不应出现空行，出现即说明模型开始额外说明
+        if not packed and not any("\n\n" in text for text in texts):
+            stop.append("\n\n")
+        return num_predict, stop
+    
+    def _ollama_request(self, system: str, content: str, stream: bool, num_predict: int,
+                        stop: List[str]) -> Tuple[str, Dict[str, Any]]:
+        """
+        构建Ollama请求（Ollama的长度参数为num_predict）
+        
+        Returns:
+            (接口路径, 请求体)
+        """
+        engine_config = self.engines['ollama']
+        payload: Dict[str, Any] = {
+            "model": engine_config['model'],
+            "stream": stream,
+            "keep_alive": engine_config['keep_alive'],
+            "options": {
+                "temperature": 0.3,
+                "top_p": 0.9,
+                "num_predict": num_predict,
+                "stop": stop
+            }
+        }
+        if engine_config['api'] == "chat":
+            payload["messages"] = [
+                {"role": "system", "content": system},
+                {"role": "user", "content": content}
+            ]
+            return "/api/chat", payload
+        payload["prompt"] = f"{system}\n\n{content}"
+        return "/api/generate", payload
+    
+    @staticmethod
+    def _ollama_output(chunk: Dict[str, Any]) -> str:
+        """取出 /api/generate 或 /api/chat 响应（或流式分块）中的生成文本"""
+        if "message" in chunk:
+            return (chunk.get("message") or {}).get("content", "")
+        return chunk.get("response", "")
+    
+    async def _ollama_on_host(self, send: Callable[[str], Awaitable[Tuple[Any, int]]],
+                              may_retry: Optional[Callable[[], bool]] = None) -> Any:
+        """
+        从主机池选一台Ollama主机执行 send(host)，连接失败或5xx时换一台主机重试一次
+        
+        Args:
+            send: 向指定主机发请求，返回 (结果, HTTP状态码)，非200时自行记录错误
+            may_retry: 连接失败时是否还能重试（如流式生成已输出部分结果时不再重试）
+        
+        Returns:
+            状态码为200时的结果，否则None（连接失败且无主机可换时抛出异常）
+        """
+        
+        pool: HostPool = self.engines['ollama']['pool']
+        attempts = min(2, len(pool.hosts))
+        tried: List[str] = []
+        for attempt in range(attempts):
+            host = pool.acquire(exclude=tried)
+            tried.append(host)
+            start = time.perf_counter()
+            ok: Optional[bool] = None
+            try:
+                result, status = await send(host)
+                ok = status == 200
+            except httpx.TransportError as e:
+                ok = False
+                if attempt + 1 >= attempts or (may_retry and not may_retry()):
+                    raise
+                logger.warning(f"Ollama主机 {host} 请求失败: {e!r}，换主机重试")
+                continue
+            finally:
+                pool.release(host, ok, (time.perf_counter() - start) * 1000)
+            
+            if ok:
+                return result
+            if status < 500:
+                return None
+        return None
+    
+    async def _ollama_post(self, client: httpx.AsyncClient, path: str, payload: Dict[str, Any]) -> Optional[httpx.Response]:
+        """发送非流式请求（主机选择与重试见_ollama_on_host），失败返回None"""
+        
+        async def send(host: str) -> Tuple[httpx.Response, int]:
+            response = await client.post(f"{host}{path}", json=payload)
+            if response.status_code != 200:
+                logger.warning(f"Ollama翻译失败({host}): {response.status_code} - {response.text}")
+            return response, response.status_code
+        
+        return await self._ollama_on_host(send)
+    
+    def get_concurrency_state(self) -> Optional[Dict[str, Any]]:
+        """获取Ollama自适应并发限额及其变化历史"""
+        if 'ollama' not in self.engines:
+            return None
+        return self.engines['ollama']['limiter'].get_state()
+    
+    def get_ollama_host_stats(self) -> Optional[Dict[str, Any]]:
+        """获取各Ollama主机的负载与健康状态"""
+        if 'ollama' not in self.engines:
+            return None
+        return self.engines['ollama']['pool'].get_stats()
+    
+    async def warm_up(self):
+        """
+        启动预热，完成后标记就绪
+        
+        在每台Ollama主机上用常用语言对的固定指令各发一次极短请求：模型被加载并按keep_alive常驻，
+        指令前缀也进入KV缓存。预热失败只记录告警，不阻止服务就绪（路由器会按实际错误率切换引擎）
+        """
+        
+        engine_config = self.engines.get('ollama')
+        if not engine_config or os.getenv("OLLAMA_WARMUP", "true").lower() != "true":
+            self.ready = True
+            return
+        
+        langs = [lang.strip() for lang in os.getenv("OLLAMA_WARMUP_LANGS", "zh").split(",") if lang.strip()]
+        timeout = float(os.getenv("OLLAMA_WARMUP_TIMEOUT", "300"))
+        systems = [self._system_prompt(lang, "auto", packed=False) for lang in langs]
+        if engine_config['pack_mode']:
+            systems += [self._system_prompt(lang, "auto", packed=True) for lang in langs]
+        
+        async def warm_host(client: httpx.AsyncClient, host: str) -> Dict[str, Any]:
+            start = time.perf_counter()
+            try:
+                for system in systems:
+                    path, payload = self._ollama_request(system, "Hello", False, 1, [])
+                    response = await client.post(f"{host}{path}", json=payload)
+                    response.raise_for_status()
+            except Exception as e:
+                logger.warning(f"⚠️ Ollama主机 {host} 预热失败: {e!r}")
+                return {"ok": False, "error": str(e)}
+            return {"ok": True, "latency_ms": int((time.perf_counter() - start) * 1000)}
+        
+        logger.info(f"开始预热Ollama模型 {engine_config['model']}（语言: {', '.join(langs)}）")
+        start = time.perf_counter()
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            results = await asyncio.gather(*(warm_host(client, host) for host in engine_config['hosts']))
+        
+        self.warmup_state = {
+            "langs": langs,
+            "hosts": dict(zip(engine_config['hosts'], results)),
+            "duration_ms": int((time.perf_counter() - start) * 1000)
+        }
+        self.ready = True
+        warmed = sum(1 for result in results if result["ok"])
+        logger.info(f"✅ Ollama预热完成: {warmed}/{len(results)} 台主机，耗时 {self.warmup_state['duration_ms']}ms")
+    
+    async def _ollama_generate(self, client: httpx.AsyncClient, system: str, content: str, num_predict: int,
+                               stop: List[str], cut_paragraph: bool,
+                               on_partial: Optional[Callable[[str], None]] = None,
+                               cut_marker: bool = True) -> Optional[str]:
+        """
+        调用Ollama生成译文，失败返回None，超时抛出 asyncio.TimeoutError
+        
+        先在全局自适应限额中排队（排队时间不计入超时），拿到名额后按本次耗时与结果调整限额
+        """
+        
+        engine_config = self.engines['ollama']
+        limiter: AdaptiveLimiter = engine_config['limiter']
+        await limiter.acquire()
+        start = time.perf_counter()
+        ok: Optional[bool] = None
+        try:
+            result = await asyncio.wait_for(
+                self._ollama_generate_once(client, system, content, num_predict, stop, cut_paragraph, on_partial,
+                                           cut_marker=cut_marker),
+                timeout=engine_config['timeout']
+            )
+            ok = result is not None
+            return result
+        except (asyncio.TimeoutError, httpx.HTTPError):
+            ok = False
+            raise
+        finally:
+            # 工作量按原文token数加上固定的提示开销估算
+            limiter.release((time.perf_counter() - start) * 1000, ok, _estimate_tokens(content) + 16)
+    
+    async def _ollama_generate_once(self, client: httpx.AsyncClient, system: str, content: str, num_predict: int,
+                                    stop: List[str], cut_paragraph: bool,
+                                    on_partial: Optional[Callable[[str], None]] = None,
+                                    cut_marker: bool = True) -> Optional[str]:
+        """
+        单次Ollama生成
+        
+        需要部分结果或开启early_stop时走流式生成，发现模型开始解释即中止
+        """
+        
+        if on_partial or self.engines['ollama']['early_stop']:
+            return await self._ollama_generate_stream(
+                client, system, content, num_predict, stop, cut_paragraph, on_partial, cut_marker=cut_marker
+            )
+        
+        # 调用Ollama API
+        path, payload = self._ollama_request(system, content, False, num_predict, stop)
+        response = await self._ollama_post(client, path, payload)
+        if response is None:
+            return None
+        
+        return self._ollama_output(response.json())
+    
+    async def _ollama_generate_stream(self, client: httpx.AsyncClient, system: str, content: str,
+                                      num_predict: int, stop: List[str], cut_paragraph: bool,
+                                      on_partial: Optional[Callable[[str], None]] = None,
+                                      cut_marker: bool = True) -> Optional[str]:
+        """
+        以 stream: true 调用Ollama，失败返回None
+        
+        逐块回调累积文本；累积文本中出现解释文字时截断并关闭连接，Ollama随之停止生成
+        """
+        
+        path, payload = self._ollama_request(system, content, True, num_predict, stop)
+        parts: List[str] = []
+        
+        async def send(host: str) -> Tuple[Optional[str], int]:
+            parts.clear()
+            async with client.stream("POST", f"{host}{path}", json=payload) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    logger.warning(f"Ollama翻译失败({host}): {response.status_code} - {response.text}")
+                    return None, response.status_code
+                
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    token = self._ollama_output(chunk)
+                    if token:
+                        parts.append(token)
+                        text = "".join(parts)
+                        cut = _find_explanation(text, cut_paragraph, cut_marker)
+                        if cut is not None:
+                            logger.debug(f"检测到模型开始解释，提前结束生成（已生成 {len(text)} 字符）")
+                            parts[:] = [text[:cut]]
+                            break
+                        if on_partial:
+                            on_partial(text.strip())
+                    if chunk.get("done"):
+                        break
+            return "".join(parts), 200
+        
+        # 已经输出过部分结果时中途断开不换主机重试，避免部分译文重复推送
+        return await self._ollama_on_host(send, may_retry=lambda: not parts)
+    
+    async def _ct2_translate_batch(self, texts: List[str], target_lang: str, source_lang: str) -> List[str]:
+        """
+        使用CTranslate2 (NLLB) 进行批量翻译
+
+        按源语言分组、按token长度排序后切分批次，减少padding；
+        多个批次并发提交，由 inter_threads 决定实际并行度。批次失败时该批返回 "[ERR] 原文"
+        """
+        
+        engine_config = self.engines['nllb-ct2']
+        tokenizer = engine_config['tokenizer']
+        target_code = NLLB_LANG_CODES.get(target_lang, target_lang)
+        batch_size = engine_config['batch_size']
+        
+        def tokenize() -> List[Tuple[str, List[str], int]]:
+            """判断源语言并分词，返回 (源语言代码, token序列, 原始下标)"""
+            if source_lang == "auto":
+                langs = [_guess_lang(text, engine_config['identify']) for text in texts]
+                # 同一批通常来自同一张图片，无法判断的行（多为短行）按其余行的主要语言处理
+                counts = Counter(lang for lang in langs if lang)
+                fallback = counts.most_common(1)[0][0] if counts else engine_config['default_source_lang']
+                langs = [lang or fallback for lang in langs]
+            else:
+                langs = [source_lang] * len(texts)
+            
+            items = []
+            with engine_config['tokenizer_lock']:
+                for i, (text, lang) in enumerate(zip(texts, langs)):
+                    source_code = NLLB_LANG_CODES.get(lang, lang)
+                    tokenizer.src_lang = source_code
+                    tokens = tokenizer.convert_ids_to_tokens(tokenizer.encode(text))
+                    items.append((source_code, tokens, i))
+            return items
+        
+        # 语言识别和分词都是CPU计算，放到线程中执行，不阻塞事件循环
+        items = await asyncio.to_thread(tokenize)
+        items.sort(key=lambda item: (item[0], len(item[1])))
+        
+        batches = [items[start:start + batch_size] for start in range(0, len(items), batch_size)]
+        translations: List[str] = [""] * len(texts)
+        
+        def run_batch(batch) -> List[str]:
+            results = engine_config['translator'].translate_batch(
+                [tokens for _, tokens, _ in batch],
+                target_prefix=[[target_code]] * len(batch),
+                beam_size=engine_config['beam_size'],
+                max_decoding_length=engine_config['max_decoding_length']
+            )
+            outputs = []
+            for result in results:
+                hypothesis = result.hypotheses[0]
+                # 去掉开头的目标语言标记
+                if hypothesis and hypothesis[0] == target_code:
+                    hypothesis = hypothesis[1:]
+                outputs.append(tokenizer.decode(tokenizer.convert_tokens_to_ids(hypothesis), skip_special_tokens=True))
+            return outputs
+        
+        async def translate_batch_chunk(batch):
+            try:
+                outputs = await asyncio.to_thread(run_batch, batch)
+            except Exception as e:
+                logger.error(f"CTranslate2批次翻译出错({len(batch)}行): {e}")
+                outputs = [f"[ERR] {texts[i]}" for _, _, i in batch]
+            for (_, _, i), translation in zip(batch, outputs):
+                translations[i] = translation.strip() or texts[i]
         
+        await asyncio.gather(*(translate_batch_chunk(batch) for batch in batches))
         return translations
     
     def _placeholder_translate_batch(self, texts: List[str], target_lang: str, source_lang: str) -> List[str]:
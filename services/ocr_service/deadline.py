@@ -0,0 +1,81 @@
+"""
+请求截止时间
+编排服务在 X-Deadline-Ms 请求头中传递剩余时间（毫秒，相对值，避免依赖各机器时钟同步）；
+截止时间到达或客户端断开时取消正在进行的处理
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from starlette.requests import Request
+
+DEADLINE_HEADER = "X-Deadline-Ms"
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(Exception):
+    """截止时间已过"""
+
+
+class ClientDisconnected(Exception):
+    """客户端已断开"""
+
+
+def parse_deadline(value: Optional[str], default_seconds: float = 0) -> Optional[float]:
+    """
+    把请求头中的剩余毫秒数换算为本机单调时钟上的截止时刻
+
+    Returns:
+        截止时刻（time.monotonic()），未指定且无默认值时为None
+    """
+    if value:
+        try:
+            return time.monotonic() + max(0.0, float(value)) / 1000
+        except ValueError:
+            pass
+    return time.monotonic() + default_seconds if default_seconds else None
+
+
+def remaining_ms(deadline: Optional[float]) -> Optional[int]:
+    """距截止时刻的剩余毫秒数，用于向下游转发"""
+    if deadline is None:
+        return None
+    return max(0, int((deadline - time.monotonic()) * 1000))
+
+
+async def run_until_disconnect(request: Request, work: Awaitable[T], deadline: Optional[float],
+                               poll_interval: float = 0.5,
+                               on_discard: Optional[Callable[[T], None]] = None) -> T:
+    """
+    执行work，截止时间到达或客户端断开时取消它
+
+    work在判定超时/断开的同时已经完成时仍返回其结果；work已完成但结果没能交给调用方
+    （如本协程被取消，或取消work时它已完成）时，把结果交给on_discard（用于释放work申请到的资源，如执行槽位）
+
+    Raises:
+        DeadlineExceeded: 截止时间已过
+        ClientDisconnected: 客户端已断开
+    """
+    task = asyncio.ensure_future(work)
+    delivered = False
+    try:
+        while True:
+            timeout = poll_interval
+            if deadline is not None:
+                timeout = min(timeout, deadline - time.monotonic())
+                if timeout <= 0 and not task.done():
+                    raise DeadlineExceeded()
+            done, _ = await asyncio.wait({task}, timeout=max(0, timeout))
+            if done:
+                delivered = True
+                return task.result()
+            if await request.is_disconnected() and not task.done():
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        if not delivered and on_discard and not task.cancelled() and task.exception() is None:
+            on_discard(task.result())
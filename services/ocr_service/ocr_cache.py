@@ -0,0 +1,285 @@
+"""
+OCR结果缓存（按内容寻址）
+键为 解码后像素的哈希 + 引擎 + 版本；进程内LRU + SQLite(WAL)磁盘层，磁盘层超出容量时淘汰最久未访问的条目；
+可选的感知哈希层用于命中重新编码或轻微缩放过的同一张图片
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# 感知哈希的采样边长（dHash：(N+1)×N 灰度图相邻像素比较，共N×N位）
+_PHASH_SIDE = 32
+# 感知哈希命中时要求两张图片宽高比相差不超过该比例
+_ASPECT_TOLERANCE = 0.02
+
+
+def content_hash(image: Image.Image) -> str:
+    """解码后像素的哈希（与文件格式、压缩参数、元数据无关）"""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{image.mode}:{image.width}x{image.height}:".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def perceptual_hash(image: Image.Image) -> bytes:
+    """dHash：缩到 (N+1)×N 灰度图，比较水平相邻像素的明暗"""
+    small = image.convert('L').resize((_PHASH_SIDE + 1, _PHASH_SIDE), Image.BOX)
+    pixels = np.asarray(small, dtype=np.int16)
+    return np.packbits(pixels[:, 1:] > pixels[:, :-1]).tobytes()
+
+
+class OCRCache:
+    """OCR结果缓存"""
+
+    def __init__(self, db_path: str, lru_size: int = 512, disk_max_bytes: int = 512 * 1024 * 1024,
+                 phash_enabled: bool = False, phash_distance: int = 48):
+        """
+        Args:
+            db_path: 磁盘层SQLite文件路径
+            lru_size: 进程内LRU最多条目数
+            disk_max_bytes: 磁盘层结果数据总大小上限
+            phash_enabled: 是否启用感知哈希近似匹配
+            phash_distance: 感知哈希汉明距离不超过该值视为同一张图片（共 _PHASH_SIDE² 位）
+        """
+        self.lru_size = lru_size
+        self.disk_max_bytes = disk_max_bytes
+        self.phash_enabled = phash_enabled
+        self.phash_distance = phash_distance
+        self._lru: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"lru_hits": 0, "disk_hits": 0, "phash_hits": 0, "misses": 0,
+                       "writes": 0, "evictions": 0}
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                scope TEXT NOT NULL,
+                phash BLOB,
+                width INTEGER NOT NULL,
+                height INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_accessed ON results (accessed_at)")
+        self._disk_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+        # 感知哈希索引：scope -> (键列表, 哈希矩阵, 宽高列表)，启动时从磁盘层载入
+        self._phash_index: Dict[str, Tuple[List[str], np.ndarray, List[Tuple[int, int]]]] = {}
+        if phash_enabled:
+            rows = self._conn.execute(
+                "SELECT key, scope, phash, width, height FROM results WHERE phash IS NOT NULL"
+            ).fetchall()
+            for key, scope, phash, width, height in rows:
+                self._index_phash(scope, key, phash, width, height)
+
+    @staticmethod
+    def make_key(digest: str, scope: str) -> str:
+        """缓存键：内容哈希 + 引擎与版本"""
+        return hashlib.sha1(f"{digest}\x1f{scope}".encode()).hexdigest()
+
+    def get(self, image: Image.Image, digest: str, scope: str) -> Optional[Tuple[Dict[str, Any], str]]:
+        """
+        查询缓存
+
+        Args:
+            image: 原始图片
+            digest: 图片的content_hash
+            scope: 引擎与版本标识，结果只在相同scope内复用
+
+        Returns:
+            (缓存内容, 命中层级 lru/disk/phash)，未命中为None；调用方不应修改缓存内容
+        """
+        key = self.make_key(digest, scope)
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                self._stats["lru_hits"] += 1
+                return self._lru[key], "lru"
+
+            row = self._conn.execute("SELECT data FROM results WHERE key = ?", (key,)).fetchone()
+            if row:
+                value = json.loads(row[0])
+                self._touch(key)
+                self._remember(key, value)
+                self._stats["disk_hits"] += 1
+                return value, "disk"
+
+        if self.phash_enabled:
+            match = self._find_similar(image, scope)
+            if match:
+                with self._lock:
+                    self._remember(key, match)
+                    self._stats["phash_hits"] += 1
+                return match, "phash"
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, image: Image.Image, digest: str, scope: str, value: Dict[str, Any]):
+        """写入缓存（value需可JSON序列化）"""
+        key = self.make_key(digest, scope)
+        phash = perceptual_hash(image) if self.phash_enabled else None
+        data = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            # LRU中存一份独立副本，避免与调用方持有的对象互相影响
+            self._remember(key, json.loads(data))
+            try:
+                previous = self._conn.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO results (key, scope, phash, width, height, data, size, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, scope, phash, image.width, image.height, data, len(data), time.time())
+                )
+                self._disk_bytes += len(data) - (previous[0] if previous else 0)
+                self._stats["writes"] += 1
+                if phash is not None and not previous:
+                    self._index_phash(scope, key, phash, image.width, image.height)
+                if self._disk_bytes > self.disk_max_bytes:
+                    self._evict()
+            except sqlite3.Error as e:
+                # 写失败（如数据库被其他worker长时间锁定）不影响识别结果
+                logger.warning(f"⚠️ OCR缓存写入失败: {e}")
+
+    def _find_similar(self, image: Image.Image, scope: str) -> Optional[Dict[str, Any]]:
+        """在同一scope内找感知哈希相近、宽高比一致的图片，把其结果按尺寸比例换算到当前图片"""
+        with self._lock:
+            entry = self._phash_index.get(scope)
+            if not entry:
+                return None
+            keys, hashes, sizes = entry
+            query = np.frombuffer(perceptual_hash(image), dtype=np.uint8)
+            distances = np.unpackbits(hashes ^ query, axis=1).sum(axis=1)
+
+            aspect = image.width / image.height
+            for index in np.argsort(distances):
+                if distances[index] > self.phash_distance:
+                    return None
+                width, height = sizes[index]
+                if abs(width / height - aspect) > aspect * _ASPECT_TOLERANCE:
+                    continue
+                row = self._conn.execute("SELECT data FROM results WHERE key = ?", (keys[index],)).fetchone()
+                if row:
+                    self._touch(keys[index])
+                    return self._rescale(json.loads(row[0]), width, height, image.width, image.height)
+        return None
+
+    @staticmethod
+    def _rescale(value: Dict[str, Any], width: int, height: int,
+                 new_width: int, new_height: int) -> Dict[str, Any]:
+        """
+        把缓存结果从原图尺寸换算到新尺寸：边界框按比例缩放，
+        预处理信息中与原图尺寸相关的字段（原始尺寸、缩放比例、文字高度）改写为相对新图片的值
+        """
+        if (width, height) == (new_width, new_height):
+            return value
+        sx, sy = new_width / width, new_height / height
+        regions = []
+        for region in value.get("regions", []):
+            x1, y1, x2, y2 = region["bbox"]
+            regions.append({**region, "bbox": [int(x1 * sx), int(y1 * sy),
+                                               min(new_width, int(round(x2 * sx))), min(new_height, int(round(y2 * sy)))]})
+        result = {**value, "regions": regions}
+
+        preprocess = value.get("preprocess")
+        if preprocess:
+            # 识别是在缓存图片的working_size上做的，不变；缩放比例相对的原图换成了当前图片
+            preprocess = {**preprocess, "original_size": [new_width, new_height]}
+            if preprocess.get("scale") is not None:
+                preprocess["scale"] = round(preprocess["scale"] / sx, 4)
+            if preprocess.get("text_height_px"):
+                preprocess["text_height_px"] = round(preprocess["text_height_px"] * sy, 1)
+            result["preprocess"] = preprocess
+        return result
+
+    def _index_phash(self, scope: str, key: str, phash: bytes, width: int, height: int):
+        """加入感知哈希索引（调用方持有锁或处于初始化阶段）"""
+        row = np.frombuffer(phash, dtype=np.uint8)[None, :]
+        keys, hashes, sizes = self._phash_index.get(scope, ([], np.empty((0, row.shape[1]), dtype=np.uint8), []))
+        self._phash_index[scope] = (keys + [key], np.vstack([hashes, row]), sizes + [(width, height)])
+
+    def _unindex_phash(self, removed: set):
+        """从感知哈希索引中移除已淘汰的键（调用方持有锁）"""
+        for scope, (keys, hashes, sizes) in list(self._phash_index.items()):
+            keep = [i for i, key in enumerate(keys) if key not in removed]
+            if len(keep) != len(keys):
+                self._phash_index[scope] = ([keys[i] for i in keep], hashes[keep], [sizes[i] for i in keep])
+
+    def _touch(self, key: str):
+        """更新磁盘层访问时间（调用方持有锁）"""
+        try:
+            self._conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        except sqlite3.Error:
+            pass
+
+    def _evict(self):
+        """按最久未访问淘汰，直到磁盘层降到上限的90%（调用方持有锁）"""
+        target = int(self.disk_max_bytes * 0.9)
+        removed = set()
+        rows = self._conn.execute("SELECT key, size FROM results ORDER BY accessed_at").fetchall()
+        for key, size in rows:
+            if self._disk_bytes <= target:
+                break
+            removed.add(key)
+            self._disk_bytes -= size
+        if not removed:
+            return
+        keys = list(removed)
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            self._conn.execute(f"DELETE FROM results WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+        # 其他worker进程也可能写入，淘汰后按实际大小校准
+        self._disk_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        self._stats["evictions"] += len(removed)
+        if self.phash_enabled:
+            self._unindex_phash(removed)
+        logger.info(f"OCR缓存淘汰 {len(removed)} 条，磁盘层当前 {self._disk_bytes} 字节")
+
+    def _remember(self, key: str, value: Dict[str, Any]):
+        """写入LRU（调用方持有锁）"""
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """命中统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            hits = stats["lru_hits"] + stats["disk_hits"] + stats["phash_hits"]
+            lookups = hits + stats["misses"]
+            stats["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+            stats["lru_size"] = len(self._lru)
+            stats["disk_bytes"] = self._disk_bytes
+            stats["disk_max_bytes"] = self.disk_max_bytes
+            stats["phash_enabled"] = self.phash_enabled
+        return stats
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
@@ -4,32 +4,129 @@
 """
 
 import io
+import os
 import base64
 from PIL import Image
 import asyncio
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import logging
 import numpy as np
 
+from ocr_cache import OCRCache, content_hash
+from ocr_tiling import merge_tile_regions, plan_tiles, strip_tags, tag_regions
+from ocr_worker_pool import OCRBusy, OCRWorkerCrashed, OCRWorkerPool, readtext, readtext_batched
+
 logger = logging.getLogger(__name__)
 
+# 估算文字高度时在原图上取样的区域边长和数量
+_SAMPLE_SIDE = 1024
+_SAMPLE_COUNT = 3
+# 长宽比超过该值的图片（长截图、长条扫描件）启用分块时按短边限制尺寸
+_ELONGATED_ASPECT = 2.0
+
+
+def _line_heights(gray: np.ndarray) -> List[int]:
+    """
+    统计一块灰度图中各文字行的高度
+    
+    按行统计竖向笔画边缘的密度，密度高的连续行即一条文字行；
+    文字行之间没有明显空白行（纹理、噪点照片）时返回空列表
+    """
+    edges = np.abs(np.diff(gray, axis=1)) > 40
+    density = edges.mean(axis=1)
+    # 阈值取得很低，让升部/降部（边缘稀疏）也算进文字行
+    rows = density > max(0.005, 0.05 * float(np.percentile(density, 95)))
+    if not 0.05 < rows.mean() < 0.85:
+        return []
+    
+    active = np.concatenate([[False], rows, [False]])
+    changes = np.flatnonzero(active[1:] != active[:-1])
+    # 行内的窄空隙（如降部与主体之间）并入同一行
+    lines: List[List[int]] = []
+    for start, end in zip(changes[::2], changes[1::2]):
+        if lines and start - lines[-1][1] < 0.3 * (lines[-1][1] - lines[-1][0]):
+            lines[-1][1] = end
+        else:
+            lines.append([start, end])
+    # 被取样区域上下边缘截断的行不计入
+    return [int(end - start) for start, end in lines
+            if end - start >= 3 and start > 0 and end < len(rows)]
+
+
+def _estimate_text_height(image: Image.Image) -> Optional[float]:
+    """
+    估算图片中文字行的典型高度（原图像素）
+    
+    沿长边均匀取几块原分辨率区域（不缩小，避免小字被抹掉），取各文字行高度的中位数；
+    找不到足够的文字行（如纯照片）时返回None
+    """
+    width, height = image.size
+    crop_w, crop_h = min(width, _SAMPLE_SIDE), min(height, _SAMPLE_SIDE)
+    heights: List[int] = []
+    for i in range(_SAMPLE_COUNT):
+        position = (i + 0.5) / _SAMPLE_COUNT
+        if height >= width:
+            left, top = (width - crop_w) // 2, int((height - crop_h) * position)
+        else:
+            left, top = int((width - crop_w) * position), (height - crop_h) // 2
+        crop = image.crop((left, top, left + crop_w, top + crop_h)).convert('L')
+        heights.extend(_line_heights(np.asarray(crop, dtype=np.int16)))
+    
+    if len(heights) < 3:
+        return None
+    return float(np.median(heights))
+
+
 class MultiOCREngine:
     """多引擎OCR识别器"""
     
     def __init__(self):
         self.engines = {}
         self.current_engine = None
+        # 批量识别：尺寸相近（按该像素数分桶）的图片补边到同一尺寸后整批送入模型
+        self.batch_bucket_px = int(os.getenv("OCR_BATCH_BUCKET_PX", "128"))
+        # 每批最多图片数；超过后拆成多批，分散到不同工作进程
+        self.batch_max_images = int(os.getenv("OCR_BATCH_MAX_IMAGES", "8"))
+        # 识别模型每次前向处理的文字行数
+        self.recognition_batch_size = int(os.getenv("OCR_RECOGNITION_BATCH_SIZE", "16"))
+        # 自适应缩小：按图片尺寸和估算的文字高度选择识别分辨率，结果坐标再映射回原图
+        self.downscale_enabled = os.getenv("OCR_DOWNSCALE", "true").lower() == "true"
+        self.max_side = int(os.getenv("OCR_MAX_SIDE", "2048"))              # 识别分辨率的最长边
+        self.target_text_px = float(os.getenv("OCR_TARGET_TEXT_PX", "32"))  # 缩小后文字高度的目标值
+        self.min_text_px = float(os.getenv("OCR_MIN_TEXT_PX", "16"))        # 缩小后文字高度不低于该值
+        # 分块识别：识别分辨率的长边超过块边长的1.25倍时切成重叠的块并行识别
+        self.tiling_enabled = os.getenv("OCR_TILING", "true").lower() == "true"
+        self.tile_size = int(os.getenv("OCR_TILE_SIZE", "2048"))
+        self.tile_overlap = int(os.getenv("OCR_TILE_OVERLAP", "160"))  # 至少重叠的像素数，文字较高时按文字高度加大
+        self._tile_slots: Optional[asyncio.Semaphore] = None
+        self._batch_slots: Optional[asyncio.Semaphore] = None
+        self.engine_version = ""
+        self.cache: Optional[OCRCache] = None
+        self.cache_scope = ""
         self._initialize_engines()
+        self._initialize_cache()
     
     def _initialize_engines(self):
         """初始化可用的OCR引擎"""
         
-        # 尝试初始化EasyOCR
+        # 尝试初始化EasyOCR（工作进程池，每个进程一个Reader）
+        cpu_count = os.cpu_count() or 1
+        workers = int(os.getenv("OCR_WORKERS", str(min(4, max(1, cpu_count // 2)))))
+        torch_threads = int(os.getenv("OCR_TORCH_THREADS", str(max(1, cpu_count // max(1, workers)))))
         try:
-            import easyocr
-            self.engines['easyocr'] = easyocr.Reader(['ch_sim', 'en'], gpu=False)
+            import easyocr  # 只检查是否已安装，Reader在工作进程中加载
+            self.engine_version = f"easyocr-{easyocr.__version__}"
+            pool = OCRWorkerPool(
+                workers=workers,
+                languages=['ch_sim', 'en'],
+                gpu=False,
+                torch_threads=torch_threads,
+                max_queue=int(os.getenv("OCR_MAX_QUEUE", "16"))
+            )
+            pool.start()
+            self.engines['easyocr'] = pool
             self.current_engine = 'easyocr'
-            logger.info("✅ EasyOCR 初始化成功")
+            logger.info(f"✅ EasyOCR 初始化成功: {workers} 个工作进程，每进程 {torch_threads} 个torch线程")
         except Exception as e:
             logger.warning(f"⚠️ EasyOCR 初始化失败: {e}")
         
@@ -38,6 +135,34 @@ class MultiOCREngine:
             logger.warning("⚠️ 没有可用的OCR引擎，将使用占位模式")
             self.current_engine = 'placeholder'
     
+    def _initialize_cache(self):
+        """初始化OCR结果缓存（占位模式不缓存）"""
+        if os.getenv("OCR_CACHE_ENABLED", "true").lower() != "true" or self.current_engine == 'placeholder':
+            return
+        
+        # 识别结果取决于引擎版本和预处理参数，都计入scope；OCR_CACHE_VERSION用于手动让旧缓存失效
+        self.cache_scope = "|".join([
+            self.engine_version,
+            f"downscale={self.downscale_enabled}:{self.max_side}:{self.target_text_px}:{self.min_text_px}",
+            f"tiling={self.tiling_enabled}:{self.tile_size}:{self.tile_overlap}",
+            os.getenv("OCR_CACHE_VERSION", "1")
+        ])
+        try:
+            self.cache = OCRCache(
+                db_path=os.getenv("OCR_CACHE_DB", "data/ocr_cache.db"),
+                lru_size=int(os.getenv("OCR_CACHE_LRU_SIZE", "512")),
+                disk_max_bytes=int(float(os.getenv("OCR_CACHE_DISK_MAX_MB", "512")) * 1024 * 1024),
+                phash_enabled=os.getenv("OCR_CACHE_PHASH", "false").lower() == "true",
+                phash_distance=int(os.getenv("OCR_CACHE_PHASH_DISTANCE", "48"))
+            )
+            logger.info(f"✅ OCR缓存初始化成功: {self.cache_scope}")
+        except Exception as e:
+            logger.warning(f"⚠️ OCR缓存初始化失败: {e}")
+    
+    def get_cache_stats(self) -> Optional[Dict[str, Any]]:
+        """获取OCR缓存命中统计"""
+        return self.cache.get_stats() if self.cache else None
+    
     def get_available_engines(self) -> List[str]:
         """获取可用的OCR引擎列表"""
         available = list(self.engines.keys())
@@ -49,6 +174,19 @@ class MultiOCREngine:
         """获取当前使用的OCR引擎"""
         return self.current_engine or 'placeholder'
     
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """获取OCR工作进程池状态"""
+        pool = self.engines.get('easyocr')
+        return pool.get_stats() if pool else None
+    
+    def shutdown(self):
+        """关闭工作进程池和缓存"""
+        pool = self.engines.get('easyocr')
+        if pool:
+            pool.shutdown()
+        if self.cache:
+            self.cache.close()
+    
     def get_default_engine(self) -> str:
         """获取默认OCR引擎"""
         if 'easyocr' in self.engines:
@@ -56,17 +194,88 @@ class MultiOCREngine:
         else:
             return 'placeholder'
     
-    async def detect_text_regions(self, image: Image.Image) -> List[Dict[str, Any]]:
+    def _choose_scale(self, image: Image.Image) -> Dict[str, Any]:
+        """
+        选择识别分辨率
+        
+        文字越大可缩得越多（缩到文字约target_text_px高）；图片超过max_side时也缩小，
+        但不让文字低于min_text_px；估算不出文字高度时只按max_side限制。
+        启用分块识别时，细长图片的max_side限制的是短边（长截图按长边缩小会把文字缩没，超长部分交给分块），
+        普通比例的图片仍按长边限制
+        """
+        width, height = image.size
+        longest = max(width, height)
+        elongated = self.tiling_enabled and longest > min(width, height) * _ELONGATED_ASPECT
+        limited_side = min(width, height) if elongated else longest
+        decision = {'original_size': [width, height], 'scale': 1.0, 'text_height_px': None, 'reason': 'disabled'}
+        if not self.downscale_enabled:
+            return decision
+        if longest <= self.max_side // 2:
+            decision['reason'] = 'small_image'
+            return decision
+        
+        text_height = _estimate_text_height(image)
+        size_scale = min(1.0, self.max_side / limited_side)
+        if text_height:
+            decision['text_height_px'] = round(text_height, 1)
+            text_scale = min(1.0, self.target_text_px / text_height)
+            floor = min(1.0, self.min_text_px / text_height)
+            scale = min(text_scale, max(size_scale, floor))
+            if scale == text_scale:
+                reason = 'text_height'
+            elif scale == size_scale:
+                reason = 'max_side'
+            else:
+                reason = 'min_text_height'
+        else:
+            scale, reason = size_scale, 'max_side'
+        
+        # 缩小不到10%时不值得重采样
+        if scale > 0.9:
+            scale, reason = 1.0, 'no_gain'
+        decision['scale'] = round(scale, 4)
+        decision['reason'] = reason
+        return decision
+    
+    def _prepare(self, image: Image.Image) -> Tuple[Image.Image, Dict[str, Any]]:
+        """按_choose_scale的决定缩小图片，返回 (识别用图片, 决策信息)"""
+        decision = self._choose_scale(image)
+        scale = decision['scale']
+        if scale < 1.0:
+            width, height = image.size
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            image = image.resize(size, Image.BILINEAR, reducing_gap=2.0)
+        decision['working_size'] = list(image.size)
+        return image, decision
+    
+    @staticmethod
+    def _project_back(regions: List[Dict[str, Any]], decision: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """把缩小后图片上的边界框映射回原图坐标"""
+        scale = decision['scale']
+        if scale == 1.0:
+            return regions
+        width, height = decision['original_size']
+        for region in regions:
+            x1, y1, x2, y2 = region['bbox']
+            region['bbox'] = [
+                max(0, int(x1 / scale)), max(0, int(y1 / scale)),
+                min(width, int(round(x2 / scale))), min(height, int(round(y2 / scale)))
+            ]
+        return regions
+    
+    async def detect_text_regions(self, image: Image.Image,
+                                  preprocess_info: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """
         检测图片中的文字区域
         
         Args:
             image: PIL图片对象
+            preprocess_info: 传入字典时填入预处理决策（原始/识别尺寸、缩放比例、估算文字高度、原因）
             
         Returns:
             文字区域列表，每个区域包含：
             - text: 识别的文字
-            - bbox: 边界框 [x1, y1, x2, y2]
+            - bbox: 边界框 [x1, y1, x2, y2]（原图坐标）
             - confidence: 置信度
         """
         
@@ -75,23 +284,242 @@ class MultiOCREngine:
         
         try:
             if self.current_engine == 'easyocr':
-                return await self._easyocr_detect(image)
+                digest, hit = await self._cache_lookup(image)
+                if hit:
+                    regions, decision = hit
+                else:
+                    working, decision = await asyncio.to_thread(self._prepare, image)
+                    if self._needs_tiling(working):
+                        regions = await self._easyocr_detect_tiled(working, decision)
+                    else:
+                        regions = await self._easyocr_detect(working)
+                    regions = self._project_back(regions, decision)
+                    await self._cache_store(image, digest, regions, decision)
+                if preprocess_info is not None:
+                    preprocess_info.update(decision)
+                return regions
+        except (OCRBusy, OCRWorkerCrashed):
+            # 队列已满、工作进程崩溃交给接口返回429/503，不降级
+            raise
         except Exception as e:
             logger.error(f"OCR引擎 {self.current_engine} 失败: {e}")
             # 降级到占位模式
             return await self._placeholder_ocr(image)
     
+    async def detect_text_regions_batch(self, images: List[Image.Image],
+                                        preprocess_info: Optional[List[Dict[str, Any]]] = None
+                                        ) -> List[List[Dict[str, Any]]]:
+        """
+        批量检测多张图片中的文字区域
+        
+        Args:
+            images: PIL图片列表（RGB）
+            preprocess_info: 传入列表时按顺序追加每张图片的预处理决策
+            
+        Returns:
+            与输入顺序一致的文字区域列表，格式同detect_text_regions
+        """
+        if not images:
+            return []
+        
+        if not self.current_engine or self.current_engine == 'placeholder':
+            return [await self._placeholder_ocr(image) for image in images]
+        
+        try:
+            if self.current_engine == 'easyocr':
+                regions: List[Optional[List[Dict[str, Any]]]] = [None] * len(images)
+                decisions: List[Optional[Dict[str, Any]]] = [None] * len(images)
+                digests = []
+                for index, image in enumerate(images):
+                    digest, hit = await self._cache_lookup(image)
+                    digests.append(digest)
+                    if hit:
+                        regions[index], decisions[index] = hit
+                
+                misses = [index for index, result in enumerate(regions) if result is None]
+                if misses:
+                    prepared = await asyncio.to_thread(lambda: [self._prepare(images[i]) for i in misses])
+                    # 超大图片单独分块识别，其余合并成批
+                    tiled = [k for k, (working, _) in enumerate(prepared) if self._needs_tiling(working)]
+                    batched = [k for k in range(len(prepared)) if k not in tiled]
+                    results = await asyncio.gather(
+                        self._easyocr_detect_batch([prepared[k][0] for k in batched]),
+                        *(self._easyocr_detect_tiled(*prepared[k]) for k in tiled)
+                    )
+                    by_position = dict(zip(batched, results[0]))
+                    by_position.update(zip(tiled, results[1:]))
+                    for k, index in enumerate(misses):
+                        decision = prepared[k][1]
+                        regions[index] = self._project_back(by_position[k], decision)
+                        decisions[index] = decision
+                        await self._cache_store(images[index], digests[index], regions[index], decision)
+                
+                if preprocess_info is not None:
+                    preprocess_info.extend(decisions)
+                return regions
+        except (OCRBusy, OCRWorkerCrashed):
+            raise
+        except Exception as e:
+            logger.error(f"OCR引擎 {self.current_engine} 批量识别失败: {e}")
+            return [await self._placeholder_ocr(image) for image in images]
+    
+    async def _cache_lookup(self, image: Image.Image
+                            ) -> Tuple[Optional[str], Optional[Tuple[List[Dict[str, Any]], Dict[str, Any]]]]:
+        """
+        查询结果缓存
+        
+        Returns:
+            (内容哈希, 命中时的 (文字区域, 预处理决策))；未启用缓存时哈希为None
+        """
+        if not self.cache:
+            return None, None
+        
+        def lookup():
+            digest = content_hash(image)
+            return digest, self.cache.get(image, digest, self.cache_scope)
+        
+        try:
+            digest, hit = await asyncio.to_thread(lookup)
+        except Exception as e:
+            logger.warning(f"⚠️ OCR缓存查询失败: {e}")
+            return None, None
+        if not hit:
+            return digest, None
+        value, tier = hit
+        regions = [dict(region) for region in value['regions']]
+        return digest, (regions, {**value['preprocess'], 'cache': tier})
+    
+    async def _cache_store(self, image: Image.Image, digest: Optional[str],
+                           regions: List[Dict[str, Any]], decision: Dict[str, Any]):
+        """写入结果缓存"""
+        if not self.cache or digest is None:
+            return
+        try:
+            await asyncio.to_thread(
+                self.cache.put, image, digest, self.cache_scope, {'regions': regions, 'preprocess': decision}
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ OCR缓存写入失败: {e}")
+    
+    def _group_by_size(self, images: List[Image.Image]) -> List[List[int]]:
+        """按尺寸分组：宽高落在同一分桶内的图片为一组，每组不超过batch_max_images张"""
+        buckets: Dict[Tuple[int, int], List[int]] = {}
+        for index, image in enumerate(images):
+            width, height = image.size
+            key = (-(-width // self.batch_bucket_px), -(-height // self.batch_bucket_px))
+            buckets.setdefault(key, []).append(index)
+        
+        groups = []
+        size = max(1, self.batch_max_images)
+        for indices in buckets.values():
+            groups.extend(indices[i:i + size] for i in range(0, len(indices), size))
+        return groups
+    
+    @staticmethod
+    def _pad_to(image: Image.Image, width: int, height: int) -> np.ndarray:
+        """右侧和下方补边到指定尺寸（原有坐标不变），补边颜色取图片边缘的平均色"""
+        array = np.array(image)
+        if array.shape[1] == width and array.shape[0] == height:
+            return array
+        border = np.concatenate([array[0], array[-1], array[:, 0], array[:, -1]])
+        canvas = np.empty((height, width, array.shape[2]), dtype=array.dtype)
+        canvas[:] = border.mean(axis=0).astype(array.dtype)
+        canvas[:array.shape[0], :array.shape[1]] = array
+        return canvas
+    
+    def _needs_tiling(self, image: Image.Image) -> bool:
+        return self.tiling_enabled and max(image.size) > self.tile_size * 1.25
+    
+    async def _easyocr_detect_tiled(self, image: Image.Image, decision: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        分块识别：切成相互重叠的块，各块并行提交到进程池，再合并接缝处的结果
+        
+        同时在识别的块数不超过工作进程数（所有请求共用），块在拿到名额后才裁剪，内存占用有上限
+        """
+        pool: OCRWorkerPool = self.engines['easyocr']
+        if self._tile_slots is None:
+            self._tile_slots = asyncio.Semaphore(max(1, pool.workers))
+        
+        width, height = image.size
+        # 重叠至少为两倍文字高度，保证每行文字都能在某一块中完整出现
+        text_height = (decision.get('text_height_px') or 0) * decision['scale']
+        overlap = max(self.tile_overlap, int(text_height * 2))
+        tiles = plan_tiles(width, height, self.tile_size, overlap)
+        decision['tiles'] = len(tiles)
+        
+        async def run_tile(index: int, box: Tuple[int, int, int, int]) -> List[Dict[str, Any]]:
+            async with self._tile_slots:
+                tile = np.array(image.crop(box))
+                results = await pool.run(readtext, tile)
+            regions = self._to_regions(results, (box[2] - box[0], box[3] - box[1]))
+            return tag_regions(regions, index, box, width, height)
+        
+        tasks = [asyncio.ensure_future(run_tile(index, box)) for index, box in enumerate(tiles)]
+        try:
+            tile_regions = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        
+        regions = [region for regions in tile_regions for region in regions]
+        merged = merge_tile_regions(regions)
+        logger.info(f"分块OCR: {width}x{height} 切为 {len(tiles)} 块，合并后 {len(merged)} 个文字块（合并前 {len(regions)}）")
+        return strip_tags(merged)
+    
+    async def _easyocr_detect_batch(self, images: List[Image.Image]) -> List[List[Dict[str, Any]]]:
+        """
+        EasyOCR批量识别：同组图片补边到同一尺寸后调用readtext_batched，各组并行提交到进程池
+        
+        同时提交的组数不超过工作进程数（所有请求共用），尺寸各异的大批量请求不会占满进程池队列而被自己拒绝；
+        组在拿到名额后才补边，内存占用有上限
+        """
+        if not images:
+            return []
+        pool: OCRWorkerPool = self.engines['easyocr']
+        if self._batch_slots is None:
+            self._batch_slots = asyncio.Semaphore(max(1, pool.workers))
+        groups = self._group_by_size(images)
+        params = {'batch_size': self.recognition_batch_size}
+        
+        async def run_group(indices: List[int]) -> List[List[tuple]]:
+            async with self._batch_slots:
+                width = max(images[i].size[0] for i in indices)
+                height = max(images[i].size[1] for i in indices)
+                arrays = [self._pad_to(images[i], width, height) for i in indices]
+                return await pool.run(readtext_batched, arrays, params)
+        
+        tasks = [asyncio.ensure_future(run_group(indices)) for indices in groups]
+        try:
+            group_results = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        
+        logger.info(f"批量OCR: {len(images)} 张图片分为 {len(groups)} 组")
+        
+        regions: List[Optional[List[Dict[str, Any]]]] = [None] * len(images)
+        for indices, results in zip(groups, group_results):
+            for index, image_results in zip(indices, results):
+                regions[index] = self._to_regions(image_results, images[index].size)
+        return regions
+    
     async def _easyocr_detect(self, image: Image.Image) -> List[Dict[str, Any]]:
         """EasyOCR识别"""
-        reader = self.engines['easyocr']
+        pool: OCRWorkerPool = self.engines['easyocr']
         
         # 转换为numpy数组
         img_array = np.array(image)
         
-        # 在线程池中运行OCR（因为EasyOCR是同步的）
-        loop = asyncio.get_event_loop()
-        results = await loop.run_in_executor(None, reader.readtext, img_array)
-        
+        # 在工作进程中运行OCR（EasyOCR是同步且CPU密集的）
+        results = await pool.run(readtext, img_array)
+        return self._to_regions(results, image.size)
+    
+    @staticmethod
+    def _to_regions(results: List[tuple], size: Tuple[int, int]) -> List[Dict[str, Any]]:
+        """EasyOCR结果转为文字区域，边界框裁剪到图片范围内（批量识别时去掉补边部分）"""
+        width, height = size
         regions = []
         for result in results:
             points = result[0]  # 四个角点
@@ -102,8 +530,10 @@ class MultiOCREngine:
                 # 计算边界框
                 x_coords = [p[0] for p in points]
                 y_coords = [p[1] for p in points]
-                x1, y1 = int(min(x_coords)), int(min(y_coords))
-                x2, y2 = int(max(x_coords)), int(max(y_coords))
+                x1, y1 = max(0, int(min(x_coords))), max(0, int(min(y_coords)))
+                x2, y2 = min(width, int(max(x_coords))), min(height, int(max(y_coords)))
+                if x2 <= x1 or y2 <= y1:
+                    continue
                 
                 regions.append({
                     'text': text.strip(),
@@ -0,0 +1,158 @@
+"""
+分块识别
+超大图片（长截图、高分辨率扫描件）切成相互重叠的小块分别识别，再把各块结果合并：
+接缝处被重复识别的文字去重，被接缝截断的文字行拼接
+"""
+
+import math
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Tuple
+
+# 距块内侧边缘（非图片边缘）不超过该像素数的文字框视为被接缝截断
+_EDGE_MARGIN = 3
+
+
+def _starts(length: int, tile: int, overlap: int) -> List[int]:
+    """一个方向上各块的起点：块数取保证相邻块重叠不少于overlap的最小值，间距均匀"""
+    if length <= tile:
+        return [0]
+    count = math.ceil((length - overlap) / (tile - overlap))
+    step = (length - tile) / (count - 1)
+    return [round(i * step) for i in range(count)]
+
+
+def plan_tiles(width: int, height: int, tile: int, overlap: int) -> List[Tuple[int, int, int, int]]:
+    """
+    规划分块
+
+    Args:
+        width, height: 图片尺寸
+        tile: 块边长
+        overlap: 相邻块最少重叠的像素数（应大于最高文字行的高度）
+
+    Returns:
+        按行优先排列的块 (x1, y1, x2, y2)
+    """
+    overlap = min(overlap, tile // 2)
+    return [
+        (x, y, min(width, x + tile), min(height, y + tile))
+        for y in _starts(height, tile, overlap)
+        for x in _starts(width, tile, overlap)
+    ]
+
+
+def tag_regions(regions: List[Dict[str, Any]], tile_index: int, box: Tuple[int, int, int, int],
+                width: int, height: int) -> List[Dict[str, Any]]:
+    """把块内识别结果平移到整图坐标，并标记所属块和是否被接缝截断（调用方合并后用strip_tags去掉标记）"""
+    x1, y1, x2, y2 = box
+    for region in regions:
+        bx1, by1, bx2, by2 = region['bbox']
+        region['bbox'] = [bx1 + x1, by1 + y1, bx2 + x1, by2 + y1]
+        region['_tiles'] = {tile_index}
+        region['_clipped'] = (
+            (x1 > 0 and bx1 <= _EDGE_MARGIN) or (y1 > 0 and by1 <= _EDGE_MARGIN)
+            or (x2 < width and bx2 >= x2 - x1 - _EDGE_MARGIN)
+            or (y2 < height and by2 >= y2 - y1 - _EDGE_MARGIN)
+        )
+    return regions
+
+
+def strip_tags(regions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    for region in regions:
+        region.pop('_tiles', None)
+        region.pop('_clipped', None)
+    return regions
+
+
+def _area(bbox: List[int]) -> int:
+    return max(0, bbox[2] - bbox[0]) * max(0, bbox[3] - bbox[1])
+
+
+def _intersection(a: List[int], b: List[int]) -> int:
+    return _area([max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3])])
+
+
+def _better(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+    """同一文字的两次识别取更完整的一个：未被截断优先，其次面积大，再次置信度高"""
+    key_a = (not a['_clipped'], _area(a['bbox']), a['confidence'])
+    key_b = (not b['_clipped'], _area(b['bbox']), b['confidence'])
+    return a if key_a >= key_b else b
+
+
+def _join_text(left: str, right: str) -> str:
+    """拼接被纵向接缝截断的一行：去掉两段在重叠区重复识别的部分"""
+    for size in range(min(len(left), len(right)), 0, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return f"{left} {right}"
+
+
+def _join(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+    """合并同一行中被截断的左右两段"""
+    left, right = (a, b) if a['bbox'][0] <= b['bbox'][0] else (b, a)
+    return {
+        **left,
+        'text': _join_text(left['text'], right['text']),
+        'bbox': [min(a['bbox'][0], b['bbox'][0]), min(a['bbox'][1], b['bbox'][1]),
+                 max(a['bbox'][2], b['bbox'][2]), max(a['bbox'][3], b['bbox'][3])],
+        'confidence': min(a['confidence'], b['confidence']),
+        '_tiles': a['_tiles'] | b['_tiles'],
+        '_clipped': a['_clipped'] and b['_clipped']
+    }
+
+
+def _resolve(a: Dict[str, Any], b: Dict[str, Any], overlap: int):
+    """
+    判断来自不同块、位置重叠的两个文字框的关系
+
+    Returns:
+        合并后的文字框；两者无关时返回None
+    """
+    box_a, box_b = a['bbox'], b['bbox']
+    smaller = min(_area(box_a), _area(box_b))
+    if not smaller:
+        return None
+    iou = overlap / (_area(box_a) + _area(box_b) - overlap)
+    containment = overlap / smaller
+    similarity = SequenceMatcher(None, a['text'], b['text']).ratio()
+
+    # 重复识别：基本重合，或一个包含另一个且文字相近/被包含的一方是截断的残片
+    if iou >= 0.5 or (containment >= 0.8 and (similarity >= 0.5 or a['_clipped'] or b['_clipped'])):
+        return _better(a, b)
+
+    # 同一行被纵向接缝截成左右两段：纵向基本对齐，且至少一段被截断
+    height_overlap = min(box_a[3], box_b[3]) - max(box_a[1], box_b[1])
+    shorter = min(box_a[3] - box_a[1], box_b[3] - box_b[1])
+    if shorter > 0 and height_overlap / shorter >= 0.6 and (a['_clipped'] or b['_clipped']):
+        return _join(a, b)
+    return None
+
+
+def merge_tile_regions(regions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    合并各块的识别结果（需先经tag_regions处理）
+
+    只比较来自不同块且相互重叠的文字框；按纵坐标扫描，每个框只与纵向范围重叠的框比较
+    """
+    regions = sorted(regions, key=lambda region: (region['bbox'][1], region['bbox'][0]))
+    removed = set()
+    for i in range(len(regions)):
+        if i in removed:
+            continue
+        current = regions[i]
+        for j in range(i + 1, len(regions)):
+            other = regions[j]
+            if other['bbox'][1] >= current['bbox'][3]:
+                break
+            if j in removed or current['_tiles'] & other['_tiles']:
+                continue
+            overlap = _intersection(current['bbox'], other['bbox'])
+            if overlap <= 0:
+                continue
+            merged = _resolve(current, other, overlap)
+            if merged is not None:
+                current = merged
+                removed.add(j)
+        regions[i] = current
+    merged = [region for index, region in enumerate(regions) if index not in removed]
+    return sorted(merged, key=lambda region: (region['bbox'][1], region['bbox'][0]))
@@ -0,0 +1,203 @@
+"""
+OCR工作进程池
+每个工作进程加载自己的EasyOCR Reader，并固定torch线程数，避免多个识别任务争抢GIL和计算线程；
+提交的任务数（执行中+排队）有上限，超出时立即拒绝；工作进程意外退出时重建进程池
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 工作进程内的Reader（每个进程一个）
+_reader = None
+
+
+class OCRBusy(Exception):
+    """任务队列已满"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("OCR job queue is full")
+        self.retry_after = retry_after
+
+
+class OCRWorkerCrashed(Exception):
+    """工作进程意外退出（如内存不足被系统杀掉），进程池已重建，本次任务失败"""
+
+    def __init__(self):
+        super().__init__("OCR worker process died unexpectedly")
+
+
+def _init_worker(languages: List[str], gpu: bool, torch_threads: int):
+    """工作进程初始化：先固定线程数再导入torch/EasyOCR，然后加载Reader"""
+    global _reader
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[name] = str(torch_threads)
+
+    import torch
+    torch.set_num_threads(torch_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # 进程内已经执行过并行计算时不能再设置（单进程模式下可能出现）
+        pass
+
+    import easyocr
+    _reader = easyocr.Reader(languages, gpu=gpu)
+
+
+def _worker_info() -> int:
+    """预热用：确认Reader已加载，返回进程号"""
+    time.sleep(0.5)  # 让预热任务分散到不同的工作进程
+    return os.getpid()
+
+
+def _serialize(results) -> List[tuple]:
+    """EasyOCR结果转为可序列化的基本类型"""
+    return [
+        ([[float(x), float(y)] for x, y in points], text, float(confidence))
+        for points, text, confidence in results
+    ]
+
+
+def readtext(image: np.ndarray, params: Optional[Dict[str, Any]] = None) -> List[tuple]:
+    """在工作进程中识别一张图片，返回 [(四个角点, 文字, 置信度)]"""
+    return _serialize(_reader.readtext(image, **(params or {})))
+
+
+def readtext_batched(images: List[np.ndarray], params: Optional[Dict[str, Any]] = None) -> List[List[tuple]]:
+    """在工作进程中批量识别多张同尺寸图片（检测模型一次前向处理整批），按顺序返回每张的结果"""
+    return [_serialize(results) for results in _reader.readtext_batched(images, **(params or {}))]
+
+
+class OCRWorkerPool:
+    """EasyOCR进程池"""
+
+    def __init__(self, workers: int, languages: List[str], gpu: bool = False,
+                 torch_threads: int = 1, max_queue: int = 16):
+        """
+        Args:
+            workers: 工作进程数；0为单进程模式（在本进程加载Reader，用单个线程执行）
+            languages: EasyOCR语言列表
+            gpu: 是否使用GPU
+            torch_threads: 每个工作进程的torch计算线程数
+            max_queue: 执行中之外最多排队的任务数
+        """
+        self.workers = workers
+        self.torch_threads = torch_threads
+        self.capacity = max(1, workers) + max_queue
+        self._initargs = (languages, gpu, torch_threads)
+        self._pending = 0
+        # _pending在任务真正结束时由执行器线程回调递减
+        self._lock = threading.Lock()
+        self._stats = {"completed": 0, "failed": 0, "rejected": 0, "restarts": 0, "total_ms": 0.0}
+        self._pids: List[int] = []
+
+        if workers > 0:
+            self._executor: Executor = self._new_executor()
+        else:
+            _init_worker(languages, gpu, torch_threads)
+            self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # spawn：torch在fork出的子进程中可能死锁
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=self._initargs
+        )
+
+    def start(self):
+        """启动全部工作进程并加载Reader（阻塞直到完成）"""
+        if not self.workers:
+            return
+        futures = [self._executor.submit(_worker_info) for _ in range(self.workers)]
+        self._pids = sorted({future.result() for future in futures})
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """
+        在工作进程中执行fn(*args)
+
+        调用方取消时，尚未开始执行的任务会从队列中撤销；已在执行的任务继续占用名额直到结束
+
+        Raises:
+            OCRBusy: 执行中和排队的任务已达上限
+            OCRWorkerCrashed: 工作进程意外退出
+        """
+        with self._lock:
+            if self._pending >= self.capacity:
+                self._stats["rejected"] += 1
+                raise OCRBusy(self._retry_after())
+            self._pending += 1
+
+        executor = self._executor
+        start = time.perf_counter()
+        try:
+            future: Future = executor.submit(fn, *args)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        try:
+            result = await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            self._stats["failed"] += 1
+            self._restart(executor)
+            raise OCRWorkerCrashed()
+        except Exception:
+            self._stats["failed"] += 1
+            raise
+        self._stats["completed"] += 1
+        self._stats["total_ms"] += (time.perf_counter() - start) * 1000
+        return result
+
+    def _release(self, future: Optional[Future]):
+        with self._lock:
+            self._pending -= 1
+
+    def _restart(self, broken: Executor):
+        """重建已损坏的进程池（同一个进程池上失败的多个任务只重建一次）"""
+        with self._lock:
+            if self._executor is not broken:
+                return
+            self._executor = self._new_executor()
+            self._pids = []
+            self._stats["restarts"] += 1
+        logger.error("⛔ OCR工作进程意外退出，已重建进程池")
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _retry_after(self) -> int:
+        """按平均耗时估算队列排空所需秒数"""
+        if not self._stats["completed"]:
+            return 1
+        avg_seconds = self._stats["total_ms"] / self._stats["completed"] / 1000
+        return max(1, int(avg_seconds * self._pending / max(1, self.workers) + 0.5))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """进程池状态"""
+        completed = self._stats["completed"]
+        return {
+            "workers": self.workers,
+            "pids": self._pids,
+            "torch_threads": self.torch_threads,
+            "pending": self._pending,
+            "capacity": self.capacity,
+            "completed": completed,
+            "failed": self._stats["failed"],
+            "rejected": self._stats["rejected"],
+            "restarts": self._stats["restarts"],
+            "avg_ms": round(self._stats["total_ms"] / completed, 1) if completed else 0.0
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,14 +1,16 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, Header, HTTPException, Request
 from fastapi.responses import JSONResponse
 from PIL import Image
 import io
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
 import os
 
 # 导入OCR引擎
 from ocr_engine import MultiOCREngine
+from ocr_worker_pool import OCRBusy, OCRWorkerCrashed
+from deadline import ClientDisconnected, DeadlineExceeded, parse_deadline, run_until_disconnect
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -23,6 +25,12 @@ app = FastAPI(
 # 初始化OCR引擎
 ocr_engine = MultiOCREngine()
 
+# 请求未携带 X-Deadline-Ms 时的默认处理时限（秒），0为不限
+default_deadline = float(os.getenv("REQUEST_DEADLINE_SECONDS", "0"))
+
+# 单次批量识别最多接收的图片数
+batch_max_files = int(os.getenv("OCR_BATCH_MAX_FILES", "64"))
+
 class OCRBlock(BaseModel):
     """OCR识别的文字块"""
     text: str           # 识别的文字
@@ -34,6 +42,33 @@ class OCRResult(BaseModel):
     blocks: List[OCRBlock]
     engine: str         # 使用的OCR引擎
     processing_time_ms: int
+    preprocess: Optional[Dict[str, Any]] = None  # 预处理决策（缩放比例、识别尺寸、估算文字高度等）
+
+class OCRBatchItem(BaseModel):
+    """批量识别中单张图片的结果"""
+    index: int                      # 在请求中的序号
+    filename: Optional[str] = None
+    blocks: List[OCRBlock] = []
+    error: Optional[str] = None     # 图片无法解析时的错误信息
+    preprocess: Optional[Dict[str, Any]] = None
+
+class OCRBatchResult(BaseModel):
+    """批量OCR识别结果"""
+    results: List[OCRBatchItem]     # 与上传顺序一致
+    engine: str
+    processing_time_ms: int
+    images_per_second: float
+
+def _to_blocks(regions: List[Dict[str, Any]]) -> List[OCRBlock]:
+    """引擎输出的文字区域转换为标准格式"""
+    return [
+        OCRBlock(
+            text=region.get('text', ''),
+            bbox=region.get('bbox', [0, 0, 0, 0]),
+            conf=region.get('confidence', 0.0)
+        )
+        for region in regions
+    ]
 
 @app.get("/health")
 async def health():
@@ -44,19 +79,24 @@ async def health():
         "service": "ocr",
         "version": "1.0.0",
         "available_engines": available_engines,
-        "default_engine": ocr_engine.get_default_engine()
+        "default_engine": ocr_engine.get_default_engine(),
+        "worker_pool": ocr_engine.get_pool_stats(),
+        "cache": ocr_engine.get_cache_stats()
     }
 
 @app.post("/ocr", response_model=OCRResult)
-async def ocr_recognize(file: UploadFile = File(...)):
+async def ocr_recognize(http_request: Request, file: UploadFile = File(...),
+                        x_deadline_ms: Optional[str] = Header(None)):
     """
     OCR文字识别
     
     输入：图片文件
     输出：识别的文字块列表，包含文字、位置、置信度
+    超过 X-Deadline-Ms 截止时间返回504，客户端断开时放弃识别，任务队列已满时返回429
     """
     import time
     start_time = time.time()
+    deadline = parse_deadline(x_deadline_ms, default_deadline)
     
     try:
         # 读取图片
@@ -69,44 +109,128 @@ async def ocr_recognize(file: UploadFile = File(...)):
         
         logger.info(f"开始OCR识别，图片大小: {image.size}")
         
-        # 调用OCR引擎识别
-        detected_regions = ocr_engine.detect_text_regions(image)
+        # 调用OCR引擎识别（截止时间到达或客户端断开时取消）
+        preprocess = {}
+        detected_regions = await run_until_disconnect(
+            http_request, ocr_engine.detect_text_regions(image, preprocess), deadline
+        )
         
         # 转换为标准格式
-        blocks = []
-        for region in detected_regions:
-            block = OCRBlock(
-                text=region.get('text', ''),
-                bbox=region.get('bbox', [0, 0, 0, 0]),
-                conf=region.get('confidence', 0.0)
-            )
-            blocks.append(block)
+        blocks = _to_blocks(detected_regions)
         
         processing_time = int((time.time() - start_time) * 1000)
         
         result = OCRResult(
             blocks=blocks,
             engine=ocr_engine.get_current_engine(),
-            processing_time_ms=processing_time
+            processing_time_ms=processing_time,
+            preprocess=preprocess or None
         )
         
         logger.info(f"OCR识别完成，检测到 {len(blocks)} 个文字块，耗时: {processing_time}ms")
         
         return result
         
+    except OCRBusy as e:
+        logger.warning("⚠️ OCR任务队列已满，拒绝请求")
+        raise HTTPException(429, "OCR queue is full", headers={"Retry-After": str(e.retry_after)})
+    except OCRWorkerCrashed:
+        logger.error("⛔ OCR工作进程崩溃，请求失败")
+        raise HTTPException(503, "OCR worker crashed", headers={"Retry-After": "5"})
+    except DeadlineExceeded:
+        logger.warning("⚠️ OCR请求超过截止时间，已取消")
+        raise HTTPException(504, "Deadline exceeded")
+    except ClientDisconnected:
+        logger.info("客户端已断开，已取消OCR识别")
+        raise HTTPException(499, "Client disconnected")
     except Exception as e:
         logger.error(f"OCR识别错误: {e}")
         raise HTTPException(500, f"OCR recognition error: {e}")
 
+@app.post("/ocr/batch", response_model=OCRBatchResult)
+async def ocr_recognize_batch(http_request: Request, files: List[UploadFile] = File(...),
+                              x_deadline_ms: Optional[str] = Header(None)):
+    """
+    批量OCR文字识别
+    
+    输入：多张图片文件（字段名均为files）
+    输出：按上传顺序排列的每张图片的识别结果；无法解析的图片单独返回error，不影响其他图片
+    尺寸相近的图片合并为一批送入模型，比逐张调用 /ocr 吞吐更高
+    """
+    import time
+    start_time = time.time()
+    deadline = parse_deadline(x_deadline_ms, default_deadline)
+    
+    if len(files) > batch_max_files:
+        raise HTTPException(413, f"Too many images: {len(files)} > {batch_max_files}")
+    
+    items = [OCRBatchItem(index=i, filename=file.filename) for i, file in enumerate(files)]
+    images = []
+    image_indices = []
+    for item, file in zip(items, files):
+        try:
+            image = Image.open(io.BytesIO(await file.read()))
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            images.append(image)
+            image_indices.append(item.index)
+        except Exception as e:
+            item.error = f"Invalid image: {e}"
+    
+    logger.info(f"开始批量OCR识别，共 {len(files)} 张图片，有效 {len(images)} 张")
+    
+    preprocess = []
+    try:
+        detected = await run_until_disconnect(
+            http_request, ocr_engine.detect_text_regions_batch(images, preprocess), deadline
+        )
+    except OCRBusy as e:
+        logger.warning("⚠️ OCR任务队列已满，拒绝批量请求")
+        raise HTTPException(429, "OCR queue is full", headers={"Retry-After": str(e.retry_after)})
+    except OCRWorkerCrashed:
+        logger.error("⛔ OCR工作进程崩溃，批量请求失败")
+        raise HTTPException(503, "OCR worker crashed", headers={"Retry-After": "5"})
+    except DeadlineExceeded:
+        logger.warning("⚠️ 批量OCR请求超过截止时间，已取消")
+        raise HTTPException(504, "Deadline exceeded")
+    except ClientDisconnected:
+        logger.info("客户端已断开，已取消批量OCR识别")
+        raise HTTPException(499, "Client disconnected")
+    except Exception as e:
+        logger.error(f"批量OCR识别错误: {e}")
+        raise HTTPException(500, f"OCR recognition error: {e}")
+    
+    for position, (index, regions) in enumerate(zip(image_indices, detected)):
+        items[index].blocks = _to_blocks(regions)
+        if position < len(preprocess):
+            items[index].preprocess = preprocess[position]
+    
+    elapsed = time.time() - start_time
+    processing_time = int(elapsed * 1000)
+    logger.info(f"批量OCR识别完成，{len(images)} 张图片，耗时: {processing_time}ms")
+    
+    return OCRBatchResult(
+        results=items,
+        engine=ocr_engine.get_current_engine(),
+        processing_time_ms=processing_time,
+        images_per_second=round(len(images) / elapsed, 2) if elapsed > 0 else 0.0
+    )
+
 @app.get("/engines")
 async def list_engines():
     """列出可用的OCR引擎"""
     return {
         "available": ocr_engine.get_available_engines(),
         "current": ocr_engine.get_current_engine(),
-        "default": ocr_engine.get_default_engine()
+        "default": ocr_engine.get_default_engine(),
+        "worker_pool": ocr_engine.get_pool_stats()
     }
 
+@app.on_event("shutdown")
+async def shutdown():
+    """关闭OCR工作进程"""
+    ocr_engine.shutdown()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=7010)
\ No newline at end of file
@@ -0,0 +1,47 @@
+"""批量识别：尺寸各异的大批量请求不应超出进程池队列而被拒绝"""
+
+import asyncio
+
+import pytest
+from PIL import Image
+
+import ocr_worker_pool
+from ocr_engine import MultiOCREngine
+from ocr_worker_pool import OCRWorkerPool
+
+
+class FakeReader:
+    """每张图片返回一个覆盖左上角的文字框，文字为图片宽度"""
+
+    def readtext_batched(self, images, **params):
+        return [[([[0, 0], [10, 0], [10, 10], [0, 10]], str(image.shape[1]), 0.9)] for image in images]
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    monkeypatch.setenv("OCR_CACHE_ENABLED", "false")
+    monkeypatch.setattr(ocr_worker_pool, "_init_worker", lambda *args: None)
+    monkeypatch.setattr(ocr_worker_pool, "_reader", FakeReader())
+    engine = MultiOCREngine()
+    # 单进程模式（线程执行），容量 = 1 + max_queue
+    pool = OCRWorkerPool(workers=0, languages=["en"], max_queue=2)
+    engine.engines['easyocr'] = pool
+    engine.current_engine = 'easyocr'
+    yield engine
+    pool.shutdown()
+
+
+def test_batch_larger_than_pool_capacity(engine):
+    pool = engine.engines['easyocr']
+    # 宽高组合各落在不同分桶，每张图片自成一组（尺寸都不到需要分块的程度）
+    step = engine.batch_bucket_px
+    images = [Image.new('RGB', (100 + (i % 6) * step, 80 + (i // 6) * step), 'white') for i in range(30)]
+    assert len(images) > pool.capacity
+
+    regions = asyncio.run(engine.detect_text_regions_batch(images))
+
+    assert [r[0]['text'] for r in regions] == [str(image.width) for image in images]
+    stats = pool.get_stats()
+    assert stats["rejected"] == 0
+    assert stats["completed"] == 30
+    assert stats["pending"] == 0
@@ -0,0 +1,87 @@
+"""分块识别：分块规划与接缝处结果合并"""
+
+from ocr_tiling import merge_tile_regions, plan_tiles, strip_tags, tag_regions
+
+# 两块上下排列：块0 y∈[0,1000)，块1 y∈[800,1800)，重叠200像素
+STACKED = [(0, 0, 1000, 1000), (0, 800, 1000, 1800)]
+# 两块左右排列：块0 x∈[0,1000)，块1 x∈[800,1800)
+SIDE_BY_SIDE = [(0, 0, 1000, 1000), (800, 0, 1800, 1000)]
+
+
+def region(text, bbox, confidence=0.9):
+    return {'text': text, 'bbox': list(bbox), 'confidence': confidence}
+
+
+def tile_local(box, text, bbox, confidence=0.9):
+    """整图坐标的文字框换算到块内坐标"""
+    x1, y1 = box[0], box[1]
+    return region(text, (bbox[0] - x1, bbox[1] - y1, bbox[2] - x1, bbox[3] - y1), confidence)
+
+
+def merge(tiles, detections, width, height):
+    """detections: 每块识别到的 [(文字, 整图坐标框)]"""
+    regions = []
+    for index, (box, found) in enumerate(zip(tiles, detections)):
+        local = [tile_local(box, text, bbox) for text, bbox in found]
+        regions.extend(tag_regions(local, index, box, width, height))
+    return strip_tags(merge_tile_regions(regions))
+
+
+def test_plan_tiles_covers_image_with_overlap():
+    tiles = plan_tiles(3000, 20000, tile=2048, overlap=160)
+    assert tiles[0][:2] == (0, 0)
+    assert max(t[2] for t in tiles) == 3000
+    assert max(t[3] for t in tiles) == 20000
+    rows = sorted({(t[1], t[3]) for t in tiles})
+    for (_, bottom), (top, _) in zip(rows, rows[1:]):
+        assert bottom - top >= 160
+
+
+def test_plan_tiles_small_image_is_single_tile():
+    assert plan_tiles(800, 600, tile=2048, overlap=160) == [(0, 0, 800, 600)]
+
+
+def test_word_in_overlap_is_deduplicated():
+    word = ("Settings", (100, 850, 260, 880))
+    merged = merge(STACKED, [[word], [word]], 1000, 1800)
+    assert merged == [region("Settings", word[1])]
+
+
+def test_distinct_adjacent_words_in_overlap_are_kept():
+    hello = ("Hello", (100, 850, 200, 880))
+    world = ("World", (210, 850, 310, 880))
+    merged = merge(STACKED, [[hello, world], [hello, world]], 1000, 1800)
+    assert [r['text'] for r in merged] == ["Hello", "World"]
+    assert [r['bbox'] for r in merged] == [list(hello[1]), list(world[1])]
+
+
+def test_stacked_lines_in_overlap_are_kept():
+    first = ("First line", (100, 820, 300, 850))
+    second = ("Second line", (100, 856, 300, 886))
+    merged = merge(STACKED, [[first, second], [first, second]], 1000, 1800)
+    assert [r['text'] for r in merged] == ["First line", "Second line"]
+
+
+def test_clipped_fragment_replaced_by_complete_detection():
+    # 块0在右边缘截断了这一行，块1完整识别到
+    fragment = ("Open sett", (900, 100, 1000, 130))
+    complete = ("Open settings", (900, 100, 1060, 130))
+    merged = merge(SIDE_BY_SIDE, [[fragment], [complete]], 1800, 1000)
+    assert merged == [region("Open settings", complete[1])]
+
+
+def test_line_cut_by_vertical_seam_is_joined():
+    # 一行比重叠区宽，两块各只看到一段，且都被截断
+    left = ("The quick brown fo", (600, 100, 1000, 130))
+    right = ("brown fox jumps", (800, 100, 1200, 130))
+    tiles = [(0, 0, 1000, 1000), (800, 0, 1800, 1000)]
+    left_local = tile_local(tiles[0], *left)
+    right_local = tile_local(tiles[1], *right)
+    # 右段从块1左边缘开始
+    right_local['bbox'][0] = 0
+    regions = tag_regions([left_local], 0, tiles[0], 1800, 1000) + tag_regions([right_local], 1, tiles[1], 1800, 1000)
+    merged = strip_tags(merge_tile_regions(regions))
+    assert len(merged) == 1
+    assert merged[0]['bbox'] == [600, 100, 1200, 130]
+    # 两段在重叠区重复识别的 "brown fo" 只保留一次
+    assert merged[0]['text'] == "The quick brown fox jumps"
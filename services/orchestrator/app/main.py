@@ -1,7 +1,9 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Query
+from fastapi import FastAPI, UploadFile, File, Header, HTTPException, Query, Request
 from fastapi.responses import JSONResponse
+import asyncio
 import httpx
 import os
+import time
 import uuid
 import json
 from typing import List, Dict, Any, Optional
@@ -17,6 +19,12 @@ logger = logging.getLogger(__name__)
 OCR_URL = os.getenv("OCR_URL", "http://ocr:7010/ocr")
 TRANSLATE_URL = os.getenv("TRANSLATE_URL", "http://nmt:7020/translate")
 DEBUG = os.getenv("DEBUG", "false").lower() == "true"
+OCR_TIMEOUT = float(os.getenv("OCR_TIMEOUT", "60"))
+TRANSLATE_TIMEOUT = float(os.getenv("TRANSLATE_TIMEOUT", "120"))
+# 整个请求的处理时限（秒），客户端可用 X-Deadline-Ms 请求头指定更短的时限
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "180"))
+# 向下游转发剩余时间（毫秒）的请求头
+DEADLINE_HEADER = "X-Deadline-Ms"
 
 app = FastAPI(
     title="Document Translation Orchestrator", 
@@ -62,10 +70,44 @@ async def root():
         }
     }
 
+def _call_budget(deadline: float, cap: float) -> float:
+    """下游调用可用的时间（秒）：不超过该调用自身的超时，也不超过剩余时间"""
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise HTTPException(504, "Deadline exceeded")
+    return min(cap, remaining)
+
+def _downstream_error(name: str, resp: httpx.Response) -> HTTPException:
+    """下游服务的错误原样转给客户端：保留状态码（429/503/504等）和Retry-After"""
+    headers = {"Retry-After": resp.headers["Retry-After"]} if "Retry-After" in resp.headers else None
+    return HTTPException(resp.status_code, f"{name} error: {resp.text}", headers=headers)
+
+async def _run_until_disconnect(request: Request, work, deadline: float, poll_interval: float = 0.5):
+    """执行work，截止时间到达（504）或客户端断开（499）时取消，连同进行中的下游HTTP调用"""
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            timeout = min(poll_interval, deadline - time.monotonic())
+            if timeout <= 0:
+                logger.warning("⚠️ 请求超过截止时间，已取消")
+                raise HTTPException(504, "Deadline exceeded")
+            done, _ = await asyncio.wait({task}, timeout=timeout)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                logger.info("客户端已断开，已取消处理")
+                raise HTTPException(499, "Client disconnected")
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
 @app.post("/v1/process/image", response_model=ProcessResult)
 async def process_image(
+    request: Request,
     file: UploadFile = File(...), 
-    target_lang: str = Query(default="zh", description="目标语言")
+    target_lang: str = Query(default="zh", description="目标语言"),
+    x_deadline_ms: Optional[str] = Header(None)
 ):
     """
     处理图片翻译
@@ -75,10 +117,21 @@ async def process_image(
     2. 调用OCR服务识别文字
     3. 调用翻译服务翻译文字
     4. 合并结果返回
+    
+    截止时间经 X-Deadline-Ms 转发给OCR和翻译服务；超时返回504，客户端断开时取消下游调用
     """
-    import time
     start_time = time.time()
+    deadline = time.monotonic() + REQUEST_DEADLINE_SECONDS
+    if x_deadline_ms:
+        try:
+            deadline = min(deadline, time.monotonic() + max(0.0, float(x_deadline_ms)) / 1000)
+        except ValueError:
+            pass
     
+    return await _run_until_disconnect(request, _process_image(file, target_lang, start_time, deadline), deadline)
+
+async def _process_image(file: UploadFile, target_lang: str, start_time: float, deadline: float) -> ProcessResult:
+    """处理图片翻译（由process_image在截止时间内执行）"""
     try:
         # 生成唯一ID
         image_id = str(uuid.uuid4())
@@ -99,16 +152,18 @@ async def process_image(
         
         # 调用OCR服务
         logger.info(f"调用OCR服务: {OCR_URL}")
-        async with httpx.AsyncClient(timeout=60, proxies={}) as client:
+        ocr_timeout = _call_budget(deadline, OCR_TIMEOUT)
+        async with httpx.AsyncClient(timeout=ocr_timeout, proxies={}) as client:
             with open(tmp_path, "rb") as f:
                 ocr_resp = await client.post(
                     OCR_URL, 
-                    files={"file": (file.filename, f, file.content_type)}
+                    files={"file": (file.filename, f, file.content_type)},
+                    headers={DEADLINE_HEADER: str(int(ocr_timeout * 1000))}
                 )
         
         if ocr_resp.status_code != 200:
             logger.error(f"OCR服务错误: {ocr_resp.status_code} - {ocr_resp.text}")
-            raise HTTPException(500, f"OCR error: {ocr_resp.text}")
+            raise _downstream_error("OCR", ocr_resp)
         
         ocr_data = ocr_resp.json()
         blocks = ocr_data.get("blocks", [])
@@ -128,15 +183,17 @@ async def process_image(
         
         # 调用翻译服务
         logger.info(f"调用翻译服务: {TRANSLATE_URL}")
-        async with httpx.AsyncClient(timeout=120, proxies={}) as client:
+        translate_timeout = _call_budget(deadline, TRANSLATE_TIMEOUT)
+        async with httpx.AsyncClient(timeout=translate_timeout, proxies={}) as client:
             trans_resp = await client.post(
                 TRANSLATE_URL, 
-                json={"lines": lines, "target_lang": target_lang}
+                json={"lines": lines, "target_lang": target_lang},
+                headers={DEADLINE_HEADER: str(int(translate_timeout * 1000))}
             )
         
         if trans_resp.status_code != 200:
             logger.error(f"翻译服务错误: {trans_resp.status_code} - {trans_resp.text}")
-            raise HTTPException(500, f"Translate error: {trans_resp.text}")
+            raise _downstream_error("Translate", trans_resp)
         
         translation_data = trans_resp.json()
         translations = translation_data.get("translations", [])
@@ -167,6 +224,11 @@ async def process_image(
         
         return result
         
+    except HTTPException:
+        raise
+    except httpx.TimeoutException as e:
+        logger.error(f"下游服务超时: {e!r}")
+        raise HTTPException(504, f"Service timeout: {e!r}")
     except httpx.RequestError as e:
         logger.error(f"网络请求错误: {e}")
         raise HTTPException(500, f"Service communication error: {e}")